@@ -0,0 +1,150 @@
+"""
+代码分析结果缓存
+
+两级缓存，键为(规范化代码, 语言, 用户水平, 模型, 规则集版本)的哈希：
+- 一级：进程内LRU，命中时无需任何IO
+- 二级：Redis，按TTL过期，多个worker之间共享
+"""
+
+import inspect
+import json
+from typing import Any, Dict, Optional
+
+from code_analyzer import AnalysisType, CodeIssue, make_cache_key
+from lru_cache import LRUCache
+
+_ISSUE_KEYS = ("syntax_issues", "performance_issues", "security_issues")
+
+
+def issue_to_dict(issue: CodeIssue) -> Dict:
+    return {**issue.__dict__, "issue_type": issue.issue_type.value}
+
+
+def issue_from_dict(item: Dict) -> CodeIssue:
+    return CodeIssue(**{**item, "issue_type": AnalysisType(item["issue_type"])})
+
+
+def encode_result(result: Dict) -> str:
+    """将分析结果序列化为JSON字符串"""
+    payload = dict(result)
+    for key in _ISSUE_KEYS:
+        payload[key] = [issue_to_dict(issue) for issue in result.get(key, [])]
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def decode_result(raw: Any) -> Dict:
+    """从JSON字符串还原分析结果"""
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8")
+    payload = json.loads(raw)
+    for key in _ISSUE_KEYS:
+        payload[key] = [issue_from_dict(item) for item in payload.get(key, [])]
+    return payload
+
+
+class AnalysisCache:
+    """分析结果两级缓存"""
+
+    make_key = staticmethod(make_cache_key)
+
+    def __init__(self, maxsize: int = 1024, ttl: int = 86400, redis: Any = None,
+                 namespace: str = "codementor:analysis"):
+        self.local = LRUCache(maxsize=maxsize)
+        self.ttl = ttl
+        self.redis = redis
+        self.namespace = namespace
+        # redis.asyncio客户端只能在异步接口中使用
+        self._redis_is_async = redis is not None and inspect.iscoroutinefunction(redis.get)
+
+        self.local_hits = 0
+        self.remote_hits = 0
+        self.misses = 0
+        self.remote_errors = 0
+
+    def _remote_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _on_remote_hit(self, key: str, raw: Any) -> Optional[Dict]:
+        try:
+            result = decode_result(raw)
+        except (ValueError, TypeError, KeyError):
+            self.remote_errors += 1
+            return None
+        self.remote_hits += 1
+        self.local.set(key, result)
+        return result
+
+    def get(self, key: str) -> Optional[Dict]:
+        """同步查询：先查本地LRU，再查(同步)Redis"""
+        result = self.local.get(key)
+        if result is not None:
+            self.local_hits += 1
+            return result
+
+        if self.redis is not None and not self._redis_is_async:
+            try:
+                raw = self.redis.get(self._remote_key(key))
+            except Exception:
+                raw = None
+                self.remote_errors += 1
+            if raw is not None:
+                result = self._on_remote_hit(key, raw)
+                if result is not None:
+                    return result
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, result: Dict) -> None:
+        self.local.set(key, result)
+        if self.redis is not None and not self._redis_is_async:
+            try:
+                self.redis.set(self._remote_key(key), encode_result(result), ex=self.ttl)
+            except Exception:
+                self.remote_errors += 1
+
+    async def aget(self, key: str) -> Optional[Dict]:
+        """异步查询：先查本地LRU，再查Redis"""
+        result = self.local.get(key)
+        if result is not None:
+            self.local_hits += 1
+            return result
+
+        if self.redis is not None:
+            try:
+                raw = self.redis.get(self._remote_key(key))
+                if inspect.isawaitable(raw):
+                    raw = await raw
+            except Exception:
+                raw = None
+                self.remote_errors += 1
+            if raw is not None:
+                result = self._on_remote_hit(key, raw)
+                if result is not None:
+                    return result
+
+        self.misses += 1
+        return None
+
+    async def aset(self, key: str, result: Dict) -> None:
+        self.local.set(key, result)
+        if self.redis is not None:
+            try:
+                pending = self.redis.set(self._remote_key(key), encode_result(result), ex=self.ttl)
+                if inspect.isawaitable(pending):
+                    await pending
+            except Exception:
+                self.remote_errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中计数"""
+        lookups = self.local_hits + self.remote_hits + self.misses
+        hits = self.local_hits + self.remote_hits
+        return {
+            "local_hits": self.local_hits,
+            "remote_hits": self.remote_hits,
+            "misses": self.misses,
+            "remote_errors": self.remote_errors,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "local": self.local.stats(),
+        }
@@ -0,0 +1,110 @@
+"""
+批量生成学习路径(命令行)
+
+输入为用户画像的JSONL文件(每行一个画像，必须包含user_id)，输出为学习路径的JSONL文件。
+每生成一条路径立即追加写入；中断后使用相同参数重新运行，会跳过输出中已有的用户继续生成。
+
+用法:
+    OPENAI_API_KEY=... python bulk_paths.py profiles.jsonl paths.jsonl --concurrency 16
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Set
+
+from learning_path_generator import LearningPathGenerator, path_to_dict
+from llm_client import LLMClientConfig, get_llm_client
+from llm_scheduler import LLMScheduler, Priority
+
+
+def read_profiles(path: str) -> Iterator[Dict]:
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            profile = json.loads(line)
+            if profile.get("user_id") in (None, ""):
+                raise ValueError(f"{path} 第 {line_number} 行缺少user_id")
+            profile["user_id"] = str(profile["user_id"])
+            yield profile
+
+
+def completed_users(output_path: str) -> Set[str]:
+    """读取已有输出中的用户；上次中断时写了一半的最后一行会被截掉"""
+    if not os.path.exists(output_path):
+        return set()
+
+    users = set()
+    valid_size = 0
+    with open(output_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                users.add(json.loads(line)["user_id"])
+            except (ValueError, KeyError):
+                break
+            valid_size += len(line)
+
+    if valid_size != os.path.getsize(output_path):
+        with open(output_path, "r+b") as f:
+            f.truncate(valid_size)
+    return users
+
+
+def run_bulk(generator: LearningPathGenerator, input_path: str, output_path: str,
+             concurrency: int = 8) -> Dict[str, int]:
+    done = completed_users(output_path)
+    pending: List[Dict] = []
+    seen: Set[str] = set(done)
+    for profile in read_profiles(input_path):
+        if profile["user_id"] not in seen:
+            seen.add(profile["user_id"])
+            pending.append(profile)
+
+    written = 0
+    with open(output_path, "a", encoding="utf-8") as out:
+        for path in generator.generate_paths_bulk(pending, concurrency=concurrency):
+            out.write(json.dumps(path_to_dict(path), ensure_ascii=False) + "\n")
+            out.flush()
+            written += 1
+
+    return {"skipped": len(done), "written": written, **generator.cache_stats()}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="批量生成学习路径(JSONL输入输出，可中断后继续)")
+    parser.add_argument("profiles", help="用户画像JSONL文件")
+    parser.add_argument("output", help="学习路径输出JSONL文件")
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM调用的并发上限")
+    parser.add_argument("--model", default=os.getenv("OPENAI_MODEL", "gpt-4"))
+    parser.add_argument("--catalogue", default=None, help="主题目录文件，默认使用内置目录")
+    parser.add_argument("--requests-per-minute", type=int, default=200, help="LLM请求数限额")
+    parser.add_argument("--tokens-per-minute", type=int, default=60000, help="LLM token数限额")
+    args = parser.parse_args(argv)
+
+    # 与线上服务共用服务商配额，限流后不会挤占交互式请求
+    api_key = os.getenv("OPENAI_API_KEY", "")
+    scheduler = LLMScheduler(
+        get_llm_client(LLMClientConfig(api_key=api_key, base_url=os.getenv("OPENAI_BASE_URL"))),
+        requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute,
+        default_priority=Priority.BATCH
+    )
+    generator = LearningPathGenerator(
+        api_key,
+        args.model,
+        catalogue_path=args.catalogue,
+        llm_client=scheduler
+    )
+    started = time.perf_counter()
+    stats = run_bulk(generator, args.profiles, args.output, args.concurrency)
+    print(f"学习路径生成完成，用时 {time.perf_counter() - started:.1f} 秒: {stats}")
+    print(f"LLM调度: {scheduler.stats()['priorities']['batch']}")
+
+
+if __name__ == "__main__":
+    main()
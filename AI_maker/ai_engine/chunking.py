@@ -0,0 +1,115 @@
+"""
+大文件分块
+
+沿AST边界(顶层函数、类、语句)把代码切分为不超过token预算的块，
+供map-reduce模式并行分析。无法解析的代码按行切分。
+"""
+
+import ast
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # 未安装tiktoken时使用近似估算
+    tiktoken = None
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+_encoding = None
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数"""
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text, disallowed_special=()))
+    # 近似：中日韩字符约1个token，其余约4个字符1个token
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+@dataclass
+class CodeChunk:
+    index: int
+    start_line: int
+    end_line: int
+    source: str
+    tokens: int
+
+
+def _statement_spans(code: str, lines: List[str]) -> Optional[List[Tuple[int, int]]]:
+    """顶层语句的行范围，语句之间的注释/空行归入后一个语句"""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        return None
+
+    spans = []
+    next_start = 1
+    for node in tree.body:
+        end = node.end_lineno or node.lineno
+        spans.append((next_start, end))
+        next_start = end + 1
+    if next_start <= len(lines):
+        if spans:
+            spans[-1] = (spans[-1][0], len(lines))
+        else:
+            spans.append((next_start, len(lines)))
+    return spans
+
+
+def _line_spans(line_tokens: List[int], max_tokens: int, start: int, end: int) -> List[Tuple[int, int]]:
+    """按行切分一段代码，使每段不超过预算(单行超限时单独成段)"""
+    spans = []
+    chunk_start = start
+    budget = 0
+    for line_number in range(start, end + 1):
+        tokens = line_tokens[line_number - 1]
+        if budget and budget + tokens > max_tokens:
+            spans.append((chunk_start, line_number - 1))
+            chunk_start = line_number
+            budget = 0
+        budget += tokens
+    spans.append((chunk_start, end))
+    return spans
+
+
+def split_into_chunks(code: str, max_tokens: int = 3000) -> List[CodeChunk]:
+    """将代码切分为不超过max_tokens的块，尽量保持函数和类完整"""
+    lines = code.splitlines()
+    if not lines:
+        return []
+    line_tokens = [estimate_tokens(line + "\n") for line in lines]
+
+    spans = _statement_spans(code, lines) or [(1, len(lines))]
+
+    # 超出预算的单个语句(例如很长的类)按行再切分
+    pieces = []
+    for start, end in spans:
+        if sum(line_tokens[start - 1:end]) > max_tokens:
+            pieces.extend(_line_spans(line_tokens, max_tokens, start, end))
+        else:
+            pieces.append((start, end))
+
+    # 合并相邻的小片段，直到接近预算
+    merged = []
+    for start, end in pieces:
+        tokens = sum(line_tokens[start - 1:end])
+        if merged and merged[-1][2] + tokens <= max_tokens:
+            merged[-1] = (merged[-1][0], end, merged[-1][2] + tokens)
+        else:
+            merged.append((start, end, tokens))
+
+    return [
+        CodeChunk(
+            index=index,
+            start_line=start,
+            end_line=end,
+            source="\n".join(lines[start - 1:end]),
+            tokens=tokens
+        )
+        for index, (start, end, tokens) in enumerate(merged)
+    ]
@@ -1,10 +1,20 @@
-import openai
 import ast
+import asyncio
+import hashlib
 import re
-from typing import Dict, List, Optional, Tuple
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
+from chunking import estimate_tokens, split_into_chunks
+from llm_client import LLMClient, LLMClientConfig, get_llm_client
+from llm_scheduler import LoadShedError
+from model_router import RoutingDecision, RoutingTier
+from rule_engine import RuleContext, RuleEngine
+from scoring import DEFAULT_WEIGHTS, ScoreWeights, severity_counts
+
 class AnalysisType(Enum):
     SYNTAX = "syntax"
     LOGIC = "logic"
@@ -21,57 +31,361 @@ class CodeIssue:
     severity: str  # low, medium, high
     confidence: float
 
+# Python静态检查规则，按AST节点类型注册
+python_rules = RuleEngine()
+
+# 规则集版本，修改规则或评分逻辑时递增，使旧的缓存结果失效
+RULESET_VERSION = 2
+
+_SQL_PATTERN = re.compile(
+    r"\b(select\s.+\sfrom|insert\s+into|update\s.+\sset|delete\s+from)\b",
+    re.IGNORECASE | re.DOTALL
+)
+
+def _is_constant_true(node: ast.AST) -> bool:
+    return isinstance(node, ast.Constant) and bool(node.value) is True
+
+def _loop_has_exit(loop: ast.AST) -> bool:
+    """判断循环体内是否存在break/return/raise等退出路径"""
+    stack = list(loop.body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.Break, ast.Return, ast.Raise)):
+            return True
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            continue
+        if isinstance(node, (ast.For, ast.AsyncFor, ast.While)):
+            # 内层循环的break只跳出内层循环，但return/raise仍然有效
+            stack.extend(n for n in ast.walk(node) if isinstance(n, (ast.Return, ast.Raise)))
+            continue
+        stack.extend(ast.iter_child_nodes(node))
+    return False
+
+def _literal_text(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+@python_rules.register(ast.While)
+def infinite_loop_rule(node: ast.While, context: RuleContext):
+    """检查没有退出条件的 while True 循环"""
+    if _is_constant_true(node.test) and not _loop_has_exit(node):
+        return [CodeIssue(
+            line_number=node.lineno,
+            issue_type=AnalysisType.PERFORMANCE,
+            description="检测到可能的无限循环",
+            suggestion="请确保循环有正确的退出条件",
+            severity="high",
+            confidence=0.8
+        )]
+
+@python_rules.register(ast.Call)
+def eval_call_rule(node: ast.Call, context: RuleContext):
+    """检查eval()调用"""
+    if isinstance(node.func, ast.Name) and node.func.id == "eval":
+        return [CodeIssue(
+            line_number=node.lineno,
+            issue_type=AnalysisType.SECURITY,
+            description="使用eval()函数存在安全风险",
+            suggestion="请避免使用eval()，考虑使用ast.literal_eval()",
+            severity="high",
+            confidence=0.9
+        )]
+
+@python_rules.register(ast.JoinedStr, ast.BinOp, ast.Call)
+def sql_injection_rule(node: ast.AST, context: RuleContext):
+    """检查通过字符串拼接/格式化构造的SQL语句"""
+    if isinstance(node, ast.JoinedStr):
+        text = "?".join(_literal_text(v) or "" for v in node.values)
+    elif isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Mod)):
+        text = _literal_text(node.left) or _literal_text(node.right)
+    elif (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+          and node.func.attr == "format"):
+        text = _literal_text(node.func.value)
+    else:
+        return None
+
+    if not text or not _SQL_PATTERN.search(text):
+        return None
+
+    # 同一行只报告一次
+    reported = context.state.setdefault("sql_injection_lines", set())
+    if node.lineno in reported:
+        return None
+    reported.add(node.lineno)
+
+    return [CodeIssue(
+        line_number=node.lineno,
+        issue_type=AnalysisType.SECURITY,
+        description="可能存在SQL注入风险",
+        suggestion="请使用参数化查询",
+        severity="high",
+        confidence=0.7
+    )]
+
+# 代码规模与复杂度指标，与检查规则在同一次遍历中统计，供模型路由使用
+_BRANCH_NODES = (
+    ast.If, ast.For, ast.AsyncFor, ast.While, ast.Try, ast.ExceptHandler,
+    ast.IfExp, ast.BoolOp, ast.comprehension, ast.match_case
+)
+
+def new_metrics(code: str = "") -> Dict[str, int]:
+    return {
+        "lines": sum(1 for line in code.splitlines() if line.strip()),
+        "functions": 0,
+        "classes": 0,
+        "complexity": 0,
+    }
+
+def _metrics(context: RuleContext) -> Dict[str, int]:
+    return context.state.setdefault("metrics", new_metrics())
+
+@python_rules.register(*_BRANCH_NODES)
+def complexity_metric(node: ast.AST, context: RuleContext):
+    """统计分支数量(近似圈复杂度)"""
+    _metrics(context)["complexity"] += 1
+
+@python_rules.register(ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)
+def function_metric(node: ast.AST, context: RuleContext):
+    _metrics(context)["functions"] += 1
+
+@python_rules.register(ast.ClassDef)
+def class_metric(node: ast.ClassDef, context: RuleContext):
+    _metrics(context)["classes"] += 1
+
+def _check_syntax(code: str, language: str) -> Tuple[List[CodeIssue], Optional[ast.AST]]:
+    """基础语法检查，返回语法问题以及解析得到的AST(供规则引擎复用)"""
+    issues = []
+    tree = None
+    
+    if language.lower() == "python":
+        try:
+            tree = ast.parse(code)
+        except SyntaxError as e:
+            issues.append(CodeIssue(
+                line_number=e.lineno or 0,
+                issue_type=AnalysisType.SYNTAX,
+                description=f"语法错误: {e.msg}",
+                suggestion="请检查语法错误并修正",
+                severity="high",
+                confidence=1.0
+            ))
+    
+    return issues, tree
+
+def _scan_text_rules(code: str) -> List[CodeIssue]:
+    """非Python代码(或无法解析的代码)的逐行文本检查"""
+    issues = []
+    sql_line = 0
+    has_input = False
+
+    for line_number, line in enumerate(code.splitlines(), start=1):
+        lowered = line.lower()
+        if "eval(" in line:
+            issues.append(CodeIssue(
+                line_number=line_number,
+                issue_type=AnalysisType.SECURITY,
+                description="使用eval()函数存在安全风险",
+                suggestion="请避免使用eval()",
+                severity="high",
+                confidence=0.6
+            ))
+        if not sql_line and "sql" in lowered:
+            sql_line = line_number
+        if "input(" in lowered:
+            has_input = True
+
+    if sql_line and has_input:
+        issues.append(CodeIssue(
+            line_number=sql_line,
+            issue_type=AnalysisType.SECURITY,
+            description="可能存在SQL注入风险",
+            suggestion="请使用参数化查询",
+            severity="high",
+            confidence=0.5
+        ))
+
+    return issues
+
+def run_static_analysis(code: str, language: str) -> Dict[str, List[CodeIssue]]:
+    """
+    静态分析：只解析一次代码、只遍历一次AST，
+    返回按类别划分的语法/性能/安全问题，以及代码规模与复杂度指标(metrics)
+    """
+    syntax_issues, tree = _check_syntax(code, language)
+    metrics = new_metrics(code)
+
+    if tree is not None:
+        context = RuleContext(code, tree)
+        context.state["metrics"] = metrics
+        issues = python_rules.run(tree, code, context)
+    elif language.lower() == "python":
+        # 语法错误时无法得到AST，只报告语法问题
+        issues = []
+    else:
+        issues = _scan_text_rules(code)
+
+    result = {
+        "syntax_issues": syntax_issues,
+        "performance_issues": [],
+        "security_issues": [],
+        "metrics": metrics,
+    }
+    for issue in issues:
+        if issue.issue_type == AnalysisType.PERFORMANCE:
+            result["performance_issues"].append(issue)
+        elif issue.issue_type == AnalysisType.SECURITY:
+            result["security_issues"].append(issue)
+    return result
+
+def normalize_code(code: str) -> str:
+    """规范化代码：统一换行符，去掉行尾空白和首尾空行"""
+    lines = code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+def make_cache_key(code: str, language: str, user_level: str, model: str, ruleset_version: Any) -> str:
+    """生成内容寻址的分析键(也用作缓存键)"""
+    digest = hashlib.sha256()
+    for part in (normalize_code(code), language.lower(), user_level, model, str(ruleset_version)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+_STATIC_KEYS = ("syntax_issues", "performance_issues", "security_issues")
+
+def _batch_item(index: int, result: Optional[Dict] = None, error: Optional[str] = None) -> Dict:
+    """批量分析中单条提交的结果"""
+    return {"index": index, "result": result, "error": error}
+
+def _validate_submission(submission: Dict) -> Tuple[str, str]:
+    code = submission.get("code")
+    language = submission.get("language")
+    if not isinstance(code, str) or not isinstance(language, str):
+        raise ValueError("提交必须包含字符串类型的code和language字段")
+    return code, language
+
 class CodeAnalyzer:
-    def __init__(self, api_key: str, model: str = "gpt-4"):
-        self.client = openai.OpenAI(api_key=api_key)
+    def __init__(self, api_key: str, model: str = "gpt-4", cache=None,
+                 score_weights: Optional[ScoreWeights] = None,
+                 llm_client: Optional[LLMClient] = None, ai_deadline: Optional[float] = None):
+        # 共享的LLM客户端(见 llm_client)，相同配置的分析器共用连接池；
+        # 也可以传入 llm_scheduler.LLMScheduler，按优先级和用户限流调度
+        self.llm = llm_client or get_llm_client(LLMClientConfig(api_key=api_key))
+        # 单次AI分析(包括重试)的截止时间(秒)
+        self.ai_deadline = ai_deadline
         self.model = model
+        # 可选的分析结果缓存(见 analysis_cache.AnalysisCache)
+        self.cache = cache
+        # 评分权重表(见 scoring.ScoreWeights)
+        self.score_weights = score_weights or DEFAULT_WEIGHTS
+    
+    def analysis_key(self, code: str, language: str, user_level: str) -> str:
+        """当前分析器配置下的分析键，相同的键对应相同的分析结果"""
+        # 结果中包含总分，权重表变化时分析键也要变化
+        version = f"{RULESET_VERSION}:{self.score_weights.fingerprint}"
+        return make_cache_key(code, language, user_level, self.model, version)
+    
+    def cache_key(self, code: str, language: str, user_level: str) -> Optional[str]:
+        """当前分析器配置下的缓存键，未启用缓存时返回None"""
+        if self.cache is None:
+            return None
+        return self.analysis_key(code, language, user_level)
     
     def analyze_code(self, code: str, language: str, user_level: str) -> Dict:
         """
         综合分析代码，返回详细的分析结果
         """
-        # 基础语法检查
-        syntax_issues = self._check_syntax(code, language)
+        cache_key = self.cache_key(code, language, user_level)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        result = self._analyze_uncached(code, language, user_level)
+        
+        # AI分析失败的结果不缓存，下次提交时重试
+        if cache_key is not None and "error" not in result["ai_analysis"]:
+            self.cache.set(cache_key, result)
+        
+        return result
+    
+    def analyze_many(self, submissions: List[Dict], user_level: str,
+                     concurrency: int = 8, process_workers: Optional[int] = None) -> List[Dict]:
+        """
+        批量分析代码：静态分析在进程池中并行执行，AI分析按并发上限分发。
+        返回结果与输入顺序一致，单条提交失败不影响其他提交。
+        """
+        results: List[Optional[Dict]] = [None] * len(submissions)
+        pending = []
+        
+        for index, submission in enumerate(submissions):
+            try:
+                code, language = _validate_submission(submission)
+            except ValueError as e:
+                results[index] = _batch_item(index, error=str(e))
+                continue
+            cache_key = self.cache_key(code, language, user_level)
+            cached = self.cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                results[index] = _batch_item(index, result=cached)
+            else:
+                pending.append((index, code, language, cache_key))
+        
+        if pending:
+            with ProcessPoolExecutor(max_workers=process_workers) as process_pool, \
+                    ThreadPoolExecutor(max_workers=concurrency) as llm_pool:
+                jobs = [
+                    (
+                        index,
+                        cache_key,
+                        process_pool.submit(run_static_analysis, code, language),
+                        llm_pool.submit(self._ai_analysis, code, language, user_level)
+                    )
+                    for index, code, language, cache_key in pending
+                ]
+                for index, cache_key, static_future, ai_future in jobs:
+                    try:
+                        result = self._build_result(static_future.result(), ai_future.result())
+                    except Exception as e:
+                        results[index] = _batch_item(index, error=str(e))
+                        continue
+                    if cache_key is not None and "error" not in result["ai_analysis"]:
+                        self.cache.set(cache_key, result)
+                    results[index] = _batch_item(index, result=result)
+        
+        return results
+    
+    def _analyze_uncached(self, code: str, language: str, user_level: str) -> Dict:
+        # 语法、性能、安全检查(单次解析 + 单次AST遍历)
+        static_result = run_static_analysis(code, language)
         
         # AI深度分析
         ai_analysis = self._ai_analysis(code, language, user_level)
         
-        # 性能分析
-        performance_issues = self._analyze_performance(code, language)
-        
-        # 安全分析
-        security_issues = self._analyze_security(code, language)
+        return self._build_result(static_result, ai_analysis)
+    
+    def _build_result(self, static_result: Dict[str, List[CodeIssue]], ai_analysis: Dict,
+                      routing: Optional[RoutingDecision] = None) -> Dict:
+        """合并静态分析与AI分析结果"""
+        syntax_issues = static_result["syntax_issues"]
+        performance_issues = static_result["performance_issues"]
+        security_issues = static_result["security_issues"]
         
-        return {
+        result = {
             "syntax_issues": syntax_issues,
             "ai_analysis": ai_analysis,
             "performance_issues": performance_issues,
             "security_issues": security_issues,
             "overall_score": self._calculate_score(syntax_issues, ai_analysis, performance_issues, security_issues)
         }
+        # 记录模型路由结果(见 model_router.ModelRouter)
+        if routing is not None:
+            result["routing"] = routing.to_dict()
+        return result
     
-    def _check_syntax(self, code: str, language: str) -> List[CodeIssue]:
-        """基础语法检查"""
-        issues = []
-        
-        if language.lower() == "python":
-            try:
-                ast.parse(code)
-            except SyntaxError as e:
-                issues.append(CodeIssue(
-                    line_number=e.lineno or 0,
-                    issue_type=AnalysisType.SYNTAX,
-                    description=f"语法错误: {e.msg}",
-                    suggestion="请检查语法错误并修正",
-                    severity="high",
-                    confidence=1.0
-                ))
-        
-        return issues
-    
-    def _ai_analysis(self, code: str, language: str, user_level: str) -> Dict:
-        """使用AI进行深度代码分析"""
-        prompt = f"""
+    def _build_prompt(self, code: str, language: str, user_level: str) -> str:
+        """构造AI分析提示词"""
+        return f"""
         请分析以下{language}代码，用户水平为{user_level}。
         
         请从以下方面进行分析：
@@ -89,108 +403,63 @@ class CodeAnalyzer:
         - suggestions: 改进建议
         - score: 总体评分(0-100)
         """
+    
+    def _parse_ai_response(self, ai_response: str) -> Dict:
+        """解析AI响应"""
+        # 这里需要解析JSON响应，简化处理
+        return {
+            "analysis": ai_response,
+            "score": 85  # 示例分数
+        }
+    
+    def _static_only_analysis(self, reason: str) -> Dict:
+        """静态分析已能给出结论(语法错误、空代码)时跳过AI分析；不包含score，总分只按静态问题计算"""
+        return {
+            "analysis": f"{reason}，已跳过AI分析。请先根据静态检查结果修改代码。",
+            "skipped": True
+        }
+    
+    def _ai_error(self, error: Exception) -> Dict:
+        result = {
+            "analysis": f"AI分析出错: {str(error)}",
+            "score": 0,
+            "error": str(error)
+        }
+        if isinstance(error, LoadShedError):
+            # 被调度器限流丢弃，调用方可以稍后重试
+            result["load_shed"] = error.reason
+            result["retry_after"] = error.retry_after
+        return result
+    
+    def _ai_analysis(self, code: str, language: str, user_level: str,
+                     model: Optional[str] = None) -> Dict:
+        """使用AI进行深度代码分析"""
+        prompt = self._build_prompt(code, language, user_level)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            response = self.llm.chat(
+                deadline=self.ai_deadline,
+                model=model or self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3
             )
             
             # 解析AI响应
-            ai_response = response.choices[0].message.content
-            # 这里需要解析JSON响应，简化处理
-            return {
-                "analysis": ai_response,
-                "score": 85  # 示例分数
-            }
+            return self._parse_ai_response(response.choices[0].message.content)
         except Exception as e:
-            return {
-                "analysis": f"AI分析出错: {str(e)}",
-                "score": 0
-            }
-    
-    def _analyze_performance(self, code: str, language: str) -> List[CodeIssue]:
-        """性能分析"""
-        issues = []
-        
-        # 简单的性能检查规则
-        if language.lower() == "python":
-            # 检查是否有无限循环
-            if "while True:" in code and "break" not in code:
-                issues.append(CodeIssue(
-                    line_number=0,
-                    issue_type=AnalysisType.PERFORMANCE,
-                    description="检测到可能的无限循环",
-                    suggestion="请确保循环有正确的退出条件",
-                    severity="high",
-                    confidence=0.8
-                ))
-            
-            # 检查列表推导式使用
-            if "for" in code and "[" in code and "]" in code:
-                # 这里可以添加更复杂的检查
-                pass
-        
-        return issues
-    
-    def _analyze_security(self, code: str, language: str) -> List[CodeIssue]:
-        """安全分析"""
-        issues = []
-        
-        # 检查SQL注入风险
-        if "sql" in code.lower() and "input(" in code.lower():
-            issues.append(CodeIssue(
-                line_number=0,
-                issue_type=AnalysisType.SECURITY,
-                description="可能存在SQL注入风险",
-                suggestion="请使用参数化查询",
-                severity="high",
-                confidence=0.7
-            ))
-        
-        # 检查eval使用
-        if "eval(" in code:
-            issues.append(CodeIssue(
-                line_number=0,
-                issue_type=AnalysisType.SECURITY,
-                description="使用eval()函数存在安全风险",
-                suggestion="请避免使用eval()，考虑使用ast.literal_eval()",
-                severity="high",
-                confidence=0.9
-            ))
-        
-        return issues
+            return self._ai_error(e)
     
     def _calculate_score(self, syntax_issues: List[CodeIssue], 
                         ai_analysis: Dict, 
                         performance_issues: List[CodeIssue],
                         security_issues: List[CodeIssue]) -> float:
         """计算总体评分"""
-        base_score = 100
-        
-        # 语法错误扣分
-        syntax_penalty = len([i for i in syntax_issues if i.severity == "high"]) * 20
-        syntax_penalty += len([i for i in syntax_issues if i.severity == "medium"]) * 10
-        syntax_penalty += len([i for i in syntax_issues if i.severity == "low"]) * 5
-        
-        # 性能问题扣分
-        perf_penalty = len([i for i in performance_issues if i.severity == "high"]) * 15
-        perf_penalty += len([i for i in performance_issues if i.severity == "medium"]) * 8
-        perf_penalty += len([i for i in performance_issues if i.severity == "low"]) * 3
-        
-        # 安全问题扣分
-        sec_penalty = len([i for i in security_issues if i.severity == "high"]) * 25
-        sec_penalty += len([i for i in security_issues if i.severity == "medium"]) * 15
-        sec_penalty += len([i for i in security_issues if i.severity == "low"]) * 8
-        
-        final_score = max(0, base_score - syntax_penalty - perf_penalty - sec_penalty)
-        
-        # 结合AI分析分数
-        if "score" in ai_analysis:
-            final_score = (final_score + ai_analysis["score"]) / 2
-        
-        return round(final_score, 1)
+        counts = severity_counts({
+            "syntax_issues": syntax_issues,
+            "performance_issues": performance_issues,
+            "security_issues": security_issues
+        })
+        return self.score_weights.score(counts, ai_analysis.get("score"))
     
     def generate_feedback(self, analysis_result: Dict, user_level: str) -> str:
         """生成用户友好的反馈"""
@@ -212,4 +481,326 @@ class CodeAnalyzer:
         if issues_count > 0:
             feedback += f"\n发现 {issues_count} 个问题需要解决。"
         
-        return feedback 
\ No newline at end of file
+        return feedback 
+
+
+class AsyncCodeAnalyzer(CodeAnalyzer):
+    """
+    基于AsyncOpenAI的异步代码分析器
+
+    LLM调用与静态分析并发执行；静态分析属于CPU密集型任务，
+    放到有界执行器中运行，避免阻塞事件循环。
+    """
+
+    def __init__(self, api_key: str, model: str = "gpt-4", cache=None,
+                 executor: Optional[Executor] = None, max_workers: int = 4,
+                 batch_concurrency: int = 8, process_workers: Optional[int] = None,
+                 parse_service=None, single_flight=None,
+                 chunk_token_budget: Optional[int] = None, chunk_concurrency: int = 16,
+                 router=None, score_weights: Optional[ScoreWeights] = None,
+                 llm_client: Optional[LLMClient] = None, ai_deadline: Optional[float] = None):
+        super().__init__(api_key, model, cache, score_weights, llm_client, ai_deadline)
+        # 也可以传入ProcessPoolExecutor，run_static_analysis可以被pickle
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="code-analyzer"
+        )
+        # 批量分析：AI调用并发上限，静态分析使用按需创建的进程池
+        self.batch_concurrency = batch_concurrency
+        self.process_workers = process_workers
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        # 可选的隔离解析服务(见 parse_service.ParseService)，
+        # 启用后静态分析在带超时和内存上限的工作进程中执行
+        self.parse_service = parse_service
+        # 可选的请求合并器(见 single_flight)，相同分析键的并发请求共享一次计算
+        self.single_flight = single_flight
+        # 代码超过该token预算时按AST边界分块并行分析(map-reduce)，None表示不分块
+        self.chunk_token_budget = chunk_token_budget
+        self.chunk_concurrency = chunk_concurrency
+        # 可选的模型路由(见 model_router.ModelRouter)：
+        # 静态分析已有结论时跳过LLM，简单代码使用快速模型
+        self.router = router
+
+    def check_submission(self, code: str) -> None:
+        """输入大小检查，超限时抛出parse_service.SubmissionRejected"""
+        if self.parse_service is not None:
+            self.parse_service.ensure_acceptable(code)
+
+    async def coalesce(self, key: str, compute):
+        """合并相同分析键的并发计算；compute返回前需已写入缓存，以便其他worker读取"""
+        if self.single_flight is None:
+            return await compute()
+        lookup = (lambda: self.cache.aget(key)) if self.cache is not None else None
+        return await self.single_flight.do(key, compute, lookup)
+
+    async def run_cpu_bound(self, func, code: str, *args):
+        """执行 func(code, *args)：优先使用解析服务，否则使用执行器"""
+        if self.parse_service is not None:
+            return await self.parse_service.arun(func, code, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, code, *args)
+
+    async def analyze_code(self, code: str, language: str, user_level: str) -> Dict:
+        """
+        综合分析代码，返回详细的分析结果
+        """
+        cache_key = self.cache_key(code, language, user_level)
+        if cache_key is not None:
+            cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                return cached
+
+        async def compute() -> Dict:
+            result = await self._analyze_uncached(code, language, user_level)
+            # AI分析失败的结果不缓存，下次提交时重试
+            if cache_key is not None and "error" not in result["ai_analysis"]:
+                await self.cache.aset(cache_key, result)
+            return result
+
+        return await self.coalesce(self.analysis_key(code, language, user_level), compute)
+
+    async def analyze_code_stream(self, code: str, language: str, user_level: str,
+                                  static_result: Optional[Dict] = None) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        流式分析代码，依次产出事件：
+        - ("static", 语法/性能/安全问题)：静态分析完成后立即产出
+        - ("token", {"content": ...})：AI分析的增量文本
+        - ("result", 完整分析结果)：与analyze_code的返回值一致
+        代码超出token预算时与analyze_code相同分块分析，合并后的结果只在result中返回。
+        static_result为调用方已完成的静态分析(例如增量分析)，传入时不再重复执行。
+        """
+        cache_key = self.cache_key(code, language, user_level)
+        if cache_key is not None:
+            cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                yield "static", {key: cached[key] for key in _STATIC_KEYS}
+                yield "result", cached
+                return
+
+        self.check_submission(code)
+
+        chunked = self.chunk_token_budget is not None and estimate_tokens(code) > self.chunk_token_budget
+        static_task = None
+        if static_result is None:
+            static_task = asyncio.ensure_future(self.run_static_analysis(code, language))
+        stream_task = None
+        routing = None
+        if self.router is None and not chunked:
+            # 未启用路由时LLM请求与静态分析同时发出
+            stream_task = self._start_stream(code, language, user_level, self.model)
+
+        try:
+            if static_task is not None:
+                static_result = await static_task
+            yield "static", static_result
+
+            model = self.model
+            if self.router is not None:
+                routing = self.router.route(static_result)
+                model = routing.model
+
+            if routing is not None and routing.tier is RoutingTier.STATIC:
+                ai_analysis = self._static_only_analysis(routing.reason)
+            elif chunked:
+                ai_analysis = await self.chunked_ai_analysis(code, language, user_level, model)
+            else:
+                if stream_task is None:
+                    stream_task = self._start_stream(code, language, user_level, model)
+                try:
+                    stream = await stream_task
+                    chunks = []
+                    async for chunk in stream:
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            chunks.append(delta)
+                            yield "token", {"content": delta}
+                    ai_analysis = self._parse_ai_response("".join(chunks))
+                except Exception as e:
+                    ai_analysis = self._ai_error(e)
+        finally:
+            # 客户端断开时停止上游请求
+            for task in (static_task, stream_task):
+                if task is not None and not task.done():
+                    task.cancel()
+
+        result = self._build_result(static_result, ai_analysis, routing)
+        if cache_key is not None and "error" not in ai_analysis:
+            await self.cache.aset(cache_key, result)
+        yield "result", result
+
+    def _start_stream(self, code: str, language: str, user_level: str, model: str) -> "asyncio.Future":
+        # 截止时间只约束建立流之前的阶段(包括重试)
+        return asyncio.ensure_future(self.llm.achat(
+            deadline=self.ai_deadline,
+            model=model,
+            messages=[{"role": "user", "content": self._build_prompt(code, language, user_level)}],
+            temperature=0.3,
+            stream=True
+        ))
+
+    async def analyze_many(self, submissions: List[Dict], user_level: str,
+                           concurrency: Optional[int] = None) -> List[Dict]:
+        """
+        批量分析代码：静态分析在进程池中并行执行，AI分析按并发上限分发。
+        返回结果与输入顺序一致，单条提交失败不影响其他提交。
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.batch_concurrency)
+        loop = asyncio.get_running_loop()
+        if self.parse_service is None and self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.process_workers)
+
+        async def analyze_one(index: int, submission: Dict) -> Dict:
+            try:
+                code, language = _validate_submission(submission)
+                cache_key = self.cache_key(code, language, user_level)
+                if cache_key is not None:
+                    cached = await self.cache.aget(cache_key)
+                    if cached is not None:
+                        return _batch_item(index, result=cached)
+
+                self.check_submission(code)
+
+                async def compute() -> Dict:
+                    if self.parse_service is not None:
+                        static_future = asyncio.ensure_future(self.run_static_analysis(code, language))
+                    else:
+                        static_future = loop.run_in_executor(
+                            self._process_pool, run_static_analysis, code, language
+                        )
+                    if self.router is None:
+                        async with semaphore:
+                            ai_analysis = await self.budgeted_ai_analysis(code, language, user_level)
+                        static_result = await static_future
+                        routing = None
+                    else:
+                        static_result = await static_future
+                        async with semaphore:
+                            ai_analysis, routing = await self.routed_ai_analysis(
+                                code, language, user_level, static_result
+                            )
+
+                    result = self._build_result(static_result, ai_analysis, routing)
+                    if cache_key is not None and "error" not in ai_analysis:
+                        await self.cache.aset(cache_key, result)
+                    return result
+
+                result = await self.coalesce(self.analysis_key(code, language, user_level), compute)
+                return _batch_item(index, result=result)
+            except Exception as e:
+                return _batch_item(index, error=str(e))
+
+        return list(await asyncio.gather(
+            *(analyze_one(index, submission) for index, submission in enumerate(submissions))
+        ))
+
+    async def _analyze_uncached(self, code: str, language: str, user_level: str) -> Dict:
+        self.check_submission(code)
+        if self.router is None:
+            static_result, ai_analysis = await asyncio.gather(
+                self.run_static_analysis(code, language),
+                self.budgeted_ai_analysis(code, language, user_level)
+            )
+            return self._build_result(static_result, ai_analysis)
+
+        # 路由依赖静态分析结果(耗时为毫秒级)，之后再决定是否以及如何调用LLM
+        static_result = await self.run_static_analysis(code, language)
+        ai_analysis, routing = await self.routed_ai_analysis(code, language, user_level, static_result)
+        return self._build_result(static_result, ai_analysis, routing)
+
+    async def routed_ai_analysis(self, code: str, language: str, user_level: str,
+                                 static_result: Dict) -> Tuple[Dict, Optional[RoutingDecision]]:
+        """按路由结果进行AI分析，返回(AI分析结果, 路由决策)"""
+        if self.router is None:
+            return await self.budgeted_ai_analysis(code, language, user_level), None
+        routing = self.router.route(static_result)
+        if routing.tier is RoutingTier.STATIC:
+            return self._static_only_analysis(routing.reason), routing
+        return await self.budgeted_ai_analysis(code, language, user_level, routing.model), routing
+
+    async def budgeted_ai_analysis(self, code: str, language: str, user_level: str,
+                                   model: Optional[str] = None) -> Dict:
+        """代码超出token预算时分块并行分析，否则单次分析"""
+        if self.chunk_token_budget is None or estimate_tokens(code) <= self.chunk_token_budget:
+            return await self._ai_analysis(code, language, user_level, model)
+        return await self.chunked_ai_analysis(code, language, user_level, model)
+
+    async def chunked_ai_analysis(self, code: str, language: str, user_level: str,
+                                  model: Optional[str] = None) -> Dict:
+        """
+        map-reduce分析：按AST边界切分为token受限的块，并行分析后合并结果。
+        合并后的评分按各块token数加权，并附带每块的token数和耗时。
+        """
+        chunks = await self.run_cpu_bound(split_into_chunks, code, self.chunk_token_budget or 3000)
+        semaphore = asyncio.Semaphore(self.chunk_concurrency)
+
+        async def analyze_chunk(chunk) -> Tuple[Dict, float]:
+            header = f"# 第{chunk.index + 1}/{len(chunks)}部分，原文件第{chunk.start_line}-{chunk.end_line}行\n"
+            async with semaphore:
+                started = time.perf_counter()
+                chunk_analysis = await self._ai_analysis(header + chunk.source, language, user_level, model)
+                return chunk_analysis, (time.perf_counter() - started) * 1000
+
+        outcomes = await asyncio.gather(*(analyze_chunk(chunk) for chunk in chunks))
+
+        reports = []
+        sections = []
+        weighted_score = 0.0
+        scored_tokens = 0
+        errors = []
+        for chunk, (chunk_analysis, elapsed_ms) in zip(chunks, outcomes):
+            report = {
+                "index": chunk.index,
+                "start_line": chunk.start_line,
+                "end_line": chunk.end_line,
+                "tokens": chunk.tokens,
+                "elapsed_ms": round(elapsed_ms, 1)
+            }
+            if "error" in chunk_analysis:
+                report["error"] = chunk_analysis["error"]
+                errors.append(chunk_analysis["error"])
+            else:
+                report["score"] = chunk_analysis.get("score", 0)
+                weighted_score += report["score"] * chunk.tokens
+                scored_tokens += chunk.tokens
+                sections.append(f"## 第{chunk.start_line}-{chunk.end_line}行\n{chunk_analysis.get('analysis')}")
+            reports.append(report)
+
+        stats = {
+            "mode": "chunked",
+            "total_tokens": sum(chunk.tokens for chunk in chunks),
+            "chunks": reports
+        }
+        if not scored_tokens:
+            return {**self._ai_error(RuntimeError(errors[0] if errors else "代码为空")), **stats}
+        return {
+            "analysis": "\n\n".join(sections),
+            "score": round(weighted_score / scored_tokens, 1),
+            **stats
+        }
+
+    async def run_static_analysis(self, code: str, language: str) -> Dict[str, List[CodeIssue]]:
+        """在执行器(或解析服务)中运行静态分析"""
+        return await self.run_cpu_bound(run_static_analysis, code, language)
+
+    async def _ai_analysis(self, code: str, language: str, user_level: str,
+                           model: Optional[str] = None) -> Dict:
+        """使用AI进行深度代码分析"""
+        prompt = self._build_prompt(code, language, user_level)
+
+        try:
+            response = await self.llm.achat(
+                deadline=self.ai_deadline,
+                model=model or self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3
+            )
+
+            # 解析AI响应
+            return self._parse_ai_response(response.choices[0].message.content)
+        except Exception as e:
+            return self._ai_error(e)
+
+    async def aclose(self) -> None:
+        """释放执行器(共享的LLM客户端由 llm_client.close_llm_clients 统一关闭)"""
+        self.executor.shutdown(wait=False)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False)
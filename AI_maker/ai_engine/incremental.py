@@ -0,0 +1,332 @@
+"""
+函数粒度的增量代码分析
+
+学生两次提交之间通常只修改一两个函数。这里对顶层函数/类(以及其余的模块级语句)
+按AST计算指纹，与上一次提交保存的快照比较：
+- 未修改的单元直接复用上次的静态分析问题(按新位置重新定位行号)
+- 只对修改过的单元重新运行规则，并且只把修改过的代码发送给LLM
+"""
+
+import ast
+import hashlib
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from analysis_cache import issue_from_dict, issue_to_dict
+from code_analyzer import (
+    AnalysisType, AsyncCodeAnalyzer, CodeIssue, RULESET_VERSION, _check_syntax, new_metrics, python_rules
+)
+from model_router import RoutingDecision, RoutingTier
+from rule_engine import RuleContext
+
+# 快照格式版本，格式变化时递增
+SNAPSHOT_VERSION = 2
+
+_UNIT_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+@dataclass
+class CodeUnit:
+    name: str
+    kind: str  # function, class, module
+    fingerprint: str
+    nodes: List[ast.stmt] = field(repr=False)
+
+    @property
+    def spans(self) -> List[Tuple[int, int]]:
+        """每个顶层语句的起止行(包含装饰器)"""
+        spans = []
+        for node in self.nodes:
+            decorators = getattr(node, "decorator_list", None)
+            start = decorators[0].lineno if decorators else node.lineno
+            spans.append((start, node.end_lineno or node.lineno))
+        return spans
+
+    @property
+    def line_count(self) -> int:
+        return sum(end - start + 1 for start, end in self.spans)
+
+    def source(self, lines: List[str]) -> str:
+        return "\n".join("\n".join(lines[start - 1:end]) for start, end in self.spans)
+
+    def to_relative(self, issue: CodeIssue) -> Dict:
+        """将问题的绝对行号转换为(语句序号, 行偏移)"""
+        spans = self.spans
+        index = 0
+        for i, (start, end) in enumerate(spans):
+            if start <= issue.line_number <= end:
+                index = i
+                break
+        item = issue_to_dict(issue)
+        item.pop("line_number")
+        item["node_index"] = index
+        item["line_offset"] = issue.line_number - spans[index][0]
+        return item
+
+    def to_absolute(self, item: Dict) -> CodeIssue:
+        """根据当前位置还原问题的绝对行号"""
+        item = dict(item)
+        start = self.spans[item.pop("node_index")][0]
+        item["line_number"] = start + item.pop("line_offset")
+        return issue_from_dict(item)
+
+
+def _fingerprint(nodes: List[ast.stmt]) -> str:
+    # ast.dump默认不包含位置信息，函数整体移动不会改变指纹
+    digest = hashlib.sha256()
+    for node in nodes:
+        digest.update(ast.dump(node).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def extract_units(tree: ast.Module) -> List[CodeUnit]:
+    """按顶层函数/类划分代码单元，其余模块级语句归为一个单元"""
+    units = []
+    module_nodes = []
+
+    for node in tree.body:
+        if isinstance(node, _UNIT_TYPES):
+            kind = "class" if isinstance(node, ast.ClassDef) else "function"
+            units.append(CodeUnit(node.name, kind, _fingerprint([node]), [node]))
+        else:
+            module_nodes.append(node)
+
+    if module_nodes:
+        units.append(CodeUnit("<module>", "module", _fingerprint(module_nodes), module_nodes))
+
+    return units
+
+
+@dataclass
+class IncrementalPlan:
+    units: List[CodeUnit]
+    changed: List[CodeUnit]
+    reused: List[CodeUnit]
+    static_result: Dict[str, List[CodeIssue]]
+    unit_issues: Dict[str, List[Dict]]
+    unit_metrics: Dict[str, Dict[str, int]]
+    changed_source: str
+    previous_ai: Optional[Dict]
+
+    @property
+    def full_analysis(self) -> bool:
+        """
+        是否对整份代码重新进行AI分析。
+        否则结果依赖上一次提交(复用的AI分析和合并后的评分)，只属于提交者本人。
+        """
+        return self.previous_ai is None or not self.reused
+
+    def metrics_for(self, units: List[CodeUnit]) -> Dict[str, int]:
+        """若干单元的规模与复杂度指标之和"""
+        total = new_metrics()
+        for unit in units:
+            for name, value in self.unit_metrics[unit.fingerprint].items():
+                total[name] = total.get(name, 0) + value
+        return total
+
+
+def _usable_snapshot(snapshot: Optional[Dict], model: str) -> Optional[Dict]:
+    if not snapshot:
+        return None
+    if (snapshot.get("version") != SNAPSHOT_VERSION
+            or snapshot.get("ruleset_version") != RULESET_VERSION
+            or snapshot.get("model") != model):
+        return None
+    return snapshot
+
+
+def plan_incremental(code: str, language: str, snapshot: Optional[Dict]) -> Optional[IncrementalPlan]:
+    """
+    对比上一次的快照，计算需要重新分析的单元，并完成静态分析。
+    非Python代码或存在语法错误时返回None，由调用方走完整分析流程。
+    """
+    if language.lower() != "python":
+        return None
+    _, tree = _check_syntax(code, language)
+    if tree is None:
+        return None
+
+    lines = code.splitlines()
+    previous_units = snapshot["units"] if snapshot else {}
+    static_result = {"syntax_issues": [], "performance_issues": [], "security_issues": []}
+    unit_issues = {}
+    unit_metrics = {}
+    changed, reused = [], []
+
+    for unit in extract_units(tree):
+        stored = previous_units.get(unit.fingerprint)
+        if stored is None:
+            module = ast.Module(body=unit.nodes, type_ignores=[])
+            context = RuleContext(code, module)
+            context.state["metrics"] = new_metrics(unit.source(lines))
+            issues = python_rules.run(module, code, context)
+            unit_issues[unit.fingerprint] = [unit.to_relative(issue) for issue in issues]
+            unit_metrics[unit.fingerprint] = context.state["metrics"]
+            changed.append(unit)
+        else:
+            issues = [unit.to_absolute(item) for item in stored["issues"]]
+            unit_issues[unit.fingerprint] = stored["issues"]
+            unit_metrics[unit.fingerprint] = stored["metrics"]
+            reused.append(unit)
+
+        for issue in issues:
+            if issue.issue_type == AnalysisType.PERFORMANCE:
+                static_result["performance_issues"].append(issue)
+            elif issue.issue_type == AnalysisType.SECURITY:
+                static_result["security_issues"].append(issue)
+
+    for issues in static_result.values():
+        issues.sort(key=lambda issue: issue.line_number)
+
+    plan = IncrementalPlan(
+        units=changed + reused,
+        changed=changed,
+        reused=reused,
+        static_result=static_result,
+        unit_issues=unit_issues,
+        unit_metrics=unit_metrics,
+        changed_source="\n\n".join(unit.source(lines) for unit in changed),
+        previous_ai=snapshot.get("ai_analysis") if snapshot else None
+    )
+    static_result["metrics"] = plan.metrics_for(plan.units)
+    return plan
+
+
+def build_snapshot(plan: IncrementalPlan, ai_analysis: Dict, model: str) -> Dict:
+    """生成保存到学习会话中的分析快照"""
+    return {
+        "version": SNAPSHOT_VERSION,
+        "ruleset_version": RULESET_VERSION,
+        "model": model,
+        "units": {
+            unit.fingerprint: {
+                "name": unit.name,
+                "issues": plan.unit_issues[unit.fingerprint],
+                "metrics": plan.unit_metrics[unit.fingerprint]
+            }
+            for unit in plan.units
+        },
+        # AI分析失败或被跳过时不保存，下次提交重新完整分析
+        "ai_analysis": None if "error" in ai_analysis or ai_analysis.get("skipped") else {
+            "analysis": ai_analysis.get("analysis"),
+            "score": ai_analysis.get("score", 0)
+        }
+    }
+
+
+def _with_units(result: Dict, plan: IncrementalPlan) -> Dict:
+    return {
+        **result,
+        "incremental": {
+            "changed_units": [unit.name for unit in plan.changed],
+            "reused_units": [unit.name for unit in plan.reused]
+        }
+    }
+
+
+class IncrementalAnalyzer:
+    """在AsyncCodeAnalyzer之上按函数粒度增量分析"""
+
+    def __init__(self, analyzer: AsyncCodeAnalyzer):
+        self.analyzer = analyzer
+
+    async def analyze_code(self, code: str, language: str, user_level: str,
+                           previous_snapshot: Optional[Dict] = None) -> Tuple[Dict, Optional[Dict]]:
+        """
+        增量分析代码，返回(分析结果, 新快照)。
+        无法增量分析时(非Python代码、语法错误)退化为完整分析，快照为None。
+        """
+        analyzer = self.analyzer
+        snapshot = _usable_snapshot(previous_snapshot, analyzer.model)
+
+        plan = await analyzer.run_cpu_bound(plan_incremental, code, language, snapshot)
+        if plan is None:
+            return await analyzer.analyze_code(code, language, user_level), None
+
+        result = _with_units(await self._analyze_plan(plan, code, language, user_level), plan)
+        return result, build_snapshot(plan, result["ai_analysis"], analyzer.model)
+
+    async def analyze_code_stream(self, code: str, language: str, user_level: str,
+                                  previous_snapshot: Optional[Dict] = None) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        流式增量分析，事件与 AsyncCodeAnalyzer.analyze_code_stream 相同，
+        并在 ("result", ...) 之前产出 ("snapshot", 新快照或None)。
+        需要完整分析时流式输出AI分析(超出token预算时分块)；只修改了部分单元时只分析修改的部分，没有token事件。
+        """
+        analyzer = self.analyzer
+        snapshot = _usable_snapshot(previous_snapshot, analyzer.model)
+
+        plan = await analyzer.run_cpu_bound(plan_incremental, code, language, snapshot)
+        if plan is None or plan.full_analysis:
+            static_result = plan.static_result if plan is not None else None
+            async for event, data in analyzer.analyze_code_stream(code, language, user_level, static_result):
+                if event == "result":
+                    if plan is None:
+                        yield "snapshot", None
+                    else:
+                        data = _with_units(data, plan)
+                        yield "snapshot", build_snapshot(plan, data["ai_analysis"], analyzer.model)
+                yield event, data
+            return
+
+        yield "static", plan.static_result
+        result = _with_units(await self._analyze_plan(plan, code, language, user_level), plan)
+        yield "snapshot", build_snapshot(plan, result["ai_analysis"], analyzer.model)
+        yield "result", result
+
+    async def _analyze_plan(self, plan: IncrementalPlan, code: str, language: str, user_level: str) -> Dict:
+        analyzer = self.analyzer
+        cache_key = analyzer.cache_key(code, language, user_level)
+        result = await analyzer.cache.aget(cache_key) if cache_key is not None else None
+        if result is not None:
+            return result
+
+        async def compute() -> Dict:
+            ai_analysis, routing = await self._ai_analysis(plan, code, language, user_level)
+            computed = analyzer._build_result(plan.static_result, ai_analysis, routing)
+            # 缓存按完整代码寻址，只能写入完整分析的结果
+            if cache_key is not None and plan.full_analysis and "error" not in ai_analysis:
+                await analyzer.cache.aset(cache_key, computed)
+            return computed
+
+        if plan.full_analysis:
+            # 截止时间前大量相同的提交共享同一次LLM调用
+            return await analyzer.coalesce(analyzer.analysis_key(code, language, user_level), compute)
+        # 部分分析依赖各自的上一次提交，不能与其他相同代码的提交合并
+        return await compute()
+
+    async def _ai_analysis(self, plan: IncrementalPlan, code: str, language: str,
+                           user_level: str) -> Tuple[Dict, Optional[RoutingDecision]]:
+        """返回(AI分析结果, 路由决策)"""
+        analyzer = self.analyzer
+        previous_ai = plan.previous_ai
+
+        # 没有可复用的AI结果，或所有单元都修改过：完整分析
+        if previous_ai is None or not plan.reused:
+            return await analyzer.routed_ai_analysis(code, language, user_level, plan.static_result)
+
+        # 代码与上次语义相同：直接复用上次的AI分析
+        if not plan.changed:
+            return dict(previous_ai), None
+
+        # 只把修改过的单元发送给LLM，路由按修改部分的规模与复杂度决定
+        model = None
+        routing = None
+        if analyzer.router is not None:
+            routing = analyzer.router.route({"metrics": plan.metrics_for(plan.changed)})
+            if routing.tier is RoutingTier.STATIC:
+                return dict(previous_ai), routing
+            model = routing.model
+
+        unchanged = ", ".join(unit.name for unit in plan.reused)
+        partial_code = f"# 以下仅为本次修改的部分，未修改的部分: {unchanged}\n{plan.changed_source}"
+        ai_analysis = await analyzer.budgeted_ai_analysis(partial_code, language, user_level, model)
+        if "error" in ai_analysis:
+            return ai_analysis, routing
+
+        # 按代码行数加权合并新旧评分
+        changed_lines = sum(unit.line_count for unit in plan.changed)
+        reused_lines = sum(unit.line_count for unit in plan.reused)
+        score = (ai_analysis.get("score", 0) * changed_lines
+                 + previous_ai.get("score", 0) * reused_lines) / (changed_lines + reused_lines)
+        return {**ai_analysis, "score": round(score, 1)}, routing
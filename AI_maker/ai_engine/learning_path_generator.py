@@ -1,22 +1,16 @@
-import openai
-from typing import Dict, List, Optional
-from dataclasses import dataclass
-from enum import Enum
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from dataclasses import dataclass, field
 
-class SkillLevel(Enum):
-    BEGINNER = "beginner"
-    INTERMEDIATE = "intermediate"
-    ADVANCED = "advanced"
-
-@dataclass
-class LearningTopic:
-    id: str
-    title: str
-    description: str
-    difficulty: SkillLevel
-    estimated_hours: int
-    prerequisites: List[str]
-    tags: List[str]
+from llm_client import LLMClient, LLMClientConfig, get_llm_client
+from llm_scheduler import Priority, llm_context
+from lru_cache import LRUCache
+from topic_catalogue import LearningTopic, SkillLevel, TopicCatalogue, load_catalogue
+from topic_graph import TopicGraph
+from topic_index import TopicIndex, index_for
 
 @dataclass
 class LearningPath:
@@ -26,96 +20,215 @@ class LearningPath:
     topics: List[LearningTopic]
     estimated_completion_time: int  # 小时
     progress: float = 0.0
+    # 增量进度跟踪(见 LearningPathGenerator.track_progress)
+    tracker: Optional["ProgressTracker"] = field(default=None, repr=False, compare=False)
+
+class ProgressTracker:
+    """
+    学习路径的增量进度：维护已完成集合、累计数量和学时，以及已解锁但未完成的主题。
+    每次完成一个主题只更新受影响的部分，不需要重新统计整条路径。
+    """
+    
+    def __init__(self, path: LearningPath, graph: TopicGraph):
+        self.path = path
+        self.graph = graph
+        self.position = {topic.id: i for i, topic in enumerate(path.topics)}
+        self.hours = {topic.id: topic.estimated_hours for topic in path.topics}
+        self.total_topics = len(self.position)
+        self.total_hours = sum(self.hours.values())
+        
+        self.completed = set()  # 路径中已完成的主题
+        self.completed_hours = 0
+        # 所有已完成主题(包括路径外的前置主题)的位集
+        self._completed_mask = 0
+        
+        # 每个主题完成后可能被解锁的路径主题(以它为直接或间接前置主题)
+        self._waiting: Dict[str, List[str]] = {}
+        for topic_id in self.position:
+            if topic_id in graph:
+                for prereq in graph.prerequisites_of(topic_id):
+                    self._waiting.setdefault(prereq, []).append(topic_id)
+        self._unlocked = {topic_id for topic_id in self.position if self._is_unlocked(topic_id)}
+    
+    def _is_unlocked(self, topic_id: str) -> bool:
+        return topic_id not in self.graph or self.graph.is_unlocked(topic_id, self._completed_mask)
+    
+    def complete(self, topic_id: str) -> bool:
+        """记录完成一个主题，返回进度是否变化"""
+        index = self.graph.index.get(topic_id)
+        if index is not None:
+            if self._completed_mask >> index & 1:
+                return False
+            self._completed_mask |= 1 << index
+        
+        changed = False
+        if topic_id in self.position and topic_id not in self.completed:
+            self.completed.add(topic_id)
+            self.completed_hours += self.hours[topic_id]
+            self._unlocked.discard(topic_id)
+            changed = True
+        
+        for dependent in self._waiting.get(topic_id, ()):
+            if dependent not in self.completed and self._is_unlocked(dependent):
+                self._unlocked.add(dependent)
+        
+        self.path.progress = self.progress
+        return changed
+    
+    def complete_many(self, topic_ids: Iterable[str]) -> int:
+        return sum(1 for topic_id in topic_ids if self.complete(topic_id))
+    
+    def completed_ids(self) -> List[str]:
+        """全部已完成主题(包括路径外的前置主题)，用于保存进度"""
+        outside = sorted(topic_id for topic_id in self.completed if topic_id not in self.graph)
+        return self.graph.ids(self._completed_mask) + outside
+
+    @property
+    def completed_count(self) -> int:
+        return len(self.completed)
+    
+    @property
+    def progress(self) -> float:
+        if not self.total_topics:
+            return 0.0
+        return self.completed_count / self.total_topics * 100
+    
+    @property
+    def remaining_hours(self) -> int:
+        return self.total_hours - self.completed_hours
+    
+    def next_topics(self, limit: Optional[int] = None) -> List[LearningTopic]:
+        """已解锁但未完成的路径主题，按路径顺序排列"""
+        topic_ids = sorted(self._unlocked, key=self.position.__getitem__)
+        if limit is not None:
+            topic_ids = topic_ids[:limit]
+        return [self.path.topics[self.position[topic_id]] for topic_id in topic_ids]
+    
+    def snapshot(self) -> Dict:
+        """供进度接口直接返回的统计数据"""
+        return {
+            "progress": self.progress,
+            "completed_topics": self.completed_count,
+            "total_topics": self.total_topics,
+            "completed_hours": self.completed_hours,
+            "remaining_hours": self.remaining_hours,
+            "next_topics": [topic.id for topic in self.next_topics()]
+        }
+
+def path_to_dict(path: LearningPath) -> Dict:
+    """序列化学习路径，主题只保存ID(主题内容在主题目录中)"""
+    return {
+        "user_id": path.user_id,
+        "current_level": path.current_level.value,
+        "target_level": path.target_level.value,
+        "topic_ids": [topic.id for topic in path.topics],
+        "estimated_completion_time": path.estimated_completion_time,
+        "progress": path.progress,
+        "completed_topics": path.tracker.completed_ids() if path.tracker is not None else []
+    }
+
+def path_from_dict(data: Dict, catalogue: TopicCatalogue) -> LearningPath:
+    """还原学习路径；保存过的已完成主题恢复到进度跟踪器中"""
+    path = LearningPath(
+        user_id=data["user_id"],
+        current_level=SkillLevel(data["current_level"]),
+        target_level=SkillLevel(data["target_level"]),
+        topics=[catalogue[topic_id] for topic_id in data["topic_ids"]],
+        estimated_completion_time=data["estimated_completion_time"],
+        progress=data.get("progress", 0.0)
+    )
+    if data.get("completed_topics"):
+        path.tracker = ProgressTracker(path, catalogue.graph)
+        path.tracker.complete_many(data["completed_topics"])
+    return path
+
+def normalize_profile(user_profile: Dict) -> Dict:
+    """学习路径只取决于水平、编程语言和学习目标，其余字段(例如user_id)不影响结果"""
+    languages = user_profile.get("programming_languages") or []
+    goals = user_profile.get("learning_goals") or "提高编程技能"
+    return {
+        "skill_level": SkillLevel(user_profile.get("skill_level", "beginner")).value,
+        "programming_languages": sorted({language.strip().lower() for language in languages}),
+        "learning_goals": goals.strip() if isinstance(goals, str) else goals
+    }
+
+def profile_fingerprint(profile: Dict, model: str, catalogue_version: str) -> str:
+    """学习路径缓存键：规范化后的用户画像 + 模型 + 主题目录版本"""
+    payload = json.dumps([profile, model, catalogue_version], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 class LearningPathGenerator:
-    def __init__(self, api_key: str, model: str = "gpt-4"):
-        self.client = openai.OpenAI(api_key=api_key)
+    def __init__(self, api_key: str, model: str = "gpt-4", catalogue: Optional[TopicCatalogue] = None,
+                 catalogue_path: Optional[str] = None, cache_size: int = 1024, cache_ttl: Optional[float] = 3600,
+                 failure_cache_ttl: float = 60, max_path_topics: int = 10,
+                 llm_client: Optional[LLMClient] = None, ai_deadline: Optional[float] = None):
+        # 与代码分析器共享的LLM客户端(见 llm_client)，也可以是 llm_scheduler.LLMScheduler
+        self.llm = llm_client or get_llm_client(LLMClientConfig(api_key=api_key))
+        self.ai_deadline = ai_deadline
         self.model = model
         
-        # 预定义的学习主题
-        self.topics_database = self._initialize_topics()
-    
-    def _initialize_topics(self) -> Dict[str, LearningTopic]:
-        """初始化学习主题数据库"""
-        topics = {
-            # Python 基础主题
-            "python_basics": LearningTopic(
-                id="python_basics",
-                title="Python基础语法",
-                description="学习Python的基本语法、变量、数据类型、控制流等",
-                difficulty=SkillLevel.BEGINNER,
-                estimated_hours=10,
-                prerequisites=[],
-                tags=["python", "基础", "语法"]
-            ),
-            "python_functions": LearningTopic(
-                id="python_functions",
-                title="函数和模块",
-                description="学习函数定义、参数传递、模块导入等",
-                difficulty=SkillLevel.BEGINNER,
-                estimated_hours=8,
-                prerequisites=["python_basics"],
-                tags=["python", "函数", "模块"]
-            ),
-            "python_oop": LearningTopic(
-                id="python_oop",
-                title="面向对象编程",
-                description="学习类、对象、继承、多态等OOP概念",
-                difficulty=SkillLevel.INTERMEDIATE,
-                estimated_hours=12,
-                prerequisites=["python_functions"],
-                tags=["python", "OOP", "类"]
-            ),
-            "python_data_structures": LearningTopic(
-                id="python_data_structures",
-                title="数据结构",
-                description="学习列表、字典、集合、元组等数据结构",
-                difficulty=SkillLevel.BEGINNER,
-                estimated_hours=6,
-                prerequisites=["python_basics"],
-                tags=["python", "数据结构"]
-            ),
-            "python_algorithms": LearningTopic(
-                id="python_algorithms",
-                title="算法基础",
-                description="学习排序、搜索、递归等基础算法",
-                difficulty=SkillLevel.INTERMEDIATE,
-                estimated_hours=15,
-                prerequisites=["python_data_structures"],
-                tags=["python", "算法"]
-            ),
-            "python_web": LearningTopic(
-                id="python_web",
-                title="Web开发基础",
-                description="学习Flask/Django框架进行Web开发",
-                difficulty=SkillLevel.INTERMEDIATE,
-                estimated_hours=20,
-                prerequisites=["python_oop"],
-                tags=["python", "web", "框架"]
-            ),
-            "python_ai": LearningTopic(
-                id="python_ai",
-                title="人工智能入门",
-                description="学习机器学习基础，使用scikit-learn等库",
-                difficulty=SkillLevel.ADVANCED,
-                estimated_hours=25,
-                prerequisites=["python_algorithms"],
-                tags=["python", "AI", "机器学习"]
-            )
-        }
-        return topics
+        # 学习主题目录(mmap按需读取)，同一进程内的生成器共享同一个目录
+        self.catalogue_path = catalogue_path
+        self._follow_catalogue = catalogue is None
+        self.topics_database = catalogue if catalogue is not None else load_catalogue(catalogue_path)
+        # 单条学习路径的主题数上限
+        self.max_path_topics = max_path_topics
+        
+        # 学习路径缓存：画像相同的用户共享同一次LLM调用的结果(主题ID顺序)
+        self.path_cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+        # AI优化失败时的结果只短暂缓存，避免LLM故障期间每个请求都重试
+        self.failure_cache_ttl = failure_cache_ttl
+        self._inflight: Dict[str, threading.Lock] = {}
+        self._inflight_lock = threading.Lock()
+    
+    @property
+    def topic_graph(self) -> TopicGraph:
+        """前置依赖索引，首次使用时编译(检查循环依赖)并随目录共享"""
+        return self.topics_database.graph
     
     def generate_personalized_path(self, user_profile: Dict) -> LearningPath:
         """生成个性化学习路径"""
-        current_level = SkillLevel(user_profile.get("skill_level", "beginner"))
-        target_level = self._determine_target_level(current_level)
-        programming_languages = user_profile.get("programming_languages", [])
-        
-        # 根据用户水平选择合适的话题
-        selected_topics = self._select_topics_for_level(current_level, programming_languages)
+        self.refresh_catalogue()
+        profile = normalize_profile(user_profile)
+        return self._build_path(user_profile, profile, self._cached_topic_ids(profile))
+    
+    def generate_paths_bulk(self, user_profiles: Iterable[Dict], concurrency: int = 8) -> Iterator[LearningPath]:
+        """
+        批量生成学习路径(例如新学校的全部用户)：画像相同的用户只调用一次LLM，
+        LLM调用在线程池中并发执行，每组画像完成后立即产出该组用户的路径。
+        """
+        self.refresh_catalogue()
+        version = self.topics_database.version
+        groups: Dict[str, Tuple[Dict, List[Dict]]] = {}
+        for user_profile in user_profiles:
+            profile = normalize_profile(user_profile)
+            key = profile_fingerprint(profile, self.model, version)
+            groups.setdefault(key, (profile, []))[1].append(user_profile)
         
-        # 使用AI优化学习路径
-        optimized_topics = self._optimize_path_with_ai(selected_topics, user_profile)
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="learning-path")
+        try:
+            futures = {
+                executor.submit(self._batch_topic_ids, profile): (profile, members)
+                for profile, members in groups.values()
+            }
+            for future in as_completed(futures):
+                profile, members = futures[future]
+                topic_ids = future.result()
+                for user_profile in members:
+                    yield self._build_path(user_profile, profile, topic_ids)
+        finally:
+            # 调用方提前停止迭代时不再等待剩余的LLM调用
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _batch_topic_ids(self, profile: Dict) -> List[str]:
+        # 批量生成属于离线任务，经过调度器时LLM调用让位于交互式请求
+        with llm_context(priority=Priority.BATCH):
+            return self._cached_topic_ids(profile)
+    
+    def _build_path(self, user_profile: Dict, profile: Dict, topic_ids: Iterable[str]) -> LearningPath:
+        current_level = SkillLevel(profile["skill_level"])
+        target_level = self._determine_target_level(current_level)
+        optimized_topics = [self.topics_database[topic_id] for topic_id in topic_ids]
         
         # 计算预计完成时间
         total_hours = sum(topic.estimated_hours for topic in optimized_topics)
@@ -128,6 +241,64 @@ class LearningPathGenerator:
             estimated_completion_time=total_hours
         )
     
+    def refresh_catalogue(self) -> bool:
+        """主题目录文件被替换时切换到新目录并清空路径缓存，返回目录是否变化"""
+        if not self._follow_catalogue:
+            return False
+        catalogue = load_catalogue(self.catalogue_path)
+        if catalogue is self.topics_database:
+            return False
+        changed = catalogue.version != self.topics_database.version
+        self.topics_database = catalogue
+        # 缓存键包含目录版本，旧条目不会再命中，这里只是尽早释放
+        if changed:
+            self.path_cache.clear()
+        return changed
+    
+    def _cached_topic_ids(self, profile: Dict) -> Tuple[str, ...]:
+        key = profile_fingerprint(profile, self.model, self.topics_database.version)
+        topic_ids = self.path_cache.get(key)
+        if topic_ids is not None:
+            return topic_ids
+        
+        # 相同画像的并发请求只有一个调用LLM，其余等待结果
+        with self._inflight_lock:
+            lock = self._inflight.setdefault(key, threading.Lock())
+        try:
+            with lock:
+                topic_ids = self.path_cache.get(key)
+                if topic_ids is None:
+                    topic_ids = self._generate_topic_ids(profile, key)
+        finally:
+            with self._inflight_lock:
+                if self._inflight.get(key) is lock:
+                    del self._inflight[key]
+        return topic_ids
+    
+    def _generate_topic_ids(self, profile: Dict, key: str) -> Tuple[str, ...]:
+        # 根据用户水平选择合适的话题
+        selected_topics = self._select_topics_for_level(
+            SkillLevel(profile["skill_level"]), profile["programming_languages"]
+        )
+        
+        # 没有可选主题时不调用AI，空路径只短暂缓存
+        if not selected_topics:
+            self.path_cache.set(key, (), ttl=self.failure_cache_ttl)
+            return ()
+        
+        # 使用AI优化学习路径
+        optimized_topics = self._optimize_path_with_ai(selected_topics, profile)
+        if optimized_topics is None:
+            topic_ids = tuple(topic.id for topic in selected_topics)
+            self.path_cache.set(key, topic_ids, ttl=self.failure_cache_ttl)
+        else:
+            topic_ids = tuple(topic.id for topic in optimized_topics)
+            self.path_cache.set(key, topic_ids)
+        return topic_ids
+    
+    def cache_stats(self) -> Dict[str, int]:
+        return self.path_cache.stats()
+    
     def _determine_target_level(self, current_level: SkillLevel) -> SkillLevel:
         """确定目标水平"""
         if current_level == SkillLevel.BEGINNER:
@@ -137,34 +308,29 @@ class LearningPathGenerator:
         else:
             return SkillLevel.ADVANCED  # 已经是高级水平
     
+    @property
+    def topic_index(self) -> TopicIndex:
+        """主题倒排索引(读取编译好的目录)，按目录共享；目录重新编译后换用新目录的索引"""
+        return index_for(self.topics_database)
+    
     def _select_topics_for_level(self, level: SkillLevel, languages: List[str]) -> List[LearningTopic]:
-        """根据水平选择话题"""
-        selected_topics = []
-        
-        if level == SkillLevel.BEGINNER:
-            # 初学者：基础语法 + 数据结构
-            selected_topics = [
-                self.topics_database["python_basics"],
-                self.topics_database["python_data_structures"],
-                self.topics_database["python_functions"]
-            ]
-        elif level == SkillLevel.INTERMEDIATE:
-            # 中级：OOP + 算法 + Web开发
-            selected_topics = [
-                self.topics_database["python_oop"],
-                self.topics_database["python_algorithms"],
-                self.topics_database["python_web"]
-            ]
-        else:
-            # 高级：AI/ML + 高级主题
-            selected_topics = [
-                self.topics_database["python_ai"]
-            ]
-        
-        return selected_topics
+        """根据水平和编程语言选择话题(未指定语言时不限语言)，按前置依赖顺序排列"""
+        topic_ids = self.topic_index.match_tags(languages, difficulty=level)
+        if not topic_ids and languages:
+            # 目录中没有该语言的主题时只按水平选择
+            topic_ids = self.topic_index.match_tags([], difficulty=level)
+        ordered = self.topic_graph.sort_topics(topic_ids)[:self.max_path_topics]
+        return [self.topics_database[topic_id] for topic_id in ordered]
     
-    def _optimize_path_with_ai(self, topics: List[LearningTopic], user_profile: Dict) -> List[LearningTopic]:
-        """使用AI优化学习路径"""
+    def search_topics(self, query: str, languages: Optional[List[str]] = None,
+                      limit: int = 10) -> List[LearningTopic]:
+        """按相关度搜索主题，可限定编程语言"""
+        index = self.topic_index
+        candidates = index.match_tags(languages) if languages else None
+        return [self.topics_database[topic_id] for topic_id, _ in index.search(query, limit, candidates)]
+    
+    def _optimize_path_with_ai(self, topics: List[LearningTopic], user_profile: Dict) -> Optional[List[LearningTopic]]:
+        """使用AI优化学习路径，失败时返回None"""
         topic_names = [topic.title for topic in topics]
         
         prompt = f"""
@@ -185,7 +351,8 @@ class LearningPathGenerator:
         """
         
         try:
-            response = self.client.chat.completions.create(
+            response = self.llm.chat(
+                deadline=self.ai_deadline,
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3
@@ -197,33 +364,57 @@ class LearningPathGenerator:
             
         except Exception as e:
             print(f"AI优化失败: {e}")
-            return topics
+            return None
     
-    def get_next_topic(self, learning_path: LearningPath, completed_topics: List[str]) -> Optional[LearningTopic]:
+    def get_next_topic(self, learning_path: LearningPath, completed_topics: Iterable[str]) -> Optional[LearningTopic]:
         """获取下一个学习主题"""
+        completed = set(completed_topics)
+        completed_mask = self.topic_graph.mask(completed)
         for topic in learning_path.topics:
-            if topic.id not in completed_topics:
+            if topic.id not in completed:
                 # 检查前置条件是否满足
-                if self._check_prerequisites(topic, completed_topics):
+                if self._check_prerequisites(topic, completed, completed_mask):
                     return topic
         return None
     
-    def _check_prerequisites(self, topic: LearningTopic, completed_topics: List[str]) -> bool:
-        """检查前置条件是否满足"""
-        for prereq in topic.prerequisites:
-            if prereq not in completed_topics:
-                return False
-        return True
+    def get_available_topics(self, completed_topics: Iterable[str], limit: Optional[int] = None) -> List[LearningTopic]:
+        """主题库中所有已解锁但尚未完成的主题，按学习顺序排列"""
+        completed_mask = self.topic_graph.mask(completed_topics)
+        return [
+            self.topics_database[topic_id]
+            for topic_id in self.topic_graph.next_available(completed_mask, limit=limit)
+        ]
     
-    def update_progress(self, learning_path: LearningPath, completed_topics: List[str]) -> float:
-        """更新学习进度"""
-        total_topics = len(learning_path.topics)
-        completed_count = len([t for t in learning_path.topics if t.id in completed_topics])
-        
-        progress = (completed_count / total_topics) * 100
-        learning_path.progress = progress
-        
-        return progress
+    def _check_prerequisites(self, topic: LearningTopic, completed_topics: Iterable[str],
+                             completed_mask: Optional[int] = None) -> bool:
+        """检查前置条件(包括间接前置主题)是否满足"""
+        if topic.id not in self.topic_graph:
+            # 不在主题库中的主题只检查直接前置条件
+            completed = completed_topics if isinstance(completed_topics, (set, frozenset)) else set(completed_topics)
+            return all(prereq in completed for prereq in topic.prerequisites)
+        if completed_mask is None:
+            completed_mask = self.topic_graph.mask(completed_topics)
+        return self.topic_graph.is_unlocked(topic.id, completed_mask)
+    
+    def track_progress(self, learning_path: LearningPath) -> ProgressTracker:
+        """
+        获取学习路径的进度跟踪器(增量接口)，首次调用时创建并挂到路径上，
+        之后通过 complete/complete_many 记录新完成的主题
+        """
+        if learning_path.tracker is None:
+            learning_path.tracker = ProgressTracker(learning_path, self.topic_graph)
+        return learning_path.tracker
+    
+    def update_progress(self, learning_path: LearningPath, completed_topics: Iterable[str]) -> float:
+        """按完整的已完成主题集合重新计算学习进度"""
+        completed = set(completed_topics)
+        tracker = learning_path.tracker
+        # 只新增了完成的主题时复用跟踪器，有主题被撤销完成时重新计算
+        if tracker is None or not completed.issuperset(tracker.completed_ids()):
+            tracker = learning_path.tracker = ProgressTracker(learning_path, self.topic_graph)
+        tracker.complete_many(completed)
+        learning_path.progress = tracker.progress
+        return learning_path.progress
     
     def generate_encouragement(self, progress: float, user_level: str) -> str:
         """生成鼓励信息"""
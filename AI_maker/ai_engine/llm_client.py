@@ -0,0 +1,200 @@
+"""
+共享的LLM客户端
+
+代码分析和学习路径生成共用同一组HTTP连接池：
+- 按配置(API Key、服务地址等)在进程内共享，连接保持keep-alive，减少TLS握手
+- 每次调用可以设置总截止时间，重试不会超过截止时间
+- 429和5xx响应以及连接错误按带随机抖动的指数退避重试，优先遵守Retry-After
+- base_url 可以指向本地的OpenAI兼容服务(例如压测用的模拟服务)
+"""
+
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import httpx
+import openai
+
+# 可重试的错误：限流、服务端错误、连接错误和超时
+_RETRYABLE = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+
+@dataclass(frozen=True)
+class LLMClientConfig:
+    api_key: str
+    base_url: Optional[str] = None
+    timeout: float = 60.0  # 单次请求的超时时间(秒)
+    connect_timeout: float = 5.0
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    max_retries: int = 3
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+
+
+class DeadlineExceeded(TimeoutError):
+    """调用超过了截止时间(包括重试)"""
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class LLMClient:
+    """带连接池、截止时间和重试策略的OpenAI兼容客户端"""
+
+    def __init__(self, config: LLMClientConfig):
+        self.config = config
+        limits = httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry
+        )
+        timeout = httpx.Timeout(config.timeout, connect=config.connect_timeout)
+        self._http = httpx.Client(limits=limits, timeout=timeout)
+        self._async_http = httpx.AsyncClient(limits=limits, timeout=timeout)
+        # 重试由这里统一处理，关闭SDK自带的重试
+        self.sync_client = openai.OpenAI(
+            api_key=config.api_key, base_url=config.base_url,
+            http_client=self._http, max_retries=0, timeout=timeout
+        )
+        self.async_client = openai.AsyncOpenAI(
+            api_key=config.api_key, base_url=config.base_url,
+            http_client=self._async_http, max_retries=0, timeout=timeout
+        )
+
+        self._lock = threading.Lock()
+        self.counters = {
+            "calls": 0, "attempts": 0, "retries": 0, "failures": 0,
+            "rate_limited": 0, "server_errors": 0, "connection_errors": 0, "deadline_exceeded": 0,
+        }
+
+    def chat(self, deadline: Optional[float] = None, **kwargs) -> Any:
+        """chat.completions.create，deadline为包括重试在内的总时间(秒)"""
+        expires_at = time.monotonic() + deadline if deadline is not None else None
+        self._count("calls")
+        attempt = 0
+        while True:
+            timeout = self._attempt_timeout(expires_at)
+            self._count("attempts")
+            try:
+                return self.sync_client.chat.completions.create(timeout=timeout, **kwargs)
+            except _RETRYABLE as e:
+                delay = self._next_delay(e, attempt, expires_at)
+                attempt += 1
+            time.sleep(delay)
+
+    async def achat(self, deadline: Optional[float] = None, **kwargs) -> Any:
+        """异步版本；stream=True时只重试建立流之前的失败"""
+        expires_at = time.monotonic() + deadline if deadline is not None else None
+        self._count("calls")
+        attempt = 0
+        while True:
+            timeout = self._attempt_timeout(expires_at)
+            self._count("attempts")
+            try:
+                return await self.async_client.chat.completions.create(timeout=timeout, **kwargs)
+            except _RETRYABLE as e:
+                delay = self._next_delay(e, attempt, expires_at)
+                attempt += 1
+            await asyncio.sleep(delay)
+
+    def _attempt_timeout(self, expires_at: Optional[float]) -> httpx.Timeout:
+        timeout = self.config.timeout
+        if expires_at is not None:
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                self._count("deadline_exceeded")
+                raise DeadlineExceeded("LLM调用超过截止时间")
+            timeout = min(timeout, remaining)
+        return httpx.Timeout(timeout, connect=min(self.config.connect_timeout, timeout))
+
+    def _next_delay(self, error: Exception, attempt: int, expires_at: Optional[float]) -> float:
+        """计算下一次重试前的等待时间，不能重试时重新抛出错误"""
+        if isinstance(error, openai.RateLimitError):
+            self._count("rate_limited")
+        elif isinstance(error, openai.InternalServerError):
+            self._count("server_errors")
+        else:
+            self._count("connection_errors")
+
+        if attempt >= self.config.max_retries:
+            self._count("failures")
+            raise error
+
+        # full jitter：在 [0, min(上限, 基数 × 2^n)] 内随机等待，避免大量请求同时重试
+        delay = random.uniform(0, min(self.config.backoff_max, self.config.backoff_base * 2 ** attempt))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if expires_at is not None and time.monotonic() + delay >= expires_at:
+            self._count("failures")
+            raise error
+
+        self._count("retries")
+        return delay
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "pool": _pool_stats(self._http),
+            "async_pool": _pool_stats(self._async_http),
+        }
+
+    def close(self) -> None:
+        self._http.close()
+
+    async def aclose(self) -> None:
+        self._http.close()
+        await self._async_http.aclose()
+
+
+def _pool_stats(client) -> Dict[str, int]:
+    """连接池中的连接数(依赖httpcore的内部结构，取不到时返回空)"""
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is None:
+        return {}
+    return {
+        "connections": len(connections),
+        "idle": sum(1 for connection in connections if connection.is_idle()),
+    }
+
+
+_clients: Dict[LLMClientConfig, LLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(config: LLMClientConfig) -> LLMClient:
+    """获取进程内共享的客户端，相同配置复用同一组连接池"""
+    with _clients_lock:
+        client = _clients.get(config)
+        if client is None:
+            client = _clients[config] = LLMClient(config)
+        return client
+
+
+async def close_llm_clients() -> None:
+    """关闭所有共享客户端(应用退出时调用)"""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,360 @@
+"""
+LLM请求调度器
+
+放在 LLMClient 前面，协调交互式请求(/analyze)和后台任务(批量评分、学习路径生成)：
+- 请求数和token数各用一个令牌桶限流，token数按提示长度和max_tokens预估，
+  响应返回usage后按实际用量多退少补
+- 按优先级排队，交互式请求总是先被放行；低优先级只能使用桶中超出预留的部分，
+  交互式请求到来时总有余量，批量任务只消耗空闲的配额
+- 同一优先级内按用户轮转，单个用户大量提交不会挤占其他用户
+- 队列已满或排队超时的请求抛出 LoadShedError，调用方可以据此降级，stats()中可以看到各类丢弃数量
+
+优先级和用户通过 llm_context 设置，在同一线程/协程及其创建的任务中生效：
+
+    with llm_context(user_id=user.id, priority=Priority.INTERACTIVE):
+        result = await analyzer.analyze_code(code, language, level)
+
+限流在进程内生效，多个worker时每个进程应配置为服务商配额的相应份额。
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from llm_client import LLMClient
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # 用户正在等待结果
+    BACKGROUND = 1   # 批量提交等用户发起的后台任务
+    BATCH = 2        # 离线批处理，只使用空闲配额
+
+
+class LoadShedError(RuntimeError):
+    """请求被调度器丢弃(队列已满或排队超时)"""
+
+    def __init__(self, reason: str, priority: Priority, retry_after: Optional[float] = None):
+        super().__init__(f"LLM请求被限流丢弃({priority.name.lower()}): {reason}")
+        self.reason = reason
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+_priority: contextvars.ContextVar = contextvars.ContextVar("llm_priority", default=None)
+_user: contextvars.ContextVar = contextvars.ContextVar("llm_user", default=None)
+
+
+@contextmanager
+def llm_context(user_id: Any = None, priority: Optional[Priority] = None):
+    """设置当前上下文中LLM调用所属的用户和优先级"""
+    tokens = []
+    if user_id is not None:
+        tokens.append((_user, _user.set(user_id)))
+    if priority is not None:
+        tokens.append((_priority, _priority.set(priority)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class TokenBucket:
+    """令牌桶：以rate每秒的速度补充，最多累积capacity；允许结算后为负数"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, reserve: float, now: float) -> float:
+        """取出amount后仍保留reserve所需等待的时间"""
+        self._refill(now)
+        missing = amount + reserve - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level -= amount
+
+    def refund(self, amount: float) -> None:
+        """按实际用量结算：amount为正退回，为负补扣"""
+        self.level = min(self.capacity, self.level + amount)
+
+
+class _Waiter:
+    __slots__ = ("priority", "user", "tokens", "future", "enqueued_at", "expires_at", "queued")
+
+    def __init__(self, priority: Priority, user: Any, tokens: int, expires_at: float):
+        self.priority = priority
+        self.user = user
+        self.tokens = tokens
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+        self.expires_at = expires_at
+        self.queued = False
+
+
+class _FairQueue:
+    """同一优先级的等待队列：按用户分组，轮流放行各用户的队首请求"""
+
+    def __init__(self):
+        self._users: "OrderedDict[Any, Deque[_Waiter]]" = OrderedDict()
+        self.size = 0
+
+    def push(self, waiter: _Waiter) -> None:
+        queue = self._users.get(waiter.user)
+        if queue is None:
+            queue = self._users[waiter.user] = deque()
+        queue.append(waiter)
+        waiter.queued = True
+        self.size += 1
+
+    def peek(self) -> Optional[_Waiter]:
+        # 跳过已被调用方取消或已超时的请求
+        while self._users:
+            user, queue = next(iter(self._users.items()))
+            while queue and queue[0].future.done():
+                self.discard(queue.popleft())
+            if queue:
+                return queue[0]
+            del self._users[user]
+        return None
+
+    def pop(self) -> _Waiter:
+        user, queue = next(iter(self._users.items()))
+        waiter = queue.popleft()
+        waiter.queued = False
+        self.size -= 1
+        # 放行一个请求后该用户排到队尾
+        del self._users[user]
+        if queue:
+            self._users[user] = queue
+        return waiter
+
+    def discard(self, waiter: _Waiter) -> None:
+        """请求已超时或被取消；它在peek时才移出队列，这里先修正计数"""
+        if waiter.queued:
+            waiter.queued = False
+            self.size -= 1
+
+
+def estimate_tokens(kwargs: Dict) -> int:
+    """预估一次调用消耗的token数：提示按约3个字符一个token，加上最大输出长度"""
+    chars = sum(len(str(message.get("content") or "")) for message in kwargs.get("messages", []))
+    return chars // 3 + 1 + int(kwargs.get("max_tokens") or 512)
+
+
+class LLMScheduler:
+    """
+    按优先级和用户公平调度LLM请求，接口与 LLMClient 相同(chat/achat)，可以直接替换。
+    """
+
+    # 各优先级需要在桶中保留的比例：低优先级放行后桶中至少还剩这么多
+    DEFAULT_RESERVE = {Priority.INTERACTIVE: 0.0, Priority.BACKGROUND: 0.1, Priority.BATCH: 0.3}
+    DEFAULT_MAX_QUEUE = {Priority.INTERACTIVE: 200, Priority.BACKGROUND: 500, Priority.BATCH: 5000}
+    DEFAULT_MAX_WAIT = {Priority.INTERACTIVE: 10.0, Priority.BACKGROUND: 60.0, Priority.BATCH: 600.0}
+
+    def __init__(self, client: LLMClient, requests_per_minute: float = 500,
+                 tokens_per_minute: float = 150000, default_priority: Priority = Priority.INTERACTIVE,
+                 reserve: Optional[Dict[Priority, float]] = None,
+                 max_queue: Optional[Dict[Priority, int]] = None,
+                 max_wait: Optional[Dict[Priority, float]] = None):
+        self.client = client
+        self.default_priority = default_priority
+        # 桶容量为一分钟的配额，与服务商按分钟计算的限额一致
+        self._requests = TokenBucket(requests_per_minute / 60.0, requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute)
+        self.reserve = {**self.DEFAULT_RESERVE, **(reserve or {})}
+        self.max_queue = {**self.DEFAULT_MAX_QUEUE, **(max_queue or {})}
+        self.max_wait = {**self.DEFAULT_MAX_WAIT, **(max_wait or {})}
+
+        self._queues = {priority: _FairQueue() for priority in Priority}
+        self._expiry: List[Tuple[float, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._counters = {
+            priority: {"admitted": 0, "shed_queue_full": 0, "shed_timeout": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for priority in Priority
+        }
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="llm-scheduler", daemon=True)
+        self._dispatcher.start()
+
+    def chat(self, deadline: Optional[float] = None, **kwargs) -> Any:
+        """排队等待放行后调用 LLMClient.chat；deadline包括排队时间"""
+        started = time.monotonic()
+        waiter = self._submit(deadline, kwargs)
+        waiter.future.result()
+        response = None
+        try:
+            response = self.client.chat(deadline=self._remaining(deadline, started), **kwargs)
+            return response
+        finally:
+            self._settle(waiter, response)
+
+    async def achat(self, deadline: Optional[float] = None, **kwargs) -> Any:
+        started = time.monotonic()
+        waiter = self._submit(deadline, kwargs)
+        # 调用方被取消时Future随之取消，调度器会跳过它
+        await asyncio.wrap_future(waiter.future)
+        response = None
+        try:
+            response = await self.client.achat(deadline=self._remaining(deadline, started), **kwargs)
+            return response
+        finally:
+            self._settle(waiter, response)
+
+    @staticmethod
+    def _remaining(deadline: Optional[float], started: float) -> Optional[float]:
+        if deadline is None:
+            return None
+        return max(0.0, deadline - (time.monotonic() - started))
+
+    def _submit(self, deadline: Optional[float], kwargs: Dict) -> _Waiter:
+        priority = _priority.get()
+        priority = self.default_priority if priority is None else Priority(priority)
+        max_wait = self.max_wait[priority]
+        if deadline is not None:
+            max_wait = min(max_wait, deadline)
+        # 单次请求的预估不超过桶容量，否则永远无法放行
+        tokens = min(estimate_tokens(kwargs), int(self._tokens.capacity))
+        waiter = _Waiter(priority, _user.get(), tokens, time.monotonic() + max_wait)
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("LLM调度器已关闭")
+            queue = self._queues[priority]
+            if queue.size >= self.max_queue[priority]:
+                self._counters[priority]["shed_queue_full"] += 1
+                raise LoadShedError("queue_full", priority, retry_after=self._backlog_seconds(priority))
+            queue.push(waiter)
+            waiter.future.add_done_callback(lambda future: self._on_cancelled(waiter, future))
+            heapq.heappush(self._expiry, (waiter.expires_at, next(self._sequence), waiter))
+            self._cond.notify()
+        return waiter
+
+    def _on_cancelled(self, waiter: _Waiter, future: Future) -> None:
+        if future.cancelled():
+            with self._cond:
+                self._queues[waiter.priority].discard(waiter)
+
+    def _backlog_seconds(self, priority: Priority) -> float:
+        """按当前速率放行该优先级及更高优先级的排队请求大约需要的时间"""
+        queued = sum(self._queues[p].size for p in Priority if p <= priority)
+        return queued / self._requests.rate
+
+    def _settle(self, waiter: _Waiter, response: Any) -> None:
+        """按响应中的实际用量结算token；没有usage(例如流式响应或调用失败)时保留预估值"""
+        usage = getattr(response, "usage", None)
+        total = getattr(usage, "total_tokens", None)
+        if total is None:
+            return
+        with self._cond:
+            self._tokens.refund(waiter.tokens - total)
+            self._cond.notify()
+
+    def _dispatch_loop(self) -> None:
+        with self._cond:
+            while not self._closed:
+                now = time.monotonic()
+                self._expire(now)
+                waiter, wait = self._next_waiter(now)
+                if waiter is not None:
+                    self._admit(waiter, now)
+                    continue
+                if self._expiry:
+                    next_expiry = self._expiry[0][0] - now
+                    wait = next_expiry if wait is None else min(wait, next_expiry)
+                self._cond.wait(timeout=wait)
+
+    def _next_waiter(self, now: float) -> Tuple[Optional[_Waiter], Optional[float]]:
+        """
+        严格按优先级：最高优先级的队首请求还不能放行时，低优先级的请求也不放行，
+        避免大请求一直被小请求插队。返回 (可放行的请求, 需要等待的秒数)。
+        """
+        for priority in Priority:
+            waiter = self._queues[priority].peek()
+            if waiter is None:
+                continue
+            share = self.reserve[priority]
+            wait = max(
+                self._requests.wait_time(1, share * self._requests.capacity, now),
+                self._tokens.wait_time(waiter.tokens, share * self._tokens.capacity, now)
+            )
+            if wait > 0:
+                return None, wait
+            return self._queues[priority].pop(), None
+        return None, None
+
+    def _admit(self, waiter: _Waiter, now: float) -> None:
+        # 调用方已取消时不消耗配额
+        if not waiter.future.set_running_or_notify_cancel():
+            return
+        self._requests.take(1, now)
+        self._tokens.take(waiter.tokens, now)
+        waited = now - waiter.enqueued_at
+        counters = self._counters[waiter.priority]
+        counters["admitted"] += 1
+        counters["wait_total"] += waited
+        counters["wait_max"] = max(counters["wait_max"], waited)
+        waiter.future.set_result(waited)
+
+    def _expire(self, now: float) -> None:
+        while self._expiry and self._expiry[0][0] <= now:
+            _, _, waiter = heapq.heappop(self._expiry)
+            if waiter.future.done() or not waiter.future.set_running_or_notify_cancel():
+                continue
+            self._counters[waiter.priority]["shed_timeout"] += 1
+            self._queues[waiter.priority].discard(waiter)
+            waiter.future.set_exception(LoadShedError(
+                "timeout", waiter.priority, retry_after=self._backlog_seconds(waiter.priority)
+            ))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            now = time.monotonic()
+            self._requests._refill(now)
+            self._tokens._refill(now)
+            priorities = {}
+            for priority in Priority:
+                counters = self._counters[priority]
+                admitted = counters["admitted"]
+                priorities[priority.name.lower()] = {
+                    "queued": self._queues[priority].size,
+                    "admitted": admitted,
+                    "shed_queue_full": counters["shed_queue_full"],
+                    "shed_timeout": counters["shed_timeout"],
+                    "avg_wait_ms": round(counters["wait_total"] / admitted * 1000, 1) if admitted else 0.0,
+                    "max_wait_ms": round(counters["wait_max"] * 1000, 1),
+                }
+            return {
+                "requests_available": round(self._requests.level, 1),
+                "tokens_available": round(self._tokens.level),
+                "priorities": priorities,
+                "client": self.client.stats(),
+            }
+
+    def close(self) -> None:
+        """停止调度，仍在排队的请求以 LoadShedError 结束"""
+        with self._cond:
+            self._closed = True
+            for priority, queue in self._queues.items():
+                while queue.peek() is not None:
+                    waiter = queue.pop()
+                    if waiter.future.set_running_or_notify_cancel():
+                        waiter.future.set_exception(LoadShedError("closed", priority))
+            self._cond.notify_all()
@@ -0,0 +1,71 @@
+"""
+分级模型路由
+
+根据静态分析结果决定是否调用LLM以及调用哪个模型：
+- static：静态分析已能给出结论(例如语法错误、空代码)，不调用LLM
+- fast：规模和复杂度较小的代码，使用更便宜、更快的模型
+- full：规模或复杂度超过阈值时才使用大模型
+"""
+
+from dataclasses import asdict, dataclass, field
+from enum import Enum
+from typing import Dict, List, Optional
+
+
+class RoutingTier(Enum):
+    STATIC = "static"
+    FAST = "fast"
+    FULL = "full"
+
+
+@dataclass
+class RoutingDecision:
+    tier: RoutingTier
+    model: Optional[str]
+    reason: str
+    metrics: Dict[str, int] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict:
+        return {**asdict(self), "tier": self.tier.value}
+
+
+class ModelRouter:
+    """按代码规模与复杂度选择分析层级"""
+
+    def __init__(self, full_model: str, fast_model: Optional[str] = None,
+                 full_min_lines: int = 80, full_min_complexity: int = 15,
+                 full_min_functions: int = 8):
+        self.full_model = full_model
+        self.fast_model = fast_model
+        self.full_min_lines = full_min_lines
+        self.full_min_complexity = full_min_complexity
+        self.full_min_functions = full_min_functions
+        self.counts = {tier.value: 0 for tier in RoutingTier}
+
+    def route(self, static_result: Dict[str, List]) -> RoutingDecision:
+        decision = self._decide(static_result)
+        self.counts[decision.tier.value] += 1
+        return decision
+
+    def _decide(self, static_result: Dict[str, List]) -> RoutingDecision:
+        metrics = dict(static_result.get("metrics") or {})
+
+        if static_result.get("syntax_issues"):
+            return RoutingDecision(RoutingTier.STATIC, None, "代码存在语法错误", metrics)
+        if not metrics.get("lines"):
+            return RoutingDecision(RoutingTier.STATIC, None, "代码为空", metrics)
+
+        if self.fast_model is None:
+            return RoutingDecision(RoutingTier.FULL, self.full_model, "未配置快速模型", metrics)
+
+        if metrics.get("lines", 0) >= self.full_min_lines:
+            return RoutingDecision(RoutingTier.FULL, self.full_model, "代码行数较多", metrics)
+        if metrics.get("complexity", 0) >= self.full_min_complexity:
+            return RoutingDecision(RoutingTier.FULL, self.full_model, "代码复杂度较高", metrics)
+        if metrics.get("functions", 0) + metrics.get("classes", 0) >= self.full_min_functions:
+            return RoutingDecision(RoutingTier.FULL, self.full_model, "函数和类数量较多", metrics)
+
+        return RoutingDecision(RoutingTier.FAST, self.fast_model, "代码规模和复杂度较小", metrics)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.counts)
@@ -0,0 +1,257 @@
+"""
+隔离的代码解析服务
+
+ast.parse 以及后续的规则遍历在独立的工作进程中执行：
+- 提交前检查代码大小和行数，超限直接拒绝
+- 每个任务有超时时间，超时的工作进程会被强制结束并重建；
+  工作进程启动(导入分析模块)的耗时单独等待，不计入任务超时
+- 工作进程有内存上限，并在执行一定数量任务后回收
+这样单个恶意或超大的提交不会拖慢同一节点上的其他请求。
+"""
+
+import asyncio
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，不限制内存
+    resource = None
+
+from code_analyzer import run_static_analysis
+
+
+@dataclass
+class ParseResult:
+    status: str  # ok, too_large, rejected, timeout
+    value: Any = None
+    reason: Optional[str] = None
+    elapsed_ms: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+
+class SubmissionRejected(Exception):
+    """提交被解析服务拒绝"""
+
+    def __init__(self, result: ParseResult):
+        super().__init__(result.reason)
+        self.result = result
+
+
+def _worker_main(conn, memory_limit_mb: Optional[int]) -> None:
+    """工作进程主循环：接收(函数, 参数)，返回(状态, 结果, 是否退出)"""
+    if memory_limit_mb and resource is not None:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    # 模块(包括code_analyzer及其依赖)已在进程启动时导入完成
+    conn.send("ready")
+
+    while True:
+        try:
+            func, args = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            conn.send(("ok", func(*args), False))
+        except RecursionError:
+            conn.send(("rejected", "代码嵌套层级过深，无法解析", False))
+        except MemoryError:
+            # 内存耗尽后进程状态不可靠，通知父进程后退出
+            conn.send(("rejected", "解析代码所需内存超出限制", True))
+            return
+        except Exception as e:
+            conn.send(("rejected", f"代码解析失败: {e}", False))
+
+
+class _Worker:
+    def __init__(self, context, memory_limit_mb: Optional[int], start_timeout: float):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, memory_limit_mb), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+        # 等待子进程完成导入后才开始计算任务超时
+        try:
+            ready = self.conn.poll(start_timeout) and self.conn.recv() == "ready"
+        except (EOFError, OSError):
+            ready = False
+        if not ready:
+            self.kill()
+            raise RuntimeError(f"解析工作进程未能在 {start_timeout} 秒内启动")
+
+    def run(self, func: Callable, args: tuple, timeout: float):
+        self.jobs += 1
+        self.conn.send((func, args))
+        if not self.conn.poll(timeout):
+            raise TimeoutError
+        return self.conn.recv()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class ParseService:
+    """带超时、内存上限和输入限制的解析工作进程池"""
+
+    def __init__(self, max_workers: int = 2, timeout: float = 2.0,
+                 max_code_bytes: int = 200_000, max_lines: int = 10_000,
+                 memory_limit_mb: Optional[int] = 512, max_jobs_per_worker: int = 200,
+                 start_timeout: float = 30.0):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.max_code_bytes = max_code_bytes
+        self.max_lines = max_lines
+        self.memory_limit_mb = memory_limit_mb
+        self.max_jobs_per_worker = max_jobs_per_worker
+
+        # spawn启动的工作进程不继承父进程的线程和连接
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[Optional[_Worker]]" = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+        # 异步接口在线程中等待工作进程，线程数与工作进程数一致
+        self._waiters = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="parse-service")
+
+        self.stats = {"ok": 0, "too_large": 0, "rejected": 0, "timeout": 0, "recycled": 0}
+
+    def check(self, code: str) -> Optional[ParseResult]:
+        """输入大小检查，超限时返回拒绝结果"""
+        size = len(code.encode("utf-8"))
+        if size > self.max_code_bytes:
+            return self._finish(ParseResult(
+                status="too_large",
+                reason=f"代码大小 {size} 字节超过上限 {self.max_code_bytes} 字节"
+            ))
+        lines = code.count("\n") + 1
+        if lines > self.max_lines:
+            return self._finish(ParseResult(
+                status="too_large",
+                reason=f"代码行数 {lines} 超过上限 {self.max_lines} 行"
+            ))
+        return None
+
+    def ensure_acceptable(self, code: str) -> None:
+        """输入超限时抛出SubmissionRejected"""
+        rejected = self.check(code)
+        if rejected is not None:
+            raise SubmissionRejected(rejected)
+
+    def parse(self, code: str, language: str) -> ParseResult:
+        """在工作进程中运行静态分析"""
+        return self.run(run_static_analysis, code, language)
+
+    def run(self, func: Callable, code: str, *args) -> ParseResult:
+        """在工作进程中执行 func(code, *args)，func必须是可pickle的模块级函数"""
+        rejected = self.check(code)
+        if rejected is not None:
+            return rejected
+
+        started = time.perf_counter()
+        worker = self._acquire()
+        try:
+            status, value, exiting = worker.run(func, (code,) + args, self.timeout)
+            if exiting:
+                # 不能依赖is_alive()：工作进程可能还没有退出
+                self._discard(worker)
+                worker = None
+        except TimeoutError:
+            self._discard(worker)
+            worker = None
+            return self._finish(ParseResult(
+                status="timeout",
+                reason=f"代码解析超过 {self.timeout} 秒",
+                elapsed_ms=(time.perf_counter() - started) * 1000
+            ))
+        except (EOFError, OSError):
+            # 工作进程崩溃(例如超出内存上限被杀死)
+            self._discard(worker)
+            worker = None
+            status, value = "rejected", "代码解析进程异常退出"
+        finally:
+            if worker is not None:
+                self._release(worker)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if status == "ok":
+            return self._finish(ParseResult(status="ok", value=value, elapsed_ms=elapsed_ms))
+        return self._finish(ParseResult(status=status, reason=value, elapsed_ms=elapsed_ms))
+
+    async def arun(self, func: Callable, code: str, *args) -> Any:
+        """异步执行，成功时返回结果，否则抛出SubmissionRejected"""
+        rejected = self.check(code)
+        if rejected is None:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._waiters, self.run, func, code, *args)
+        else:
+            result = rejected
+        if not result.ok:
+            raise SubmissionRejected(result)
+        return result.value
+
+    def _finish(self, result: ParseResult) -> ParseResult:
+        self.stats[result.status] += 1
+        return result
+
+    def _acquire(self) -> _Worker:
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_spawn = self._created < self.max_workers
+                    if can_spawn:
+                        self._created += 1
+                if can_spawn:
+                    try:
+                        return _Worker(self._context, self.memory_limit_mb, self.start_timeout)
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        self._idle.put(None)
+                        raise
+                worker = self._idle.get()
+            # None表示有工作进程被回收，可以重新创建
+            if worker is not None:
+                return worker
+
+    def _release(self, worker: _Worker) -> None:
+        if worker.jobs >= self.max_jobs_per_worker or not worker.process.is_alive():
+            self._discard(worker)
+        else:
+            self._idle.put(worker)
+
+    def _discard(self, worker: _Worker) -> None:
+        worker.kill()
+        self.stats["recycled"] += 1
+        with self._lock:
+            self._created -= 1
+        # 唤醒可能正在等待空闲进程的调用方
+        self._idle.put(None)
+
+    def close(self) -> None:
+        """结束所有空闲工作进程"""
+        self._waiters.shutdown(wait=False)
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                worker.kill()
+                with self._lock:
+                    self._created -= 1
@@ -0,0 +1,84 @@
+"""
+基于AST的单次遍历规则引擎
+
+规则按关心的AST节点类型注册，遍历时每个节点只会触发与其类型匹配的规则，
+整体开销与代码规模线性相关，而不是 规则数 × 代码规模。
+"""
+
+import ast
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+# 规则签名: rule(node, context) -> 可迭代的问题列表或None
+Rule = Callable[[ast.AST, "RuleContext"], Optional[Iterable[Any]]]
+
+
+class RuleContext:
+    """单次分析过程中共享给所有规则的上下文"""
+
+    def __init__(self, code: str, tree: ast.AST):
+        self.code = code
+        self.tree = tree
+        # 规则之间可以通过该字典共享文件级状态
+        self.state: Dict[str, Any] = {}
+
+
+class RuleEngine:
+    """按节点类型分发规则的AST规则引擎"""
+
+    def __init__(self):
+        self._rules: Dict[Type[ast.AST], List[Tuple[str, Rule]]] = defaultdict(list)
+        # 按具体节点类型缓存展开后的规则列表(包含基类上注册的规则)
+        self._dispatch: Dict[type, List[Tuple[str, Rule]]] = {}
+
+    def register(self, *node_types: Type[ast.AST], name: Optional[str] = None):
+        """装饰器：将规则注册到指定的AST节点类型上"""
+        if not node_types:
+            raise ValueError("至少需要指定一个AST节点类型")
+
+        def decorator(rule: Rule) -> Rule:
+            rule_name = name or rule.__name__
+            for node_type in node_types:
+                self._rules[node_type].append((rule_name, rule))
+            self._dispatch.clear()
+            return rule
+
+        return decorator
+
+    @property
+    def rule_names(self) -> List[str]:
+        """已注册的规则名称(去重，保持注册顺序)"""
+        names: Dict[str, None] = {}
+        for rules in self._rules.values():
+            for rule_name, _ in rules:
+                names[rule_name] = None
+        return list(names)
+
+    def _rules_for(self, node_cls: type) -> List[Tuple[str, Rule]]:
+        rules = self._dispatch.get(node_cls)
+        if rules is None:
+            rules = []
+            for klass in node_cls.__mro__:
+                rules.extend(self._rules.get(klass, ()))
+            self._dispatch[node_cls] = rules
+        return rules
+
+    def run(self, tree: ast.AST, code: str, context: Optional[RuleContext] = None) -> List[Any]:
+        """遍历一次AST，返回所有规则产出的问题；传入context可在遍历后读取规则的共享状态"""
+        if context is None:
+            context = RuleContext(code, tree)
+        issues: List[Any] = []
+        stack = [tree]
+
+        while stack:
+            node = stack.pop()
+            for _, rule in self._rules_for(type(node)):
+                found = rule(node, context)
+                if found:
+                    issues.extend(found)
+            # 逆序压栈，保证按源码顺序访问子节点
+            children = list(ast.iter_child_nodes(node))
+            children.reverse()
+            stack.extend(children)
+
+        return issues
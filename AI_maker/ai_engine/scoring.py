@@ -0,0 +1,122 @@
+"""
+代码评分
+
+扣分权重集中在可配置的权重表中：
+- 单次分析时把静态问题统计为(问题类别 × 严重程度)的计数矩阵，再按权重表计算总分
+- 调整权重后，可以对保存下来的计数矩阵批量重新评分(NumPy向量化)，
+  不需要重新分析历史代码
+"""
+
+import hashlib
+import json
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # 未安装numpy时只能逐条评分
+    np = None
+
+# 计数矩阵的行和列，顺序固定，保存的计数按此顺序展开
+ISSUE_CATEGORIES = ("syntax_issues", "performance_issues", "security_issues")
+SEVERITY_LEVELS = ("high", "medium", "low")
+COUNTS_SIZE = len(ISSUE_CATEGORIES) * len(SEVERITY_LEVELS)
+
+
+def _default_penalties() -> Dict[str, Dict[str, float]]:
+    return {
+        "syntax_issues": {"high": 20.0, "medium": 10.0, "low": 5.0},
+        "performance_issues": {"high": 15.0, "medium": 8.0, "low": 3.0},
+        "security_issues": {"high": 25.0, "medium": 15.0, "low": 8.0},
+    }
+
+
+@dataclass
+class ScoreWeights:
+    """评分权重表：每类问题按严重程度扣分，再与AI评分加权平均"""
+    penalties: Dict[str, Dict[str, float]] = field(default_factory=_default_penalties)
+    base_score: float = 100.0
+    ai_weight: float = 0.5  # AI评分在总分中的占比，没有AI评分时只按静态问题计算
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ScoreWeights":
+        penalties = _default_penalties()
+        for category, levels in (data.get("penalties") or {}).items():
+            if category not in penalties:
+                raise ValueError(f"未知的问题类别: {category}")
+            for severity, value in levels.items():
+                if severity not in SEVERITY_LEVELS:
+                    raise ValueError(f"未知的严重程度: {severity}")
+                penalties[category][severity] = float(value)
+        return cls(
+            penalties=penalties,
+            base_score=float(data.get("base_score", 100.0)),
+            ai_weight=float(data.get("ai_weight", 0.5))
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ScoreWeights":
+        """从JSON文件加载权重表，未给出的项使用默认值"""
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @property
+    def fingerprint(self) -> str:
+        """权重表的摘要，权重变化后缓存的评分随之失效"""
+        payload = json.dumps(self.to_dict(), sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+
+    def penalty_vector(self) -> List[float]:
+        """与计数向量顺序一致的扣分向量"""
+        return [self.penalties[category][severity]
+                for category in ISSUE_CATEGORIES for severity in SEVERITY_LEVELS]
+
+    def score(self, counts: Sequence[int], ai_score: Optional[float] = None) -> float:
+        """根据计数向量(以及可选的AI评分)计算总分"""
+        penalty = sum(count * weight for count, weight in zip(counts, self.penalty_vector()))
+        final_score = max(0.0, self.base_score - penalty)
+        if ai_score is not None:
+            final_score = final_score * (1 - self.ai_weight) + ai_score * self.ai_weight
+        # 与 np.round(x, 1) 相同的舍入(x*10取整后除以10)，批量重新评分得到相同的结果
+        return round(final_score * 10) / 10
+
+    def score_batch(self, counts, ai_scores=None):
+        """
+        批量评分。counts为(n, 9)或(n, 3, 3)的计数矩阵，
+        ai_scores为长度n的数组，缺少AI评分的位置用NaN表示。
+        """
+        if np is None:
+            raise RuntimeError("批量评分需要安装numpy")
+        counts = np.asarray(counts, dtype=np.float64).reshape(-1, COUNTS_SIZE)
+        static_scores = np.maximum(
+            0.0, self.base_score - counts @ np.asarray(self.penalty_vector(), dtype=np.float64)
+        )
+        if ai_scores is None:
+            return np.round(static_scores, 1)
+        ai_scores = np.asarray(ai_scores, dtype=np.float64)
+        blended = static_scores * (1 - self.ai_weight) + ai_scores * self.ai_weight
+        return np.round(np.where(np.isnan(ai_scores), static_scores, blended), 1)
+
+
+DEFAULT_WEIGHTS = ScoreWeights()
+
+_INDEX = {
+    (category, severity): row * len(SEVERITY_LEVELS) + column
+    for row, category in enumerate(ISSUE_CATEGORIES)
+    for column, severity in enumerate(SEVERITY_LEVELS)
+}
+
+
+def severity_counts(static_result: Dict[str, Iterable]) -> List[int]:
+    """一次遍历统计各类问题在各严重程度下的数量，返回展开的计数向量"""
+    counts = [0] * COUNTS_SIZE
+    for category in ISSUE_CATEGORIES:
+        for issue in static_result.get(category) or ():
+            severity = issue["severity"] if isinstance(issue, dict) else issue.severity
+            index = _INDEX.get((category, severity))
+            if index is not None:
+                counts[index] += 1
+    return counts
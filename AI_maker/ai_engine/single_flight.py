@@ -0,0 +1,139 @@
+"""
+相同分析请求的合并(single-flight)
+
+作业截止时大量学生会在几秒内提交相同的初始代码，缓存还来不及写入，
+每个请求都会单独调用一次LLM。这里让相同分析键的并发请求共享同一次计算：
+- SingleFlight：进程内合并，后到的请求等待正在进行的计算
+- RedisSingleFlight：额外通过Redis锁在多个worker之间合并，
+  未拿到锁的worker轮询共享缓存获取结果
+"""
+
+import asyncio
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+Compute = Callable[[], Awaitable[Any]]
+Lookup = Callable[[], Awaitable[Optional[Any]]]
+
+# 只有锁的持有者才能释放锁
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def _consume_exception(task: "asyncio.Task") -> None:
+    # 所有等待方都已取消时，避免出现"exception was never retrieved"警告
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    """进程内请求合并"""
+
+    def __init__(self):
+        self._inflight: Dict[str, "asyncio.Task"] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, compute: Compute, lookup: Optional[Lookup] = None) -> Any:
+        """
+        执行 compute()，同一时刻相同key的调用共享同一个结果。
+        lookup用于跨进程合并时查询共享缓存，进程内合并不需要。
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(self._run(key, compute, lookup))
+            task.add_done_callback(_consume_exception)
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        # shield：单个调用方被取消时不影响其他等待方
+        return await asyncio.shield(task)
+
+    async def _run(self, key: str, compute: Compute, lookup: Optional[Lookup]) -> Any:
+        return await compute()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "inflight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+
+class RedisSingleFlight(SingleFlight):
+    """进程内合并 + 基于Redis锁的跨worker合并"""
+
+    def __init__(self, redis, lock_ttl: float = 60.0, wait_timeout: float = 60.0,
+                 poll_interval: float = 0.05, max_poll_interval: float = 1.0,
+                 namespace: str = "codementor:inflight"):
+        super().__init__()
+        self.redis = redis
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.namespace = namespace
+
+        self.remote_coalesced = 0
+        self.remote_fallbacks = 0
+        self.redis_errors = 0
+
+    async def _run(self, key: str, compute: Compute, lookup: Optional[Lookup]) -> Any:
+        lock_key = f"{self.namespace}:{key}"
+        token = uuid.uuid4().hex
+
+        try:
+            acquired = await self.redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000))
+        except Exception:
+            self.redis_errors += 1
+            return await compute()
+
+        if acquired:
+            try:
+                # compute需要在返回前把结果写入共享缓存
+                return await compute()
+            finally:
+                try:
+                    await self.redis.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+                except Exception:
+                    self.redis_errors += 1
+
+        # 其他worker正在计算：轮询共享缓存，锁释放后仍未拿到结果则自行计算
+        if lookup is not None:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.wait_timeout
+            delay = self.poll_interval
+            while loop.time() < deadline:
+                await asyncio.sleep(delay)
+                result = await lookup()
+                if result is not None:
+                    self.remote_coalesced += 1
+                    return result
+                try:
+                    if not await self.redis.exists(lock_key):
+                        result = await lookup()
+                        if result is not None:
+                            self.remote_coalesced += 1
+                            return result
+                        break
+                except Exception:
+                    self.redis_errors += 1
+                    break
+                delay = min(delay * 2, self.max_poll_interval)
+
+        self.remote_fallbacks += 1
+        return await compute()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **super().stats(),
+            "remote_coalesced": self.remote_coalesced,
+            "remote_fallbacks": self.remote_fallbacks,
+            "redis_errors": self.redis_errors,
+        }
@@ -0,0 +1,563 @@
+"""
+学习主题目录
+
+主题数据以紧凑的二进制格式保存，按需通过mmap读取：
+- 打开目录只读取文件头，启动时间与主题数量无关
+- 主题在访问时才解码为带 __slots__ 的 LearningTopic 记录
+- 文件以只读方式映射，同一节点上的多个worker共享操作系统的页缓存；
+  进程内通过 load_catalogue 共享同一个目录对象
+
+- 前置依赖图(拓扑序、前置主题闭包、直接依赖)和倒排索引在编译时算好，
+  worker打开目录后直接读取，不需要解码全部主题重建
+
+文件格式(小端)：
+    文件头 | 主题记录(按拓扑序) | ID索引(按ID排序) | 引用数组 | 字符串偏移表 | 字符串数据 |
+    依赖图 | 词表(按词排序) | 标签表(按标签排序) | 难度表 | 倒排表位置 | 倒排表权重
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from lru_cache import LRUCache
+from topic_graph import TopicGraph
+
+
+class SkillLevel(Enum):
+    BEGINNER = "beginner"
+    INTERMEDIATE = "intermediate"
+    ADVANCED = "advanced"
+
+
+@dataclass
+class LearningTopic:
+    __slots__ = ("id", "title", "description", "difficulty", "estimated_hours", "prerequisites", "tags")
+
+    id: str
+    title: str
+    description: str
+    difficulty: SkillLevel
+    estimated_hours: int
+    prerequisites: List[str]
+    tags: List[str]
+
+
+MAGIC = b"CMTC"
+FORMAT_VERSION = 2
+
+# magic, 格式版本, 保留, 主题数, 字符串数, 词数, 标签数,
+# 各段偏移(记录, ID索引, 引用, 字符串偏移表, 字符串数据, 依赖图, 词表, 标签表, 难度表, 倒排表位置, 倒排表权重), 内容摘要
+_HEADER = struct.Struct("<4sHHIIII11I16s")
+# ID, 标题, 描述(字符串序号), 难度, 预计小时, 前置主题(引用起点, 数量), 标签(引用起点, 数量)
+_RECORD = struct.Struct("<IIIBHIHIH")
+# 传递前置主题(引用起点, 数量)，直接依赖该主题的主题(引用起点, 数量)；引用均为主题序号
+_GRAPH = struct.Struct("<IIII")
+# 词或标签(字符串序号)，主题序号列表(起点, 数量)
+_TERM = struct.Struct("<III")
+# 某一难度的主题序号列表(引用起点, 数量)
+_SPAN = struct.Struct("<II")
+_U32 = struct.Struct("<I")
+_LEVELS = list(SkillLevel)
+
+_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_SOURCE_PATH = os.path.join(_DATA_DIR, "topics.json")
+DEFAULT_CATALOGUE_PATH = os.path.join(_DATA_DIR, "topics.cat")
+# 安装目录只读时内置目录编译到这里
+FALLBACK_CATALOGUE_PATH = os.path.join(tempfile.gettempdir(), "codementor", "topics.cat")
+# load_catalogue 检查目录文件是否被替换的最小间隔(秒)
+CHECK_INTERVAL = 5.0
+
+
+class CatalogueFormatError(ValueError):
+    """目录文件损坏或版本不兼容"""
+
+
+def _mask(positions: Iterable[int]) -> int:
+    """主题序号列表对应的位集"""
+    positions = list(positions)
+    if not positions:
+        return 0
+    bits = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, "little")
+
+
+class _MappedSequence(Sequence):
+    """按序号从目录文件读取的只读序列，可选缓存读取结果"""
+
+    def __init__(self, size: int, read: Callable[[int], Any], cache_size: int = 0):
+        self._size = size
+        self._read = read
+        self._cache = LRUCache(maxsize=cache_size) if cache_size else None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> Any:
+        if self._cache is None:
+            return self._read(index)
+        value = self._cache.get(index)
+        if value is None:
+            value = self._read(index)
+            self._cache.set(index, value)
+        return value
+
+
+class _TopicPositions(Mapping):
+    """主题ID -> 主题序号(拓扑序)"""
+
+    def __init__(self, catalogue: "TopicCatalogue"):
+        self._catalogue = catalogue
+
+    def __len__(self) -> int:
+        return len(self._catalogue)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._catalogue)
+
+    def __getitem__(self, topic_id: str) -> int:
+        index = self._catalogue.index_of(topic_id) if isinstance(topic_id, str) else None
+        if index is None:
+            raise KeyError(topic_id)
+        return index
+
+
+class TopicCatalogue(Mapping):
+    """只读的主题目录：主题ID -> LearningTopic"""
+
+    def __init__(self, path: str, cache_size: int = 4096):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < _HEADER.size:
+                raise CatalogueFormatError(f"目录文件过小: {path}")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, _, self._count, self._string_count, self._token_count, self._tag_count,
+         self._records, self._id_index, self._refs, self._string_offsets, self._strings, self._graph_entries,
+         self._tokens, self._tags, self._levels, self._posting_positions, self._posting_weights,
+         digest) = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise CatalogueFormatError(f"不是主题目录文件: {path}")
+        if version != FORMAT_VERSION:
+            self._mm.close()
+            raise CatalogueFormatError(f"不支持的目录格式版本 {version}，当前版本 {FORMAT_VERSION}，请重新编译")
+
+        # 目录内容的摘要，内容变化时随之变化
+        self.version = digest.hex()
+        self._topics = LRUCache(maxsize=cache_size)
+        self._cache_size = cache_size
+        self._graph: Optional[TopicGraph] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        """按拓扑序(前置主题在前)遍历主题ID"""
+        for index in range(self._count):
+            yield self._string(_RECORD.unpack_from(self._mm, self._records + index * _RECORD.size)[0])
+
+    def __getitem__(self, topic_id: str) -> LearningTopic:
+        index = self.index_of(topic_id)
+        if index is None:
+            raise KeyError(topic_id)
+        return self.topic_at(index)
+
+    def __contains__(self, topic_id) -> bool:
+        return isinstance(topic_id, str) and self.index_of(topic_id) is not None
+
+    def index_of(self, topic_id: str) -> Optional[int]:
+        """在ID索引上二分查找主题的记录序号"""
+        target = topic_id.encode("utf-8")
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            index = self._u32(self._id_index + mid * 4)
+            current = self._string_bytes(self._u32(self._records + index * _RECORD.size))
+            if current < target:
+                lo = mid + 1
+            elif current > target:
+                hi = mid
+            else:
+                return index
+        return None
+
+    def topic_at(self, index: int) -> LearningTopic:
+        topic = self._topics.get(index)
+        if topic is None:
+            topic = self._decode(index)
+            self._topics.set(index, topic)
+        return topic
+
+    def id_at(self, index: int) -> str:
+        """拓扑序中第index个主题的ID"""
+        return self._string(self._record(index)[0])
+
+    @property
+    def graph(self) -> TopicGraph:
+        """前置依赖索引，直接读取编译好的拓扑序和闭包，由所有使用该目录的生成器共享"""
+        if self._graph is None:
+            self._graph = TopicGraph.from_parts(
+                order=_MappedSequence(self._count, self.id_at),
+                index=_TopicPositions(self),
+                direct=_MappedSequence(self._count, lambda i: _mask(self.prerequisite_positions(i)),
+                                       self._cache_size),
+                closure=_MappedSequence(self._count, lambda i: _mask(self.closure_positions(i)),
+                                        self._cache_size),
+                dependents=_MappedSequence(self._count, self.dependent_positions)
+            )
+        return self._graph
+
+    def prerequisite_positions(self, index: int) -> List[int]:
+        """直接前置主题的序号"""
+        record = self._record(index)
+        return self._refs_at(record[5], record[6])
+
+    def closure_positions(self, index: int) -> List[int]:
+        """全部(传递)前置主题的序号，升序"""
+        start, count, _, _ = self._graph_entry(index)
+        return self._refs_at(start, count)
+
+    def dependent_positions(self, index: int) -> List[int]:
+        """直接依赖该主题的主题序号"""
+        _, _, start, count = self._graph_entry(index)
+        return self._refs_at(start, count)
+
+    def tag_positions(self, tag: str) -> List[int]:
+        """带有该标签(小写)的主题序号，升序"""
+        entry = self._find_term(self._tags, self._tag_count, tag)
+        return [] if entry is None else self._refs_at(*entry)
+
+    def level_positions(self, level: SkillLevel) -> List[int]:
+        """该难度的主题序号，升序"""
+        return self._refs_at(*_SPAN.unpack_from(self._mm, self._levels + _LEVELS.index(level) * _SPAN.size))
+
+    def posting_count(self, token: str) -> int:
+        """包含该词的主题数"""
+        entry = self._find_term(self._tokens, self._token_count, token)
+        return 0 if entry is None else entry[1]
+
+    def postings(self, token: str) -> Tuple[Tuple[int, ...], Tuple[float, ...]]:
+        """倒排表：包含该词的主题序号(升序)及对应权重"""
+        entry = self._find_term(self._tokens, self._token_count, token)
+        if entry is None:
+            return (), ()
+        start, count = entry
+        return (struct.unpack_from(f"<{count}I", self._mm, self._posting_positions + start * 4),
+                struct.unpack_from(f"<{count}d", self._mm, self._posting_weights + start * 8))
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def _record(self, index: int) -> Tuple:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return _RECORD.unpack_from(self._mm, self._records + index * _RECORD.size)
+
+    def _graph_entry(self, index: int) -> Tuple:
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return _GRAPH.unpack_from(self._mm, self._graph_entries + index * _GRAPH.size)
+
+    def _refs_at(self, start: int, count: int) -> List[int]:
+        return list(struct.unpack_from(f"<{count}I", self._mm, self._refs + start * 4))
+
+    def _find_term(self, table: int, count: int, term: str) -> Optional[Tuple[int, int]]:
+        """在按字节序排列的词表/标签表上二分查找，返回 (起点, 数量)"""
+        target = term.encode("utf-8")
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            sid, start, size = _TERM.unpack_from(self._mm, table + mid * _TERM.size)
+            current = self._string_bytes(sid)
+            if current < target:
+                lo = mid + 1
+            elif current > target:
+                hi = mid
+            else:
+                return start, size
+        return None
+
+    def _decode(self, index: int) -> LearningTopic:
+        (topic_sid, title_sid, description_sid, difficulty, hours,
+         prereq_start, prereq_count, tag_start, tag_count) = self._record(index)
+        return LearningTopic(
+            id=self._string(topic_sid),
+            title=self._string(title_sid),
+            description=self._string(description_sid),
+            difficulty=_LEVELS[difficulty],
+            estimated_hours=hours,
+            prerequisites=[
+                self._string(self._record(self._u32(self._refs + (prereq_start + i) * 4))[0])
+                for i in range(prereq_count)
+            ],
+            tags=[self._string(self._u32(self._refs + (tag_start + i) * 4)) for i in range(tag_count)]
+        )
+
+    def _u32(self, offset: int) -> int:
+        return _U32.unpack_from(self._mm, offset)[0]
+
+    def _string_bytes(self, sid: int) -> bytes:
+        start, end = struct.unpack_from("<II", self._mm, self._string_offsets + sid * 4)
+        return self._mm[self._strings + start:self._strings + end]
+
+    def _string(self, sid: int) -> str:
+        return self._string_bytes(sid).decode("utf-8")
+
+
+def write_catalogue(topics: Iterable[LearningTopic], path: str) -> str:
+    """
+    将主题写入目录文件(先写临时文件再原子替换)，返回目录版本。
+    前置主题不存在或存在循环依赖时抛出 topic_graph.PrerequisiteError。
+    """
+    # topic_index 依赖本模块，分词在写入时才导入
+    from topic_index import topic_weights
+
+    by_id: Dict[str, LearningTopic] = {}
+    for topic in topics:
+        if topic.id in by_id:
+            raise ValueError(f"主题ID重复: {topic.id}")
+        by_id[topic.id] = topic
+
+    graph = TopicGraph.from_topics(by_id)
+    order = graph.order
+    position = graph.index
+
+    strings: List[bytes] = []
+    string_ids: Dict[str, int] = {}
+
+    def sid(value: str) -> int:
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value.encode("utf-8"))
+        return string_ids[value]
+
+    records = bytearray()
+    refs: List[int] = []
+    for topic_id in order:
+        topic = by_id[topic_id]
+        prereq_start = len(refs)
+        refs.extend(position[prereq] for prereq in topic.prerequisites)
+        tag_start = len(refs)
+        refs.extend(sid(tag) for tag in topic.tags)
+        records += _RECORD.pack(
+            sid(topic.id), sid(topic.title), sid(topic.description),
+            _LEVELS.index(topic.difficulty), topic.estimated_hours,
+            prereq_start, len(topic.prerequisites), tag_start, len(topic.tags)
+        )
+
+    # 依赖图：传递前置主题和直接依赖
+    graph_entries = bytearray()
+    for topic_id in order:
+        closure_start = len(refs)
+        refs.extend(position[prereq] for prereq in graph.prerequisites_of(topic_id))
+        dependents_start = len(refs)
+        refs.extend(position[dependent] for dependent in graph.dependents_of(topic_id))
+        graph_entries += _GRAPH.pack(closure_start, dependents_start - closure_start,
+                                     dependents_start, len(refs) - dependents_start)
+
+    # 倒排索引：词 -> (主题序号, 权重)，标签/难度 -> 主题序号
+    postings: Dict[str, List[Tuple[int, float]]] = {}
+    tag_positions: Dict[str, List[int]] = {}
+    level_positions: List[List[int]] = [[] for _ in _LEVELS]
+    for i, topic_id in enumerate(order):
+        topic = by_id[topic_id]
+        for token, weight in topic_weights(topic).items():
+            postings.setdefault(token, []).append((i, weight))
+        for tag in dict.fromkeys(tag.lower() for tag in topic.tags):
+            tag_positions.setdefault(tag, []).append(i)
+        level_positions[_LEVELS.index(topic.difficulty)].append(i)
+
+    tokens = bytearray()
+    posting_positions: List[int] = []
+    posting_weights: List[float] = []
+    for token in sorted(postings, key=lambda value: value.encode("utf-8")):
+        tokens += _TERM.pack(sid(token), len(posting_positions), len(postings[token]))
+        for i, weight in postings[token]:
+            posting_positions.append(i)
+            posting_weights.append(weight)
+
+    tags = bytearray()
+    for tag in sorted(tag_positions, key=lambda value: value.encode("utf-8")):
+        tags += _TERM.pack(sid(tag), len(refs), len(tag_positions[tag]))
+        refs.extend(tag_positions[tag])
+
+    levels = bytearray()
+    for positions in level_positions:
+        levels += _SPAN.pack(len(refs), len(positions))
+        refs.extend(positions)
+
+    id_index = sorted(range(len(order)), key=lambda i: order[i].encode("utf-8"))
+    string_offsets = [0]
+    for value in strings:
+        string_offsets.append(string_offsets[-1] + len(value))
+
+    sections = [
+        bytes(records),
+        struct.pack(f"<{len(id_index)}I", *id_index),
+        struct.pack(f"<{len(refs)}I", *refs),
+        struct.pack(f"<{len(string_offsets)}I", *string_offsets),
+        b"".join(strings),
+        bytes(graph_entries),
+        bytes(tokens),
+        bytes(tags),
+        bytes(levels),
+        struct.pack(f"<{len(posting_positions)}I", *posting_positions),
+        struct.pack(f"<{len(posting_weights)}d", *posting_weights),
+    ]
+    offsets = []
+    offset = _HEADER.size
+    for section in sections:
+        offsets.append(offset)
+        offset += len(section)
+
+    body = b"".join(sections)
+    digest = hashlib.sha256(body).digest()[:16]
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(order), len(strings), len(postings), len(tag_positions),
+                          *offsets, digest)
+
+    # 临时文件按进程和线程区分，并发编译互不覆盖，读取方只会看到完整的文件
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(body)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return digest.hex()
+
+
+def load_topics_json(path: str) -> List[LearningTopic]:
+    """读取JSON格式的主题源文件"""
+    with open(path, encoding="utf-8") as f:
+        items = json.load(f)
+    return [
+        LearningTopic(
+            id=item["id"],
+            title=item["title"],
+            description=item.get("description", ""),
+            difficulty=SkillLevel(item.get("difficulty", "beginner")),
+            estimated_hours=int(item.get("estimated_hours", 0)),
+            prerequisites=list(item.get("prerequisites", [])),
+            tags=list(item.get("tags", []))
+        )
+        for item in items
+    ]
+
+
+def compile_catalogue(source_path: str, catalogue_path: str) -> str:
+    """把JSON源文件编译为目录文件，返回目录版本"""
+    return write_catalogue(load_topics_json(source_path), catalogue_path)
+
+
+def _format_version(path: str) -> Optional[int]:
+    """目录文件的格式版本，文件不存在或不是目录文件时返回None"""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(6)
+    except FileNotFoundError:
+        return None
+    if len(head) < 6 or head[:4] != MAGIC:
+        return None
+    return struct.unpack("<H", head[4:])[0]
+
+
+def _is_stale(path: str, source: os.stat_result) -> bool:
+    try:
+        if os.stat(path).st_mtime_ns < source.st_mtime_ns:
+            return True
+    except OSError:
+        return True
+    return _format_version(path) != FORMAT_VERSION
+
+
+def _builtin_catalogue_path() -> str:
+    """
+    内置目录的路径，源文件更新或目录格式升级后重新编译。
+    通常在构建或部署时用 build 命令编译好；安装目录只读时编译到临时目录。
+    """
+    source = os.stat(DEFAULT_SOURCE_PATH)
+    error: Optional[OSError] = None
+    for path in (DEFAULT_CATALOGUE_PATH, FALLBACK_CATALOGUE_PATH):
+        if not _is_stale(path, source):
+            return path
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            compile_catalogue(DEFAULT_SOURCE_PATH, path)
+            return path
+        except OSError as e:
+            error = e
+    raise error
+
+
+# 实际路径 -> ((修改时间, 大小), 目录)
+_catalogues: Dict[str, Tuple[Tuple[int, int], TopicCatalogue]] = {}
+# load_catalogue 的path参数 -> (实际路径, 上次检查的时间)
+_checked: Dict[Optional[str], Tuple[str, float]] = {}
+_catalogues_lock = threading.Lock()
+
+
+def load_catalogue(path: Optional[str] = None, check_interval: Optional[float] = None) -> TopicCatalogue:
+    """
+    打开目录文件，同一进程内共享同一个目录对象。
+    每个路径最多每check_interval(默认CHECK_INTERVAL)秒检查一次文件是否被替换，替换后打开新文件并关闭旧目录，
+    仍持有旧目录的调用方需要重新调用 load_catalogue。
+    未指定路径时使用内置目录(见 _builtin_catalogue_path)。
+    """
+    if check_interval is None:
+        check_interval = CHECK_INTERVAL
+    now = time.monotonic()
+    with _catalogues_lock:
+        checked = _checked.get(path)
+        if checked is not None and now - checked[1] < check_interval and checked[0] in _catalogues:
+            return _catalogues[checked[0]][1]
+
+        real_path = os.path.realpath(_builtin_catalogue_path() if path is None else path)
+        stat = os.stat(real_path)
+        identity = (stat.st_mtime_ns, stat.st_size)
+        _checked[path] = (real_path, now)
+        cached = _catalogues.get(real_path)
+        if cached is not None and cached[0] == identity:
+            return cached[1]
+        catalogue = TopicCatalogue(real_path)
+        _catalogues[real_path] = (identity, catalogue)
+        if cached is not None:
+            cached[1].close()
+        return catalogue
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="学习主题目录工具")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="将JSON主题源文件编译为目录文件")
+    build.add_argument("source")
+    build.add_argument("output")
+    info = commands.add_parser("info", help="查看目录文件信息")
+    info.add_argument("catalogue")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        version = compile_catalogue(args.source, args.output)
+        print(f"已生成 {args.output}，版本 {version}")
+    else:
+        catalogue = TopicCatalogue(args.catalogue)
+        print(f"主题数: {len(catalogue)}，版本: {catalogue.version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+学习主题的前置依赖图
+
+主题库加载时编译一次：
+- 拓扑排序，存在循环依赖时直接报错
+- 每个主题的传递前置主题集合以位集(Python整数)保存，
+  "是否已解锁"只需要一次按位运算，与已完成主题的数量无关
+"""
+
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence
+
+
+class PrerequisiteError(ValueError):
+    """主题库的前置依赖不合法(引用不存在的主题或存在循环依赖)"""
+
+
+class TopicGraph:
+    """编译后的前置依赖DAG索引"""
+
+    def __init__(self, prerequisites: Dict[str, Sequence[str]]):
+        """prerequisites: 主题ID -> 直接前置主题ID列表"""
+        for topic_id, prereqs in prerequisites.items():
+            for prereq in prereqs:
+                if prereq not in prerequisites:
+                    raise PrerequisiteError(f"主题 {topic_id} 的前置主题 {prereq} 不存在")
+
+        self.order: List[str] = self._topological_order(prerequisites)
+        self.index: Dict[str, int] = {topic_id: i for i, topic_id in enumerate(self.order)}
+
+        size = len(self.order)
+        self._direct = [0] * size
+        self._closure = [0] * size
+        self._dependents: List[List[int]] = [[] for _ in range(size)]
+        # 按拓扑序计算，前置主题的闭包总是先于依赖它的主题算好
+        for i, topic_id in enumerate(self.order):
+            direct = closure = 0
+            for prereq in prerequisites[topic_id]:
+                j = self.index[prereq]
+                direct |= 1 << j
+                closure |= self._closure[j] | (1 << j)
+                self._dependents[j].append(i)
+            self._direct[i] = direct
+            self._closure[i] = closure
+
+    @classmethod
+    def from_topics(cls, topics: Dict) -> "TopicGraph":
+        """由 主题ID -> LearningTopic 的主题库编译"""
+        return cls({topic_id: topic.prerequisites for topic_id, topic in topics.items()})
+
+    @classmethod
+    def from_parts(cls, order: Sequence[str], index: Mapping[str, int], direct: Sequence[int],
+                   closure: Sequence[int], dependents: Sequence[List[int]]) -> "TopicGraph":
+        """由已经编译好的数据构造(例如按需读取目录文件的序列)，不再检查依赖"""
+        graph = cls.__new__(cls)
+        graph.order = order
+        graph.index = index
+        graph._direct = direct
+        graph._closure = closure
+        graph._dependents = dependents
+        return graph
+
+    @staticmethod
+    def _topological_order(prerequisites: Dict[str, Sequence[str]]) -> List[str]:
+        # Kahn算法；同一层按主题库中的原始顺序输出，结果稳定
+        indegree = {topic_id: len(set(prereqs)) for topic_id, prereqs in prerequisites.items()}
+        dependents: Dict[str, List[str]] = {topic_id: [] for topic_id in prerequisites}
+        for topic_id, prereqs in prerequisites.items():
+            for prereq in set(prereqs):
+                dependents[prereq].append(topic_id)
+
+        order = [topic_id for topic_id, degree in indegree.items() if degree == 0]
+        for topic_id in order:  # 遍历过程中追加，相当于队列
+            for dependent in dependents[topic_id]:
+                indegree[dependent] -= 1
+                if indegree[dependent] == 0:
+                    order.append(dependent)
+
+        if len(order) != len(prerequisites):
+            remaining = {topic_id for topic_id, degree in indegree.items() if degree > 0}
+            cycle = TopicGraph._find_cycle(prerequisites, remaining)
+            raise PrerequisiteError(f"主题前置依赖存在循环: {' -> '.join(cycle)}")
+        return order
+
+    @staticmethod
+    def _find_cycle(prerequisites: Dict[str, Sequence[str]], remaining: set) -> List[str]:
+        # 剩余的每个主题都至少有一个前置主题也在剩余集合中，沿着走下去必然回到走过的主题
+        topic_id = next(iter(remaining))
+        path: List[str] = []
+        seen: Dict[str, int] = {}
+        while topic_id not in seen:
+            seen[topic_id] = len(path)
+            path.append(topic_id)
+            topic_id = next(prereq for prereq in prerequisites[topic_id] if prereq in remaining)
+        cycle = path[seen[topic_id]:] + [topic_id]
+        cycle.reverse()  # 按"前置 -> 依赖"的方向输出
+        return cycle
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __contains__(self, topic_id: str) -> bool:
+        return topic_id in self.index
+
+    def mask(self, topic_ids: Iterable[str]) -> int:
+        """主题ID集合对应的位集，不在主题库中的ID被忽略"""
+        bits = 0
+        index = self.index
+        for topic_id in topic_ids:
+            i = index.get(topic_id)
+            if i is not None:
+                bits |= 1 << i
+        return bits
+
+    def ids(self, bits: int) -> List[str]:
+        """位集对应的主题ID(按拓扑序)"""
+        result = []
+        while bits:
+            low = bits & -bits
+            result.append(self.order[low.bit_length() - 1])
+            bits ^= low
+        return result
+
+    def is_unlocked(self, topic_id: str, completed: int) -> bool:
+        """全部(传递)前置主题都已完成"""
+        closure = self._closure[self.index[topic_id]]
+        return closure & completed == closure
+
+    def closure_mask(self, topic_id: str) -> int:
+        """(传递)前置主题的位集"""
+        return self._closure[self.index[topic_id]]
+
+    def prerequisites_of(self, topic_id: str, transitive: bool = True) -> List[str]:
+        i = self.index[topic_id]
+        return self.ids(self._closure[i] if transitive else self._direct[i])
+
+    def missing_prerequisites(self, topic_id: str, completed: int) -> List[str]:
+        """尚未完成的(传递)前置主题，按学习顺序排列"""
+        return self.ids(self._closure[self.index[topic_id]] & ~completed)
+
+    def dependents_of(self, topic_id: str) -> List[str]:
+        """直接依赖该主题的主题"""
+        return [self.order[i] for i in self._dependents[self.index[topic_id]]]
+
+    def next_available(self, completed: int, candidates: Optional[Iterable[str]] = None,
+                       limit: Optional[int] = None) -> List[str]:
+        """
+        已解锁但未完成的主题，按拓扑序排列。
+        candidates限定查找范围(例如某条学习路径中的主题)，默认在整个主题库中查找。
+        """
+        if candidates is None:
+            positions = range(len(self.order))
+        else:
+            positions = sorted(self.index[topic_id] for topic_id in candidates if topic_id in self.index)
+
+        result = []
+        closure = self._closure
+        for i in positions:
+            if completed >> i & 1:
+                continue
+            if closure[i] & completed == closure[i]:
+                result.append(self.order[i])
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+    def sort_topics(self, topic_ids: Iterable[str]) -> List[str]:
+        """按拓扑序排列，保证前置主题排在前面"""
+        return sorted(topic_ids, key=self.index.__getitem__)
@@ -0,0 +1,333 @@
+"""
+学习主题的倒排索引
+
+对标题、描述和标签建立倒排索引：
+- 英文/数字按单词切分，中文按相邻两字(bigram)切分，单个汉字保留为一个词
+- search 按字段加权的TF-IDF排序返回主题；安装了numpy时每个词的倒排表
+  编译为数组，只在命中的位置上向量化累加，常见词也不需要逐条遍历
+- match_tags 按标签(例如编程语言)和难度筛选主题，只做集合运算
+主题目录的倒排表在编译目录时生成(见 topic_catalogue)，CatalogueIndex 直接读取，
+worker不需要解码全部主题重新分词；TopicIndex 用于内存中的主题集合，
+更新时只对新增或内容变化的主题重新分词。
+"""
+
+import heapq
+import math
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 未安装numpy时逐条累加得分
+    np = None
+
+from lru_cache import LRUCache
+from topic_catalogue import LearningTopic, SkillLevel, TopicCatalogue
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9_+#.]+|[\u3400-\u4dbf\u4e00-\u9fff]+")
+_CJK_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]")
+
+# 各字段中出现一次的权重
+TITLE_WEIGHT = 3.0
+TAG_WEIGHT = 5.0
+DESCRIPTION_WEIGHT = 1.0
+
+
+def tokenize(text: str) -> List[str]:
+    """切分文本；中文连续片段切为bigram，英文去掉首尾的标点"""
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        if _CJK_PATTERN.match(token):
+            if len(token) == 1:
+                tokens.append(token)
+            else:
+                tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            token = token.strip(".")
+            if token:
+                tokens.append(token)
+    return tokens
+
+
+def topic_weights(topic: LearningTopic) -> Dict[str, float]:
+    """主题中每个词按字段加权后的权重"""
+    weights: Dict[str, float] = defaultdict(float)
+    for token in tokenize(topic.title):
+        weights[token] += TITLE_WEIGHT
+    for token in tokenize(topic.description):
+        weights[token] += DESCRIPTION_WEIGHT
+    for tag in topic.tags:
+        for token in tokenize(tag.lower()):
+            weights[token] += TAG_WEIGHT
+    return dict(weights)
+
+
+def _signature(topic: LearningTopic) -> int:
+    return hash((topic.title, topic.description, tuple(topic.tags), topic.difficulty))
+
+
+class TopicIndex:
+    """主题ID上的倒排索引，可增量添加、删除主题"""
+
+    def __init__(self, topics: Optional[Mapping[str, LearningTopic]] = None):
+        # 主题在索引中的位置，删除后不复用
+        self._ids: List[Optional[str]] = []
+        self._positions: Dict[str, int] = {}
+        # 词 -> {主题位置: 权重}，以及按需编译的 (位置数组, 权重数组)
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._compiled: Dict[str, Tuple] = {}
+        self._tags: Dict[str, Set[str]] = defaultdict(set)
+        self._levels: Dict[SkillLevel, Set[str]] = defaultdict(set)
+        self._topic_tokens: Dict[str, Tuple[List[str], List[str], SkillLevel, int]] = {}
+        self._lock = threading.RLock()
+        self.version: Optional[str] = None
+        if topics is not None:
+            self.sync(topics)
+
+    def __len__(self) -> int:
+        return len(self._topic_tokens)
+
+    def __contains__(self, topic_id: str) -> bool:
+        return topic_id in self._topic_tokens
+
+    def add(self, topic: LearningTopic) -> None:
+        """添加或更新一个主题"""
+        with self._lock:
+            if topic.id in self._topic_tokens:
+                self.remove(topic.id)
+
+            weights = topic_weights(topic)
+            tags = [tag.lower() for tag in topic.tags]
+
+            position = len(self._ids)
+            self._ids.append(topic.id)
+            self._positions[topic.id] = position
+            for token, weight in weights.items():
+                self._postings[token][position] = weight
+                self._compiled.pop(token, None)
+            for tag in tags:
+                self._tags[tag].add(topic.id)
+            self._levels[topic.difficulty].add(topic.id)
+            self._topic_tokens[topic.id] = (list(weights), tags, topic.difficulty, _signature(topic))
+
+    def remove(self, topic_id: str) -> bool:
+        with self._lock:
+            entry = self._topic_tokens.pop(topic_id, None)
+            if entry is None:
+                return False
+            tokens, tags, difficulty, _ = entry
+            position = self._positions.pop(topic_id)
+            self._ids[position] = None
+            for token in tokens:
+                postings = self._postings[token]
+                postings.pop(position, None)
+                self._compiled.pop(token, None)
+                if not postings:
+                    del self._postings[token]
+            for tag in tags:
+                self._tags[tag].discard(topic_id)
+                if not self._tags[tag]:
+                    del self._tags[tag]
+            self._levels[difficulty].discard(topic_id)
+            return True
+
+    def sync(self, topics: Mapping[str, LearningTopic]) -> Dict[str, int]:
+        """
+        与主题目录同步：只对新增或内容变化的主题重新分词，并删除目录中已不存在的主题。
+        目录带有version属性且与上次同步相同时直接返回。
+        """
+        version = getattr(topics, "version", None)
+        with self._lock:
+            if version is not None and version == self.version:
+                return {"added": 0, "updated": 0, "removed": 0}
+
+            stats = {"added": 0, "updated": 0, "removed": 0}
+            seen = set()
+            for topic_id in topics:
+                seen.add(topic_id)
+                topic = topics[topic_id]
+                entry = self._topic_tokens.get(topic_id)
+                if entry is None:
+                    stats["added"] += 1
+                elif entry[3] != _signature(topic):
+                    stats["updated"] += 1
+                else:
+                    continue
+                self.add(topic)
+            for topic_id in [topic_id for topic_id in self._topic_tokens if topic_id not in seen]:
+                self.remove(topic_id)
+                stats["removed"] += 1
+
+            self.version = version
+            return stats
+
+    def search(self, query: str, limit: int = 10,
+               candidates: Optional[Set[str]] = None) -> List[Tuple[str, float]]:
+        """按相关度排序的 (主题ID, 得分)；candidates限定结果范围(例如 match_tags 的结果)"""
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+
+        with self._lock:
+            total = len(self)
+            weighted = []
+            for token in tokens:
+                count = self._posting_count(token)
+                if count:
+                    weighted.append((token, math.log(1 + total / count)))
+            if not weighted:
+                return []
+            if np is not None:
+                hits = self._score_arrays(weighted, limit, candidates)
+            else:
+                hits = self._score_dicts(weighted, limit, candidates)
+            return [(self._topic_id(position), score) for position, score in hits]
+
+    # 以下方法读取倒排表，CatalogueIndex 改为读取目录文件
+    def _posting_count(self, token: str) -> int:
+        postings = self._postings.get(token)
+        return len(postings) if postings else 0
+
+    def _posting_items(self, token: str) -> Iterable[Tuple[int, float]]:
+        return self._postings[token].items()
+
+    def _posting_arrays(self, token: str) -> Tuple:
+        compiled = self._compiled.get(token)
+        if compiled is None:
+            postings = self._postings[token]
+            compiled = self._compiled[token] = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+            )
+        return compiled
+
+    def _topic_id(self, position: int) -> str:
+        return self._ids[position]
+
+    def _position(self, topic_id: str) -> Optional[int]:
+        return self._positions.get(topic_id)
+
+    def _score_dicts(self, weighted, limit: int, candidates: Optional[Set[str]]) -> List[Tuple[int, float]]:
+        allowed = None if candidates is None else {
+            position for position in map(self._position, candidates) if position is not None
+        }
+        scores: Dict[int, float] = defaultdict(float)
+        for token, idf in weighted:
+            for position, weight in self._posting_items(token):
+                if allowed is None or position in allowed:
+                    scores[position] += weight * idf
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+
+    def _score_arrays(self, weighted, limit: int, candidates: Optional[Set[str]]) -> List[Tuple[int, float]]:
+        arrays = [self._posting_arrays(token) for token, _ in weighted]
+        positions = np.concatenate([positions for positions, _ in arrays])
+        weights = np.concatenate([weights * idf for (_, weights), (_, idf) in zip(arrays, weighted)])
+        # 只在倒排表中出现的位置上累加(按词的顺序)，与主题总数无关
+        matched, inverse = np.unique(positions, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights, minlength=len(matched))
+        if candidates is None:
+            return [(int(matched[i]), float(scores[i])) for i in self._top(scores, limit)]
+
+        # 先取得分最高的一批再按候选集合过滤，不够时逐步扩大范围
+        size = limit * 4
+        while True:
+            hits = [(int(matched[i]), float(scores[i])) for i in self._top(scores, size)
+                    if self._topic_id(matched[i]) in candidates]
+            if len(hits) >= limit or size >= len(matched):
+                return hits[:limit]
+            size *= 4
+
+    @staticmethod
+    def _top(scores, size: int):
+        """得分最高的size个下标(下标按位置升序)，得分相同时按加入索引的先后排序"""
+        top = np.arange(len(scores))
+        if len(scores) > size:
+            kth = -np.partition(-scores, size - 1)[size - 1]
+            above = np.flatnonzero(scores > kth)
+            tied = np.flatnonzero(scores == kth)
+            top = np.concatenate((above, tied[:size - len(above)]))
+        return top[np.lexsort((top, -scores[top]))]
+
+    def match_tags(self, tags: Iterable[str], match_all: bool = False,
+                   difficulty: Optional[SkillLevel] = None) -> Set[str]:
+        """带有任一(match_all时为全部)标签的主题ID，可按难度筛选"""
+        with self._lock:
+            sets = [self._tags.get(tag.lower(), set()) for tag in tags]
+            if sets:
+                result = set.intersection(*sets) if match_all else set().union(*sets)
+            else:
+                result = set(self._topic_tokens)
+            if difficulty is not None:
+                result &= self._levels.get(difficulty, set())
+            return result
+
+
+class CatalogueIndex(TopicIndex):
+    """直接读取目录文件中编译好的倒排表，只读；查询用到的倒排表解码后缓存"""
+
+    def __init__(self, catalogue: TopicCatalogue, cache_size: int = 1024):
+        super().__init__()
+        self.catalogue = catalogue
+        self.version = catalogue.version
+        self._arrays = LRUCache(maxsize=cache_size)
+
+    def __len__(self) -> int:
+        return len(self.catalogue)
+
+    def __contains__(self, topic_id: str) -> bool:
+        return topic_id in self.catalogue
+
+    def add(self, topic: LearningTopic) -> None:
+        raise TypeError("目录索引是只读的，修改主题后需要重新编译目录")
+
+    def remove(self, topic_id: str) -> bool:
+        raise TypeError("目录索引是只读的，修改主题后需要重新编译目录")
+
+    def _posting_count(self, token: str) -> int:
+        return self.catalogue.posting_count(token)
+
+    def _posting_items(self, token: str) -> Iterable[Tuple[int, float]]:
+        return zip(*self.catalogue.postings(token))
+
+    def _posting_arrays(self, token: str) -> Tuple:
+        arrays = self._arrays.get(token)
+        if arrays is None:
+            positions, weights = self.catalogue.postings(token)
+            arrays = (np.array(positions, dtype=np.int64), np.array(weights, dtype=np.float64))
+            self._arrays.set(token, arrays)
+        return arrays
+
+    def _topic_id(self, position: int) -> str:
+        return self.catalogue.id_at(position)
+
+    def _position(self, topic_id: str) -> Optional[int]:
+        return self.catalogue.index_of(topic_id)
+
+    def match_tags(self, tags: Iterable[str], match_all: bool = False,
+                   difficulty: Optional[SkillLevel] = None) -> Set[str]:
+        sets = [set(self.catalogue.tag_positions(tag.lower())) for tag in tags]
+        result = None
+        if sets:
+            result = set.intersection(*sets) if match_all else set().union(*sets)
+        if difficulty is not None:
+            level = set(self.catalogue.level_positions(difficulty))
+            result = level if result is None else result & level
+        if result is None:
+            return set(self.catalogue)
+        return {self.catalogue.id_at(position) for position in result}
+
+
+_shared: Dict[str, CatalogueIndex] = {}
+_shared_lock = threading.Lock()
+
+
+def index_for(catalogue: TopicCatalogue) -> TopicIndex:
+    """同一目录对象在进程内共享一个索引；目录文件被替换后换用新目录的索引"""
+    with _shared_lock:
+        index = _shared.get(catalogue.path)
+        if index is None or index.catalogue is not catalogue:
+            index = _shared[catalogue.path] = CatalogueIndex(catalogue)
+        return index
@@ -0,0 +1,54 @@
+from logging.config import fileConfig
+
+from sqlalchemy import create_engine, pool
+
+from alembic import context
+
+from app.core.config import settings
+from app.models import learning_session, user, user_stats
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+# 各模型模块各自声明Base，autogenerate时一并比较
+target_metadata = [
+    user.Base.metadata,
+    learning_session.Base.metadata,
+    user_stats.Base.metadata,
+]
+
+
+def get_url() -> str:
+    # 命令行 -x url=... 优先，其次使用应用配置
+    return context.get_x_argument(as_dictionary=True).get("url") or settings.DATABASE_URL
+
+
+def run_migrations_offline() -> None:
+    """只生成SQL脚本，不连接数据库(alembic upgrade head --sql)"""
+    context.configure(
+        url=get_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    connectable = create_engine(get_url(), poolclass=pool.NullPool)
+
+    with connectable.connect() as connection:
+        context.configure(connection=connection, target_metadata=target_metadata)
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,100 @@
+"""learning_sessions 的新增列、user_stats 聚合表，以及 (user_id, created_at, id) 复合索引
+
+从最初的 Base.metadata.create_all 建表之后，模型增加了：
+- learning_sessions.analysis_snapshot：函数粒度的分析快照，用于增量分析
+- learning_sessions.severity_counts / ai_score：评分依据，用于批量重新评分
+- user_stats：每个用户一行的学习统计，由已有会话重建
+应用启动时的 create_all 可能已经建好 user_stats(以及新库的全部列)，已存在的列和表跳过；
+此时表中可能为空或只累加了启动后插入的会话，所以无论表是否新建都清空后按会话重建。
+
+会话历史按 (created_at, id) 倒序做游标分页，复合索引让任意一页都只需一次索引定位
+加上 limit 行的读取。PostgreSQL上使用 CREATE INDEX CONCURRENTLY，不阻塞写入。
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = "ix_learning_sessions_user_created_id"
+
+SESSION_COLUMNS = (
+    ("analysis_snapshot", sa.Text()),
+    ("severity_counts", sa.String(64)),
+    ("ai_score", sa.Float()),
+)
+
+# 与 app.models.user_stats.rebuild_user_stats 相同的聚合(先清空已有的行)
+CLEAR_USER_STATS = "DELETE FROM user_stats"
+BACKFILL_USER_STATS = """
+INSERT INTO user_stats (user_id, session_count, score_sum, scored_count, best_score, duration_minutes)
+SELECT user_id,
+       count(*),
+       coalesce(sum(CASE WHEN score > 0 THEN score ELSE 0.0 END), 0.0),
+       coalesce(sum(CASE WHEN score > 0 THEN 1 ELSE 0 END), 0),
+       max(score),
+       coalesce(sum(duration_minutes), 0)
+FROM learning_sessions
+WHERE user_id IS NOT NULL
+GROUP BY user_id
+"""
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    existing = {column["name"] for column in inspector.get_columns("learning_sessions")}
+    missing = [(name, type_) for name, type_ in SESSION_COLUMNS if name not in existing]
+    if missing:
+        with op.batch_alter_table("learning_sessions") as batch_op:
+            for name, type_ in missing:
+                batch_op.add_column(sa.Column(name, type_, nullable=True))
+
+    if not inspector.has_table("user_stats"):
+        op.create_table(
+            "user_stats",
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+            sa.Column("session_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("score_sum", sa.Float(), nullable=False, server_default="0"),
+            sa.Column("scored_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("best_score", sa.Float()),
+            sa.Column("duration_minutes", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now())
+        )
+    op.execute(CLEAR_USER_STATS)
+    op.execute(BACKFILL_USER_STATS)
+
+    # CONCURRENTLY不能在事务中执行
+    with op.get_context().autocommit_block():
+        op.create_index(
+            INDEX_NAME,
+            "learning_sessions",
+            ["user_id", "created_at", "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            INDEX_NAME,
+            table_name="learning_sessions",
+            postgresql_concurrently=True,
+            if_exists=True
+        )
+    op.drop_table("user_stats")
+    with op.batch_alter_table("learning_sessions") as batch_op:
+        for name, _ in reversed(SESSION_COLUMNS):
+            batch_op.drop_column(name)
@@ -0,0 +1,60 @@
+"""提交代码按内容哈希去重压缩保存(code_blobs)
+
+新增 code_blobs 表和 learning_sessions.code_hash 列。新会话的代码只写入 code_blobs，
+已有会话的 code_content 由 app.jobs.migrate_code_blobs 分批迁移，迁移后该列为空
+(PostgreSQL上空间在VACUUM后复用，VACUUM FULL后归还)。
+回滚前需要用 migrate_code_blobs --restore 把代码写回 code_content。
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 应用启动时的 create_all 可能已经建好 code_blobs(新库还包括 code_hash 列)
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("code_blobs"):
+        op.create_table(
+            "code_blobs",
+            sa.Column("hash", sa.String(64), primary_key=True),
+            sa.Column("encoding", sa.String(16), nullable=False),
+            sa.Column("size", sa.Integer(), nullable=False),
+            sa.Column("data", sa.LargeBinary(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now())
+        )
+    if "code_hash" in {column["name"] for column in inspector.get_columns("learning_sessions")}:
+        return
+    # 可为空的新列不重写表；外键检查只在写入code_hash时进行
+    with op.batch_alter_table("learning_sessions") as batch_op:
+        batch_op.add_column(sa.Column("code_hash", sa.String(64), nullable=True))
+        batch_op.create_foreign_key(
+            "fk_learning_sessions_code_hash", "code_blobs", ["code_hash"], ["hash"]
+        )
+
+
+def downgrade() -> None:
+    # 已迁移的会话代码只在code_blobs中，需要先用 migrate_code_blobs --restore 写回code_content
+    migrated = op.get_bind().execute(
+        sa.text("SELECT count(*) FROM learning_sessions WHERE code_hash IS NOT NULL")
+    ).scalar()
+    if migrated:
+        raise RuntimeError(
+            f"{migrated} 个会话的代码保存在code_blobs中，请先运行 python -m app.jobs.migrate_code_blobs --restore"
+        )
+    with op.batch_alter_table("learning_sessions") as batch_op:
+        batch_op.drop_constraint("fk_learning_sessions_code_hash", type_="foreignkey")
+        batch_op.drop_column("code_hash")
+    op.drop_table("code_blobs")
@@ -1,22 +1,154 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from typing import Dict, Any, Optional, Tuple
+from datetime import datetime
+import base64
+import json
 import sys
 import os
 
 # 添加AI引擎路径
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../../../ai_engine'))
-from code_analyzer import CodeAnalyzer
+from code_analyzer import AsyncCodeAnalyzer
+from analysis_cache import AnalysisCache
+from incremental import IncrementalAnalyzer
+from llm_client import LLMClientConfig, get_llm_client
+from llm_scheduler import LLMScheduler, Priority, llm_context
+from model_router import ModelRouter
+from parse_service import ParseService, SubmissionRejected
+from scoring import DEFAULT_WEIGHTS, ScoreWeights, severity_counts
+from single_flight import RedisSingleFlight
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.async_database import async_session, get_async_db, pool_stats
+from app.core.session_writer import add_sessions, session_writer
+from app.core.redis_client import redis_client
 from app.models.user import User
-from app.models.learning_session import LearningSession, LearningSessionCreate, LearningSessionResponse
+from app.models.learning_session import (
+    CodeBlob, LearningSession, LearningSessionCreate, LearningSessionResponse, LearningSessionPage, BatchAnalysisRequest
+)
+from app.models.user_stats import UserStats, stats_response
 from app.core.auth import get_current_user
 
 router = APIRouter()
 
-# 初始化代码分析器
-code_analyzer = CodeAnalyzer(settings.OPENAI_API_KEY, settings.OPENAI_MODEL)
+# 分析结果缓存：进程内LRU + Redis
+analysis_cache = AnalysisCache(
+    maxsize=settings.ANALYSIS_CACHE_SIZE,
+    ttl=settings.ANALYSIS_CACHE_TTL,
+    redis=redis_client
+)
+
+# 相同分析请求合并：进程内共享 + Redis锁跨worker共享
+single_flight = RedisSingleFlight(
+    redis_client,
+    lock_ttl=settings.ANALYSIS_LOCK_TTL,
+    wait_timeout=settings.ANALYSIS_LOCK_WAIT_TIMEOUT
+)
+
+# 隔离解析服务：超大或恶意构造的代码不会拖垮请求进程
+parse_service = ParseService(
+    max_workers=settings.PARSE_WORKERS,
+    timeout=settings.PARSE_TIMEOUT_SECONDS,
+    max_code_bytes=settings.PARSE_MAX_CODE_BYTES,
+    max_lines=settings.PARSE_MAX_LINES,
+    memory_limit_mb=settings.PARSE_MEMORY_LIMIT_MB,
+    max_jobs_per_worker=settings.PARSE_MAX_JOBS_PER_WORKER,
+    start_timeout=settings.PARSE_START_TIMEOUT_SECONDS
+)
+
+# 分级模型路由：语法错误不调用LLM，小规模代码使用快速模型
+model_router = ModelRouter(
+    settings.OPENAI_MODEL,
+    settings.OPENAI_FAST_MODEL,
+    full_min_lines=settings.ROUTING_FULL_MIN_LINES,
+    full_min_complexity=settings.ROUTING_FULL_MIN_COMPLEXITY,
+    full_min_functions=settings.ROUTING_FULL_MIN_FUNCTIONS
+)
+
+# 共享的LLM客户端：keep-alive连接池，429/5xx按退避重试
+llm_client = get_llm_client(LLMClientConfig(
+    api_key=settings.OPENAI_API_KEY,
+    base_url=settings.OPENAI_BASE_URL,
+    timeout=settings.LLM_TIMEOUT_SECONDS,
+    max_retries=settings.LLM_MAX_RETRIES,
+    max_connections=settings.LLM_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS
+))
+
+# LLM请求调度：按请求数/token数限流，交互式请求优先，同一优先级内各用户轮流放行
+llm_scheduler = LLMScheduler(
+    llm_client,
+    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE
+)
+
+# 评分权重表：调整后可用 app.jobs.rescore_sessions 重新计算历史会话的评分
+score_weights = (
+    ScoreWeights.load(settings.SCORE_WEIGHTS_FILE) if settings.SCORE_WEIGHTS_FILE else DEFAULT_WEIGHTS
+)
+
+# 初始化代码分析器(异步，不阻塞事件循环)
+code_analyzer = AsyncCodeAnalyzer(
+    settings.OPENAI_API_KEY,
+    settings.OPENAI_MODEL,
+    cache=analysis_cache,
+    max_workers=settings.ANALYSIS_EXECUTOR_WORKERS,
+    batch_concurrency=settings.ANALYSIS_BATCH_CONCURRENCY,
+    process_workers=settings.ANALYSIS_PROCESS_WORKERS,
+    parse_service=parse_service,
+    single_flight=single_flight,
+    chunk_token_budget=settings.ANALYSIS_CHUNK_TOKENS,
+    chunk_concurrency=settings.ANALYSIS_CHUNK_CONCURRENCY,
+    router=model_router,
+    score_weights=score_weights,
+    llm_client=llm_scheduler,
+    ai_deadline=settings.LLM_DEADLINE_SECONDS
+)
+
+# 增量分析：只重新分析相对上次提交修改过的函数/类
+incremental_analyzer = IncrementalAnalyzer(code_analyzer)
+
+def _rejected_error(error: SubmissionRejected) -> HTTPException:
+    """将解析服务的拒绝结果转换为HTTP错误"""
+    result = error.result
+    return HTTPException(
+        status_code=(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE if result.status == "too_large"
+            else status.HTTP_422_UNPROCESSABLE_ENTITY
+        ),
+        detail={"status": result.status, "reason": result.reason}
+    )
+
+def _score_fields(analysis_result: Dict[str, Any]) -> Dict[str, Any]:
+    """保存评分所依据的问题计数和AI评分，权重调整后可以批量重新评分"""
+    return {
+        "score": analysis_result.get("overall_score", 0.0),
+        "severity_counts": json.dumps(severity_counts(analysis_result)),
+        "ai_score": analysis_result.get("ai_analysis", {}).get("score")
+    }
+
+async def _load_previous_snapshot(db: AsyncSession, user_id: int, topic: str, language: str):
+    """获取用户在同一主题下最近一次提交的分析快照"""
+    result = await db.execute(
+        select(LearningSession.analysis_snapshot).where(
+            LearningSession.user_id == user_id,
+            LearningSession.topic == topic,
+            LearningSession.language == language,
+            LearningSession.analysis_snapshot.isnot(None)
+        ).order_by(LearningSession.created_at.desc(), LearningSession.id.desc()).limit(1)
+    )
+    row = result.first()
+    
+    if row is None:
+        return None
+    try:
+        return json.loads(row.analysis_snapshot)
+    except ValueError:
+        return None
 
 @router.post("/analyze", response_model=Dict[str, Any])
 async def analyze_code(
@@ -24,19 +156,24 @@ async def analyze_code(
     language: str,
     topic: str = "general",
     session_type: str = "code_review",
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     分析用户提交的代码
     """
     try:
-        # 使用AI分析代码
-        analysis_result = code_analyzer.analyze_code(
-            code=code,
-            language=language,
-            user_level=current_user.skill_level
-        )
+        # 使用AI分析代码：相同代码直接命中缓存，修改过的代码只重新分析变化的函数
+        previous_snapshot = await _load_previous_snapshot(db, current_user.id, topic, language)
+        # 等待LLM期间不占用数据库连接
+        await db.close()
+        with llm_context(user_id=current_user.id, priority=Priority.INTERACTIVE):
+            analysis_result, snapshot = await incremental_analyzer.analyze_code(
+                code=code,
+                language=language,
+                user_level=current_user.skill_level,
+                previous_snapshot=previous_snapshot
+            )
         
         # 生成用户友好的反馈
         feedback = code_analyzer.generate_feedback(analysis_result, current_user.skill_level)
@@ -49,23 +186,21 @@ async def analyze_code(
             code_content=code
         )
         
-        # 保存到数据库
-        db_session = LearningSession(
-            user_id=current_user.id,
-            session_type=session_data.session_type,
-            language=session_data.language,
-            topic=session_data.topic,
-            code_content=session_data.code_content,
-            ai_feedback=feedback,
-            score=analysis_result.get("overall_score", 0.0)
-        )
-        
-        db.add(db_session)
-        db.commit()
-        db.refresh(db_session)
+        # 保存到数据库(启用延迟写入时只分配ID并入队)
+        async with async_session() as write_db:
+            session_id = await session_writer.save(write_db, dict(
+                user_id=current_user.id,
+                session_type=session_data.session_type,
+                language=session_data.language,
+                topic=session_data.topic,
+                code_content=session_data.code_content,
+                ai_feedback=feedback,
+                analysis_snapshot=json.dumps(snapshot, ensure_ascii=False) if snapshot else None,
+                **_score_fields(analysis_result)
+            ))
         
         return {
-            "session_id": db_session.id,
+            "session_id": session_id,
             "analysis": analysis_result,
             "feedback": feedback,
             "score": analysis_result.get("overall_score", 0.0),
@@ -73,42 +208,250 @@ async def analyze_code(
             "issues_count": len(analysis_result.get("syntax_issues", []))
         }
         
+    except SubmissionRejected as e:
+        raise _rejected_error(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"代码分析失败: {str(e)}"
         )
 
-@router.get("/sessions", response_model=list[LearningSessionResponse])
+def _sse_event(event: str, data: Any) -> str:
+    """格式化一条Server-Sent Events消息"""
+    payload = json.dumps(jsonable_encoder(data), ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+@router.post("/analyze/stream")
+async def analyze_code_stream(
+    code: str,
+    language: str,
+    topic: str = "general",
+    session_type: str = "code_review",
+    current_user: User = Depends(get_current_user)
+):
+    """
+    流式分析用户提交的代码(SSE)：
+    先推送静态分析问题，再逐段推送AI分析内容，最后推送评分和会话ID。
+    与 /analyze 相同进行增量分析(超出token预算的代码分块分析)，并保存分析快照
+    """
+    async def event_stream():
+        try:
+            async with async_session() as read_db:
+                previous_snapshot = await _load_previous_snapshot(read_db, current_user.id, topic, language)
+            snapshot = None
+            with llm_context(user_id=current_user.id, priority=Priority.INTERACTIVE):
+                async for event, data in incremental_analyzer.analyze_code_stream(
+                    code=code,
+                    language=language,
+                    user_level=current_user.skill_level,
+                    previous_snapshot=previous_snapshot
+                ):
+                    if event == "snapshot":
+                        snapshot = data
+                        continue
+                    if event != "result":
+                        yield _sse_event(event, data)
+                        continue
+                    
+                    analysis_result = data
+                    feedback = code_analyzer.generate_feedback(analysis_result, current_user.skill_level)
+                    
+                    # 保存到数据库(只在写入时占用连接，不在整个流期间占用)
+                    async with async_session() as write_db:
+                        session_id = await session_writer.save(write_db, dict(
+                            user_id=current_user.id,
+                            session_type=session_type,
+                            language=language,
+                            topic=topic,
+                            code_content=code,
+                            ai_feedback=feedback,
+                            analysis_snapshot=json.dumps(snapshot, ensure_ascii=False) if snapshot else None,
+                            **_score_fields(analysis_result)
+                        ))
+                    
+                    yield _sse_event("done", {
+                        "session_id": session_id,
+                        "feedback": feedback,
+                        "score": analysis_result.get("overall_score", 0.0),
+                        "ai_analysis": analysis_result.get("ai_analysis", {}),
+                        "issues_count": len(analysis_result.get("syntax_issues", []))
+                    })
+        except SubmissionRejected as e:
+            yield _sse_event("error", {"status": e.result.status, "detail": e.result.reason})
+        except Exception as e:
+            yield _sse_event("error", {"detail": f"代码分析失败: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/analyze/batch", response_model=Dict[str, Any])
+async def analyze_code_batch(
+    request: BatchAnalysisRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    批量分析代码(例如整个班级的作业)，结果按提交顺序返回
+    """
+    submissions = request.submissions
+    if len(submissions) > settings.ANALYSIS_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"单次最多提交 {settings.ANALYSIS_BATCH_MAX_ITEMS} 份代码"
+        )
+    
+    try:
+        # 批量提交的AI分析让位于交互式请求
+        with llm_context(user_id=current_user.id, priority=Priority.BACKGROUND):
+            batch_results = await code_analyzer.analyze_many(
+                [{"code": item.code, "language": item.language} for item in submissions],
+                user_level=current_user.skill_level
+            )
+        
+        results = []
+        session_rows = []
+        for submission, item in zip(submissions, batch_results):
+            if item["error"] is not None:
+                results.append({"index": item["index"], "error": item["error"]})
+                continue
+            
+            analysis_result = item["result"]
+            feedback = code_analyzer.generate_feedback(analysis_result, current_user.skill_level)
+            session_rows.append(dict(
+                user_id=current_user.id,
+                session_type=submission.session_type,
+                language=submission.language,
+                topic=submission.topic,
+                code_content=submission.code,
+                ai_feedback=feedback,
+                **_score_fields(analysis_result)
+            ))
+            results.append({
+                "index": item["index"],
+                "analysis": analysis_result,
+                "feedback": feedback,
+                "score": analysis_result.get("overall_score", 0.0),
+                "issues_count": len(analysis_result.get("syntax_issues", []))
+            })
+        
+        # 整批会话一次性写入(相同代码只保存一份)，flush后即可拿到自增ID
+        db_sessions = iter(await add_sessions(db, session_rows))
+        await db.flush()
+        for result in results:
+            if "error" not in result:
+                result["session_id"] = next(db_sessions).id
+        await db.commit()
+        
+        return {
+            "results": results,
+            "succeeded": len(session_rows),
+            "failed": len(results) - len(session_rows)
+        }
+        
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量代码分析失败: {str(e)}"
+        )
+
+@router.get("/cache/stats")
+async def get_cache_stats(current_user: User = Depends(get_current_user)):
+    """
+    获取代码分析缓存的命中统计、请求合并统计、模型路由统计、LLM调度统计、数据库连接池统计以及会话写入统计
+    """
+    return {
+        **analysis_cache.stats(),
+        "single_flight": single_flight.stats(),
+        "routing": model_router.stats(),
+        "llm": llm_scheduler.stats(),
+        "db_pool": pool_stats(),
+        "session_writer": session_writer.stats()
+    }
+
+def _encode_cursor(session: LearningSession) -> str:
+    """游标为最后一条会话的 (created_at, id)，对客户端不透明"""
+    payload = json.dumps([session.created_at.isoformat(), session.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, session_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(session_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效的分页游标")
+
+@router.get("/sessions", response_model=LearningSessionPage)
 async def get_user_sessions(
-    skip: int = 0,
-    limit: int = 10,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    获取用户的学习会话历史
+    获取用户的学习会话历史(按时间倒序)。
+    使用上一页返回的next_cursor获取下一页；按 (user_id, created_at, id) 索引定位，
+    任意一页的开销都与第一页相同。列表不包含代码，完整代码见会话详情。
     """
-    sessions = db.query(LearningSession).filter(
-        LearningSession.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
+    query = select(LearningSession).options(load_only(
+        LearningSession.id,
+        LearningSession.session_type,
+        LearningSession.language,
+        LearningSession.topic,
+        LearningSession.ai_feedback,
+        LearningSession.score,
+        LearningSession.duration_minutes,
+        LearningSession.created_at
+    )).where(LearningSession.user_id == current_user.id)
+    if cursor is not None:
+        created_at, session_id = _decode_cursor(cursor)
+        query = query.where(tuple_(LearningSession.created_at, LearningSession.id) < (created_at, session_id))
+    
+    # 多取一条判断是否还有下一页
+    result = await db.execute(query.order_by(
+        LearningSession.created_at.desc(), LearningSession.id.desc()
+    ).limit(limit + 1))
+    sessions = result.scalars().all()
     
-    return sessions
+    has_more = len(sessions) > limit
+    sessions = sessions[:limit]
+    return {
+        "items": sessions,
+        "next_cursor": _encode_cursor(sessions[-1]) if has_more else None
+    }
 
 @router.get("/sessions/{session_id}", response_model=LearningSessionResponse)
 async def get_session_detail(
     session_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     获取特定会话的详细信息
     """
-    session = db.query(LearningSession).filter(
-        LearningSession.id == session_id,
-        LearningSession.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(LearningSession, CodeBlob)
+        .outerjoin(CodeBlob, LearningSession.code_hash == CodeBlob.hash)
+        .where(
+            LearningSession.id == session_id,
+            LearningSession.user_id == current_user.id
+        )
+    )
+    row = result.first()
+    if row is not None:
+        session, blob = row
+        detail = LearningSessionResponse.model_validate(session)
+        # 迁移前的旧会话没有code_hash，代码仍在code_content列
+        if blob is not None:
+            detail.code_content = blob.code
+        return detail
     
+    # 延迟写入时，刚返回的会话可能还在队列中
+    session = session_writer.pending(session_id, current_user.id)
     if not session:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -119,43 +462,10 @@ async def get_session_detail(
 
 @router.get("/stats")
 async def get_user_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    获取用户的学习统计信息
+    获取用户的学习统计信息(读取增量维护的聚合行，见 app.models.user_stats)
     """
-    # 获取总会话数
-    total_sessions = db.query(LearningSession).filter(
-        LearningSession.user_id == current_user.id
-    ).count()
-    
-    # 获取平均分数
-    avg_score = db.query(LearningSession).filter(
-        LearningSession.user_id == current_user.id,
-        LearningSession.score > 0
-    ).with_entities(
-        db.func.avg(LearningSession.score)
-    ).scalar() or 0.0
-    
-    # 获取最佳分数
-    best_score = db.query(LearningSession).filter(
-        LearningSession.user_id == current_user.id
-    ).with_entities(
-        db.func.max(LearningSession.score)
-    ).scalar() or 0.0
-    
-    # 获取学习时长
-    total_duration = db.query(LearningSession).filter(
-        LearningSession.user_id == current_user.id
-    ).with_entities(
-        db.func.sum(LearningSession.duration_minutes)
-    ).scalar() or 0
-    
-    return {
-        "total_sessions": total_sessions,
-        "average_score": round(avg_score, 2),
-        "best_score": round(best_score, 2),
-        "total_duration_minutes": total_duration,
-        "total_duration_hours": round(total_duration / 60, 1)
-    } 
\ No newline at end of file
+    return stats_response(await db.get(UserStats, current_user.id)) 
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""
+异步数据库访问
+
+async def 的接口使用 AsyncSession，查询和提交期间让出事件循环，
+一个请求等待数据库时不会阻塞同一worker上的其他请求。
+PostgreSQL使用asyncpg驱动，SQLite(本地测试)使用aiosqlite驱动，
+连接地址默认由 DATABASE_URL 换成对应的异步驱动。
+"""
+
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_url(url: str) -> str:
+    """把同步驱动的连接地址换成对应的异步驱动"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if parsed.drivername in _ASYNC_DRIVERS.values():
+        return url
+    if backend not in _ASYNC_DRIVERS:
+        raise ValueError(f"不支持的异步数据库: {parsed.drivername}")
+    return parsed.set(drivername=_ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+class PoolMetrics:
+    """连接池指标：获取连接的等待时间(async_session)，以及新建、归还和失效的连接数"""
+
+    def __init__(self):
+        self.counters = {"connects": 0, "checkouts": 0, "checkins": 0, "invalidated": 0}
+        self.acquire_count = 0
+        self.acquire_total = 0.0
+        self.acquire_max = 0.0
+
+    def attach(self, engine: AsyncEngine) -> None:
+        pool_events = engine.sync_engine.pool
+        for name, counter in (("connect", "connects"), ("checkout", "checkouts"),
+                              ("checkin", "checkins"), ("invalidate", "invalidated")):
+            event.listen(pool_events, name, self._counter(counter))
+
+    def _counter(self, name: str):
+        def increment(*args) -> None:
+            self.counters[name] += 1
+        return increment
+
+    def record_acquire(self, seconds: float) -> None:
+        self.acquire_count += 1
+        self.acquire_total += seconds
+        self.acquire_max = max(self.acquire_max, seconds)
+
+    def snapshot(self, engine: AsyncEngine) -> Dict:
+        pool = engine.sync_engine.pool
+        stats = {**self.counters}
+        # NullPool/StaticPool(例如SQLite内存库)没有这些计数
+        for name in ("size", "checkedin", "checkedout", "overflow"):
+            method = getattr(pool, name, None)
+            if method is not None:
+                stats[name] = method()
+        stats["acquire_avg_ms"] = round(self.acquire_total / self.acquire_count * 1000, 2) if self.acquire_count else 0.0
+        stats["acquire_max_ms"] = round(self.acquire_max * 1000, 2)
+        return stats
+
+
+def create_engine_for(url: str) -> AsyncEngine:
+    url = async_url(url)
+    if make_url(url).get_backend_name() == "sqlite":
+        return create_async_engine(url)
+    # 连接数上限 = pool_size + max_overflow，多个worker时总数不能超过数据库的max_connections
+    return create_async_engine(
+        url,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=True
+    )
+
+
+async_engine = create_engine_for(settings.ASYNC_DATABASE_URL or settings.DATABASE_URL)
+# 提交后不过期对象，返回给响应序列化时不需要再次查询
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+pool_metrics = PoolMetrics()
+pool_metrics.attach(async_engine)
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """
+    FastAPI依赖：每个请求一个AsyncSession。
+    第一次查询时才获取连接，commit()/close()后归还；
+    请求中需要等待LLM时应先归还连接，之后的写入使用 async_session()。
+    """
+    async with AsyncSessionLocal() as session:
+        yield session
+
+
+@asynccontextmanager
+async def async_session() -> AsyncIterator[AsyncSession]:
+    """短时间使用的会话：立即获取连接并记录等待时间，退出时归还"""
+    async with AsyncSessionLocal() as session:
+        started = time.perf_counter()
+        await session.connection()
+        pool_metrics.record_acquire(time.perf_counter() - started)
+        yield session
+
+
+def pool_stats(engine: Optional[AsyncEngine] = None) -> Dict:
+    return pool_metrics.snapshot(engine or async_engine)
+
+
+async def close_async_engine() -> None:
+    await async_engine.dispose()
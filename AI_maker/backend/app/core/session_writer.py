@@ -0,0 +1,258 @@
+"""
+学习会话的延迟批量写入(write-behind)
+
+启用后(SESSION_WRITE_BEHIND)，/analyze 不在请求中提交事务：
+- 会话ID预先从PostgreSQL序列中按块取出，请求中分配ID不需要访问数据库，响应照常返回session_id
+- 会话记录放入进程内队列，后台任务按批量大小或时间间隔一次性写入(一个事务、一次提交)
+- 写入失败时重试，仍失败或关闭时未写入的记录追加到本地spool文件，下次启动时补写
+- 写入完成前可以通过 pending() 读到记录(会话详情接口使用)，用户统计在写入后更新
+
+队列已满、未启用或数据库不是PostgreSQL时，在请求中直接写入。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.async_database import AsyncSessionLocal
+from app.core.config import settings
+from app.models.learning_session import LearningSession, code_blob_row, insert_code_blobs
+
+logger = logging.getLogger(__name__)
+
+
+def _to_json(row: Dict) -> str:
+    return json.dumps({**row, "created_at": row["created_at"].isoformat()}, ensure_ascii=False)
+
+
+def _from_json(line: str) -> Dict:
+    row = json.loads(line)
+    row["created_at"] = datetime.fromisoformat(row["created_at"])
+    return row
+
+
+async def add_sessions(db: AsyncSession, rows: List[Dict]) -> List[LearningSession]:
+    """代码先写入code_blobs(已存在的哈希跳过)，再添加按哈希引用代码的会话，由调用方提交"""
+    blobs = []
+    sessions = []
+    for row in rows:
+        fields = dict(row)
+        code = fields.pop("code_content", None)
+        if code is not None:
+            blob = code_blob_row(code)
+            blobs.append(blob)
+            fields["code_hash"] = blob["hash"]
+        sessions.append(LearningSession(**fields))
+    if blobs:
+        await db.execute(insert_code_blobs(db.get_bind().dialect.name, blobs))
+    db.add_all(sessions)
+    return sessions
+
+
+class SessionWriter:
+    """学习会话的后台批量写入器"""
+
+    def __init__(self, session_factory: async_sessionmaker, enabled: bool = False,
+                 batch_size: int = 200, interval: float = 0.5, max_queue: int = 10000,
+                 id_block_size: int = 100, spool_path: Optional[str] = None, max_retries: int = 3):
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_queue = max_queue
+        self.id_block_size = id_block_size
+        self.spool_path = spool_path
+        self.max_retries = max_retries
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        # 已分配ID但尚未写入数据库的记录，写入成功后移除
+        self._pending: Dict[int, Dict] = {}
+        self._ids: Deque[int] = deque()
+        self._id_lock = asyncio.Lock()
+        self.counters = {
+            "enqueued": 0, "written": 0, "batches": 0, "retries": 0,
+            "spooled": 0, "replayed": 0, "direct_writes": 0, "id_blocks": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        """启动后台写入；需要在应用的事件循环中调用"""
+        if not self.enabled or self.running:
+            return
+        async with self.session_factory() as db:
+            if db.get_bind().dialect.name != "postgresql":
+                logger.warning("会话延迟写入需要PostgreSQL序列预分配ID，已改为请求中直接写入")
+                self.enabled = False
+                return
+        await self._replay_spool()
+        self._closing = False
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run(), name="session-writer")
+
+    async def save(self, db: AsyncSession, fields: Dict[str, Any]) -> int:
+        """保存一条会话记录，返回会话ID"""
+        row = {"duration_minutes": 0, **fields}
+        if self.running and not self._queue.full():
+            # created_at取提交时间，与直接写入时的排序一致
+            row["id"] = await self._allocate_id()
+            row["created_at"] = datetime.now(timezone.utc)
+            self._pending[row["id"]] = row
+            try:
+                self._queue.put_nowait(row)
+            except asyncio.QueueFull:
+                # 等待分配ID期间队列被其他请求占满，改为直接写入(保留已分配的ID)
+                del self._pending[row["id"]]
+            else:
+                self.counters["enqueued"] += 1
+                return row["id"]
+
+        # 未启用或队列已满(数据库跟不上)时直接写入，保证不丢数据
+        self.counters["direct_writes"] += 1
+        db_session, = await add_sessions(db, [row])
+        await db.commit()
+        return db_session.id
+
+    def pending(self, session_id: int, user_id: int) -> Optional[Dict]:
+        """尚未写入数据库的会话记录"""
+        row = self._pending.get(session_id)
+        if row is None or row["user_id"] != user_id:
+            return None
+        return row
+
+    async def _allocate_id(self) -> int:
+        if not self._ids:
+            async with self._id_lock:
+                if not self._ids:
+                    self._ids.extend(await self._fetch_id_block())
+        return self._ids.popleft()
+
+    async def _fetch_id_block(self) -> List[int]:
+        # 一次取出一段序列值，之后的请求在进程内分配；未用完的ID在重启后作废，只会留下空洞
+        async with self.session_factory() as db:
+            result = await db.execute(
+                text("SELECT nextval(pg_get_serial_sequence('learning_sessions', 'id')) FROM generate_series(1, :n)"),
+                {"n": self.id_block_size}
+            )
+            self.counters["id_blocks"] += 1
+            return [row[0] for row in result]
+
+    async def _run(self) -> None:
+        while not (self._closing and self._queue.empty()):
+            try:
+                first = await asyncio.wait_for(self._queue.get(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Dict]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._write(batch)
+                break
+            except Exception:
+                if attempt == self.max_retries:
+                    logger.exception("批量写入 %d 条会话失败，写入spool文件", len(batch))
+                    self._spool(batch)
+                    break
+                self.counters["retries"] += 1
+                await asyncio.sleep(min(0.1 * 2 ** attempt, 2.0))
+
+        for row in batch:
+            self._pending.pop(row["id"], None)
+
+    async def _write(self, rows: List[Dict]) -> None:
+        # 通过ORM写入，用户统计的after_flush钩子在同一事务中按用户合并更新
+        async with self.session_factory() as db:
+            await add_sessions(db, rows)
+            await db.commit()
+        self.counters["written"] += len(rows)
+        self.counters["batches"] += 1
+
+    def _spool(self, rows: List[Dict]) -> None:
+        if not self.spool_path:
+            logger.error("未配置spool文件，丢弃 %d 条会话", len(rows))
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+        with open(self.spool_path, "a", encoding="utf-8") as f:
+            for row in rows:
+                f.write(_to_json(row) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.counters["spooled"] += len(rows)
+
+    async def _replay_spool(self) -> None:
+        """补写上次未写入的会话；已存在的ID跳过(上次可能在写入成功后、清理spool前退出)"""
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return
+        with open(self.spool_path, encoding="utf-8") as f:
+            rows = [_from_json(line) for line in f if line.strip()]
+        if rows:
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    select(LearningSession.id).where(LearningSession.id.in_([row["id"] for row in rows]))
+                )
+                existing = set(result.scalars())
+            missing = [row for row in rows if row["id"] not in existing]
+            for start in range(0, len(missing), self.batch_size):
+                await self._write(missing[start:start + self.batch_size])
+            self.counters["replayed"] += len(missing)
+        os.remove(self.spool_path)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """停止并写入队列中剩余的记录；超时或写入失败的记录保存到spool文件"""
+        if self._task is None:
+            return
+        self._closing = True
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self._pending:
+            self._spool(list(self._pending.values()))
+            self._pending.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "pending": len(self._pending),
+            **self.counters,
+        }
+
+
+session_writer = SessionWriter(
+    AsyncSessionLocal,
+    enabled=settings.SESSION_WRITE_BEHIND,
+    batch_size=settings.SESSION_WRITE_BATCH_SIZE,
+    interval=settings.SESSION_WRITE_INTERVAL,
+    max_queue=settings.SESSION_WRITE_QUEUE_SIZE,
+    id_block_size=settings.SESSION_ID_BLOCK_SIZE,
+    spool_path=settings.SESSION_WRITE_SPOOL_PATH
+)
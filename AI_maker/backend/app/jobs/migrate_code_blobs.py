@@ -0,0 +1,107 @@
+"""
+把历史会话的代码迁移到 code_blobs
+
+按主键分块读取 code_content 不为空的会话，代码按内容哈希去重压缩写入 code_blobs，
+会话改为引用哈希并清空 code_content。每块一个事务，中断后重新运行会从剩余的会话继续。
+迁移完成后在PostgreSQL上执行 VACUUM (或 VACUUM FULL) learning_sessions 回收空间。
+
+用法(在backend目录下运行，需要先执行 alembic upgrade 0002):
+    python -m app.jobs.migrate_code_blobs
+    python -m app.jobs.migrate_code_blobs --restore    # 回滚迁移0002之前把代码写回code_content
+"""
+
+import argparse
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.core.database import engine
+from app.models.learning_session import CodeBlob, LearningSession, code_blob_row, decompress_code, insert_code_blobs
+
+
+def migrate(session: Session, chunk_size: int = 1000, dry_run: bool = False) -> Dict[str, int]:
+    stats = {"sessions": 0, "blobs": 0, "code_bytes": 0, "stored_bytes": 0}
+    dialect_name = session.get_bind().dialect.name
+    seen = set()  # --dry-run时跨块去重
+    last_id = 0
+    while True:
+        rows = session.execute(
+            select(LearningSession.id, LearningSession.code_content)
+            .where(LearningSession.id > last_id, LearningSession.code_content.isnot(None))
+            .order_by(LearningSession.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        blobs = {}
+        updates = []
+        for row in rows:
+            blob = code_blob_row(row.code_content)
+            blobs[blob["hash"]] = blob
+            updates.append({"id": row.id, "code_hash": blob["hash"], "code_content": None})
+            stats["code_bytes"] += blob["size"]
+        stats["sessions"] += len(rows)
+
+        if dry_run:
+            new_blobs = [blob for blob_hash, blob in blobs.items() if blob_hash not in seen]
+            seen.update(blobs)
+            stats["blobs"] += len(new_blobs)
+            stats["stored_bytes"] += sum(len(blob["data"]) for blob in new_blobs)
+            continue
+        # 已存在的哈希(之前的块或新提交写入的)不重复计数
+        result = session.execute(insert_code_blobs(dialect_name, blobs.values()).returning(CodeBlob.hash))
+        inserted = set(result.scalars())
+        stats["blobs"] += len(inserted)
+        stats["stored_bytes"] += sum(len(blobs[blob_hash]["data"]) for blob_hash in inserted)
+        session.execute(update(LearningSession), updates)
+        session.commit()
+    return stats
+
+
+def restore(session: Session, chunk_size: int = 1000) -> int:
+    """把code_blobs中的代码写回code_content并清空code_hash"""
+    restored = 0
+    last_id = 0
+    while True:
+        rows = session.execute(
+            select(LearningSession.id, CodeBlob.encoding, CodeBlob.data)
+            .join(CodeBlob, LearningSession.code_hash == CodeBlob.hash)
+            .where(LearningSession.id > last_id)
+            .order_by(LearningSession.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        session.execute(update(LearningSession), [
+            {"id": row.id, "code_content": decompress_code(row.encoding, row.data), "code_hash": None}
+            for row in rows
+        ])
+        session.commit()
+        restored += len(rows)
+    return restored
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="把历史会话的代码迁移到按内容哈希去重的code_blobs")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="每个事务处理的会话数")
+    parser.add_argument("--dry-run", action="store_true", help="只统计去重和压缩效果，不写入数据库")
+    parser.add_argument("--restore", action="store_true", help="反向迁移：把代码写回code_content")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    with Session(engine) as session:
+        if args.restore:
+            print(f"已写回 {restore(session, args.chunk_size)} 个会话的代码，用时 {time.perf_counter() - started:.1f} 秒")
+            return
+        stats = migrate(session, args.chunk_size, args.dry_run)
+    ratio = stats["stored_bytes"] / stats["code_bytes"] if stats["code_bytes"] else 0.0
+    print(f"代码迁移完成，用时 {time.perf_counter() - started:.1f} 秒: {stats}，存储比例 {ratio:.1%}")
+
+
+if __name__ == "__main__":
+    main()
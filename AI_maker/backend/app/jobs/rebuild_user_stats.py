@@ -0,0 +1,35 @@
+"""
+重建用户学习统计
+
+由 learning_sessions 重新计算 user_stats 聚合表，用于首次上线时回填、
+重新评分之后，以及不经过ORM写入会话之后的修正。
+
+用法(在backend目录下运行):
+    python -m app.jobs.rebuild_user_stats
+    python -m app.jobs.rebuild_user_stats --user-id 42 --user-id 43
+"""
+
+import argparse
+import time
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.database import engine
+from app.models.user_stats import rebuild_user_stats
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="由学习会话重新计算用户统计")
+    parser.add_argument("--user-id", type=int, action="append", dest="user_ids",
+                        help="只重建指定用户(可重复)，默认重建全部用户")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    with Session(engine) as session:
+        rows = rebuild_user_stats(session, args.user_ids)
+    print(f"用户统计重建完成，写入 {rows} 行，用时 {time.perf_counter() - started:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
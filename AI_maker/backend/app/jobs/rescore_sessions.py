@@ -0,0 +1,179 @@
+"""
+离线批量重新评分
+
+调整评分权重表后，按主键分块读取历史学习会话，用NumPy对整块的
+问题计数矩阵向量化计算新评分，再按主键批量写回。
+
+用法(在backend目录下运行):
+    python -m app.jobs.rescore_sessions --weights weights.json
+    python -m app.jobs.rescore_sessions --weights weights.json --backfill --dry-run
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+# 添加AI引擎路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../ai_engine'))
+from code_analyzer import run_static_analysis
+from scoring import COUNTS_SIZE, DEFAULT_WEIGHTS, ScoreWeights, severity_counts
+from app.core.database import engine
+from app.models.learning_session import CodeBlob, LearningSession, decompress_code
+from app.models.user_stats import rebuild_user_stats
+
+
+def _static_counts(item: Tuple[str, str]) -> List[int]:
+    """在进程池中重新运行静态分析，统计问题数量"""
+    code, language = item
+    return severity_counts(run_static_analysis(code or "", language or "python"))
+
+
+def _infer_ai_scores(scores: np.ndarray, counts: np.ndarray, legacy: ScoreWeights) -> np.ndarray:
+    """
+    从旧评分反推AI评分：旧总分 = 静态分 × (1 - w) + AI评分 × w。
+    旧总分与静态分相同时视为当时没有AI评分(如跳过AI分析)，返回NaN，重算时只用静态分。
+    """
+    static_scores = legacy.score_batch(counts)
+    if legacy.ai_weight <= 0:
+        return np.full(len(scores), np.nan)
+    inferred = (scores - static_scores * (1 - legacy.ai_weight)) / legacy.ai_weight
+    inferred = np.clip(inferred, 0.0, 100.0)
+    return np.where(np.isclose(scores, static_scores), np.nan, inferred)
+
+
+class RescoreJob:
+    """按主键分块流式读取会话，向量化评分后批量写回"""
+
+    def __init__(self, weights: ScoreWeights, chunk_size: int = 5000, backfill: bool = False,
+                 legacy_weights: ScoreWeights = DEFAULT_WEIGHTS, process_workers: Optional[int] = None,
+                 dry_run: bool = False):
+        self.weights = weights
+        self.chunk_size = chunk_size
+        # 缺少问题计数的旧会话：重新运行静态分析补全计数，并按旧权重反推AI评分
+        self.backfill = backfill
+        self.legacy_weights = legacy_weights
+        self.process_workers = process_workers
+        self.dry_run = dry_run
+        self.stats = {"scanned": 0, "rescored": 0, "changed": 0, "backfilled": 0, "skipped": 0}
+
+    def run(self, session: Session) -> Dict[str, int]:
+        pool = ProcessPoolExecutor(max_workers=self.process_workers) if self.backfill else None
+        try:
+            last_id = 0
+            while True:
+                rows = self._fetch(session, last_id)
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                updates = self._rescore_chunk(rows, pool)
+                if updates and not self.dry_run:
+                    session.execute(update(LearningSession), updates)
+                    session.commit()
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return self.stats
+
+    def _fetch(self, session: Session, last_id: int):
+        # 按主键翻页，避免OFFSET在深分页时越来越慢
+        columns = [
+            LearningSession.id,
+            LearningSession.score,
+            LearningSession.severity_counts,
+            LearningSession.ai_score
+        ]
+        statement = select(*columns)
+        if self.backfill:
+            statement = statement.add_columns(
+                LearningSession.code_content, LearningSession.language, CodeBlob.encoding, CodeBlob.data
+            ).outerjoin(CodeBlob, LearningSession.code_hash == CodeBlob.hash)
+        statement = (
+            statement
+            .where(LearningSession.id > last_id)
+            .order_by(LearningSession.id)
+            .limit(self.chunk_size)
+        )
+        return session.execute(statement).all()
+
+    def _rescore_chunk(self, rows, pool: Optional[ProcessPoolExecutor]) -> List[Dict]:
+        self.stats["scanned"] += len(rows)
+
+        recorded = [row for row in rows if row.severity_counts]
+        missing = [row for row in rows if not row.severity_counts]
+        if not self.backfill:
+            self.stats["skipped"] += len(missing)
+            missing = []
+
+        ids = [row.id for row in recorded] + [row.id for row in missing]
+        if not ids:
+            return []
+
+        counts = np.zeros((len(ids), COUNTS_SIZE), dtype=np.float64)
+        ai_scores = np.full(len(ids), np.nan)
+        old_scores = np.array([row.score or 0.0 for row in recorded + missing], dtype=np.float64)
+
+        for i, row in enumerate(recorded):
+            counts[i] = json.loads(row.severity_counts)
+            if row.ai_score is not None:
+                ai_scores[i] = row.ai_score
+
+        if missing:
+            offset = len(recorded)
+            items = [
+                (decompress_code(row.encoding, row.data) if row.data is not None else row.code_content, row.language)
+                for row in missing
+            ]
+            backfilled = list(pool.map(_static_counts, items, chunksize=64))
+            counts[offset:] = backfilled
+            ai_scores[offset:] = _infer_ai_scores(old_scores[offset:], counts[offset:], self.legacy_weights)
+            self.stats["backfilled"] += len(missing)
+
+        new_scores = self.weights.score_batch(counts, ai_scores)
+        self.stats["rescored"] += len(ids)
+        self.stats["changed"] += int(np.count_nonzero(new_scores != old_scores))
+
+        updates = [{"id": row_id, "score": float(score)} for row_id, score in zip(ids, new_scores)]
+        # 补全的计数和AI评分一并写回，下次调整权重时不需要再补全
+        for i in range(len(recorded), len(ids)):
+            updates[i]["severity_counts"] = json.dumps(counts[i].astype(int).tolist())
+            updates[i]["ai_score"] = None if np.isnan(ai_scores[i]) else float(ai_scores[i])
+        return updates
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="按新的评分权重重新计算历史学习会话的评分")
+    parser.add_argument("--weights", help="评分权重表(JSON)，默认使用内置权重")
+    parser.add_argument("--legacy-weights", help="历史评分所用的权重表(JSON)，用于--backfill反推AI评分")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="每次读取和写回的会话数")
+    parser.add_argument("--backfill", action="store_true", help="为缺少问题计数的旧会话重新运行静态分析")
+    parser.add_argument("--workers", type=int, default=None, help="--backfill时静态分析的进程数")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不写回数据库")
+    args = parser.parse_args(argv)
+
+    job = RescoreJob(
+        weights=ScoreWeights.load(args.weights) if args.weights else DEFAULT_WEIGHTS,
+        chunk_size=args.chunk_size,
+        backfill=args.backfill,
+        legacy_weights=ScoreWeights.load(args.legacy_weights) if args.legacy_weights else DEFAULT_WEIGHTS,
+        process_workers=args.workers,
+        dry_run=args.dry_run
+    )
+    started = time.perf_counter()
+    with Session(engine) as session:
+        stats = job.run(session)
+        # 评分变化后用户统计中的总分和最高分需要重新计算
+        if not args.dry_run and stats["changed"]:
+            stats["user_stats_rows"] = rebuild_user_stats(session)
+    print(f"重新评分完成，用时 {time.perf_counter() - started:.1f} 秒: {stats}")
+
+
+if __name__ == "__main__":
+    main()
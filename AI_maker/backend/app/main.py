@@ -3,9 +3,17 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 from contextlib import asynccontextmanager
 import uvicorn
+import sys
+import os
+
+# 添加AI引擎路径
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../ai_engine'))
 from app.core.config import settings
 from app.api.v1.api import api_router
+from llm_client import close_llm_clients
 from app.core.database import engine, Base
+from app.core.async_database import close_async_engine
+from app.core.session_writer import session_writer
 from app.core.redis_client import redis_client
 
 # 创建数据库表
@@ -15,9 +23,13 @@ Base.metadata.create_all(bind=engine)
 async def lifespan(app: FastAPI):
     # 启动时执行
     print("🚀 CodeMentor AI 服务启动中...")
+    await session_writer.start()
     yield
-    # 关闭时执行
+    # 关闭时执行(先写入队列中的会话，再关闭数据库连接)
+    await session_writer.stop()
     await redis_client.close()
+    await close_llm_clients()
+    await close_async_engine()
     print("👋 CodeMentor AI 服务已关闭")
 
 app = FastAPI(
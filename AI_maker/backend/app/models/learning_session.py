@@ -1,29 +1,87 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Float
+import hashlib
+import zlib
+
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Float, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Iterable, Optional, List
 from datetime import datetime
 
+from app.models.user import User
+
 Base = declarative_base()
 
 class LearningSession(Base):
     __tablename__ = "learning_sessions"
+    __table_args__ = (
+        # 会话历史按 (created_at, id) 倒序游标分页(迁移 0001)
+        Index("ix_learning_sessions_user_created_id", "user_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey(User.id))  # User在另一个Base中，按列引用
     session_type = Column(String(50))  # code_review, practice, project_guidance
     language = Column(String(50))  # python, javascript, java, etc.
     topic = Column(String(100))
-    code_content = Column(Text)
+    code_hash = Column(String(64), ForeignKey("code_blobs.hash"))  # 提交的代码(见 CodeBlob)
+    code_content = Column(Text)  # 迁移前的旧会话直接保存代码(迁移见 app.jobs.migrate_code_blobs)
     ai_feedback = Column(Text)
     score = Column(Float, default=0.0)
+    severity_counts = Column(String(64))  # 问题类别×严重程度的计数(JSON数组，见 scoring.severity_counts)，用于批量重新评分
+    ai_score = Column(Float)  # AI评分，未调用AI时为空
     duration_minutes = Column(Integer, default=0)
+    analysis_snapshot = Column(Text)  # 函数粒度的分析快照(JSON)，用于增量分析
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # 关联关系
-    user = relationship("User", back_populates="sessions")
+    user = relationship(User)
+
+class CodeBlob(Base):
+    """提交的代码按内容哈希只保存一份并压缩，多次提交相同代码的会话引用同一行"""
+    __tablename__ = "code_blobs"
+    
+    hash = Column(String(64), primary_key=True)  # 代码(UTF-8)的SHA-256
+    encoding = Column(String(16), nullable=False, default="zlib")
+    size = Column(Integer, nullable=False)  # 压缩前的字节数
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    @property
+    def code(self) -> str:
+        return decompress_code(self.encoding, self.data)
+
+def decompress_code(encoding: str, data: bytes) -> str:
+    if encoding != "zlib":
+        raise ValueError(f"不支持的代码压缩格式: {encoding}")
+    return zlib.decompress(data).decode("utf-8")
+
+def code_blob_row(code: str) -> Dict:
+    """code_blobs 的一行：内容哈希和压缩后的代码"""
+    raw = code.encode("utf-8")
+    return {
+        "hash": hashlib.sha256(raw).hexdigest(),
+        "encoding": "zlib",
+        "size": len(raw),
+        "data": zlib.compress(raw, 6)
+    }
+
+def dialect_insert(dialect_name: str):
+    """支持 ON CONFLICT 的insert(PostgreSQL或SQLite)"""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"不支持数据库 {dialect_name}")
+    return insert
+
+def insert_code_blobs(dialect_name: str, rows: Iterable[Dict]):
+    """写入代码块，已存在的哈希跳过"""
+    unique = {row["hash"]: row for row in rows}
+    statement = dialect_insert(dialect_name)(CodeBlob.__table__).values(list(unique.values()))
+    return statement.on_conflict_do_nothing(index_elements=["hash"])
 
 class CodeAnalysis(Base):
     __tablename__ = "code_analyses"
@@ -42,6 +100,15 @@ class LearningSessionCreate(BaseModel):
     topic: str
     code_content: Optional[str] = None
 
+class CodeSubmission(BaseModel):
+    code: str
+    language: str
+    topic: str = "general"
+    session_type: str = "code_review"
+
+class BatchAnalysisRequest(BaseModel):
+    submissions: List[CodeSubmission]
+
 class LearningSessionResponse(BaseModel):
     id: int
     session_type: str
@@ -54,4 +121,22 @@ class LearningSessionResponse(BaseModel):
     created_at: datetime
     
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class LearningSessionSummary(BaseModel):
+    """会话历史列表的一项，不包含代码(完整代码见会话详情)"""
+    id: int
+    session_type: str
+    language: str
+    topic: str
+    ai_feedback: Optional[str]
+    score: float
+    duration_minutes: int
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+class LearningSessionPage(BaseModel):
+    items: List[LearningSessionSummary]
+    next_cursor: Optional[str] = None  # 下一页的游标，没有更多会话时为空
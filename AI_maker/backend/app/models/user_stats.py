@@ -0,0 +1,137 @@
+"""
+用户学习统计的聚合表
+
+每个用户一行，保存会话数、有效评分的总和与数量、最高分和学习总时长，
+/stats 只需按主键读取一行，与历史会话数量无关。
+
+插入 LearningSession 时，在同一次flush(同一个事务)中按用户合并后执行一次upsert，
+累加在数据库中完成，并发提交不会丢失更新。
+不经过ORM的批量写入(例如 session.execute(insert(...)))和对历史评分的修改
+需要用 rebuild_user_stats 重新计算(见 app.jobs.rebuild_user_stats)。
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import Column, Integer, DateTime, Float, ForeignKey, case, delete, event, func, insert, select, text
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import Session
+
+from app.models.learning_session import LearningSession, dialect_insert
+from app.models.user import User
+
+Base = declarative_base()
+
+class UserStats(Base):
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey(User.id), primary_key=True)  # User在另一个Base中，按列引用
+    session_count = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0.0)  # 有效评分(大于0)的总和
+    scored_count = Column(Integer, nullable=False, default=0)  # 有效评分的会话数
+    best_score = Column(Float)
+    duration_minutes = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+def stats_response(stats: Optional[UserStats]) -> Dict:
+    """/stats 的响应内容；没有任何会话时返回0"""
+    if stats is None:
+        return {
+            "total_sessions": 0,
+            "average_score": 0.0,
+            "best_score": 0.0,
+            "total_duration_minutes": 0,
+            "total_duration_hours": 0.0
+        }
+    average = stats.score_sum / stats.scored_count if stats.scored_count else 0.0
+    return {
+        "total_sessions": stats.session_count,
+        "average_score": round(average, 2),
+        "best_score": round(stats.best_score or 0.0, 2),
+        "total_duration_minutes": stats.duration_minutes,
+        "total_duration_hours": round(stats.duration_minutes / 60, 1)
+    }
+
+def _aggregate(sessions: Iterable[LearningSession]) -> Dict[int, Dict]:
+    rows: Dict[int, Dict] = defaultdict(lambda: {
+        "session_count": 0, "score_sum": 0.0, "scored_count": 0, "best_score": None, "duration_minutes": 0
+    })
+    for learning_session in sessions:
+        row = rows[learning_session.user_id]
+        score = learning_session.score or 0.0
+        row["session_count"] += 1
+        if score > 0:
+            row["score_sum"] += score
+            row["scored_count"] += 1
+        if row["best_score"] is None or score > row["best_score"]:
+            row["best_score"] = score
+        row["duration_minutes"] += learning_session.duration_minutes or 0
+    return rows
+
+def record_sessions(connection, sessions: Iterable[LearningSession]) -> None:
+    """把新插入的会话累加到各用户的统计行(每个用户一次upsert)"""
+    rows = _aggregate(sessions)
+    if not rows:
+        return
+
+    table = UserStats.__table__
+    statement = dialect_insert(connection.dialect.name)(table).values([
+        {"user_id": user_id, **row} for user_id, row in rows.items()
+    ])
+    excluded = statement.excluded
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.user_id],
+        set_={
+            "session_count": table.c.session_count + excluded.session_count,
+            "score_sum": table.c.score_sum + excluded.score_sum,
+            "scored_count": table.c.scored_count + excluded.scored_count,
+            "best_score": case(
+                (table.c.best_score.is_(None), excluded.best_score),
+                (excluded.best_score > table.c.best_score, excluded.best_score),
+                else_=table.c.best_score
+            ),
+            "duration_minutes": table.c.duration_minutes + excluded.duration_minutes,
+            "updated_at": func.now()
+        }
+    )
+    connection.execute(statement)
+
+@event.listens_for(Session, "after_flush")
+def _record_new_sessions(session: Session, flush_context) -> None:
+    # after_flush时session.new仍包含本次插入的对象，统计与会话在同一事务中提交
+    new_sessions = [
+        obj for obj in session.new
+        if isinstance(obj, LearningSession) and obj.user_id is not None
+    ]
+    if new_sessions:
+        record_sessions(session.connection(), new_sessions)
+
+def rebuild_user_stats(session: Session, user_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    由 learning_sessions 重新计算统计(全部用户或指定用户)，返回写入的行数。
+    PostgreSQL上重建期间以SHARE模式锁住learning_sessions，阻止并发插入被重复或遗漏计数。
+    """
+    scored = LearningSession.score > 0
+    aggregate = select(
+        LearningSession.user_id,
+        func.count(),
+        func.coalesce(func.sum(case((scored, LearningSession.score), else_=0.0)), 0.0),
+        func.coalesce(func.sum(case((scored, 1), else_=0)), 0),
+        func.max(LearningSession.score),
+        func.coalesce(func.sum(LearningSession.duration_minutes), 0)
+    ).where(LearningSession.user_id.isnot(None)).group_by(LearningSession.user_id)
+    clear = delete(UserStats)
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        aggregate = aggregate.where(LearningSession.user_id.in_(user_ids))
+        clear = clear.where(UserStats.user_id.in_(user_ids))
+
+    if session.get_bind().dialect.name == "postgresql":
+        session.execute(text("LOCK TABLE learning_sessions IN SHARE MODE"))
+    session.execute(clear)
+    result = session.execute(insert(UserStats).from_select(
+        ["user_id", "session_count", "score_sum", "scored_count", "best_score", "duration_minutes"],
+        aggregate
+    ))
+    session.commit()
+    return result.rowcount
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+代码分析压测工具
+
+按固定种子生成提交负载，以给定并发驱动代码分析，统计吞吐量和各阶段的 p50/p95/p99 延迟：
+- analyzer 模式：在进程内直接调用 AsyncCodeAnalyzer(与后端相同的请求路径)，
+  阶段包括 static(静态分析)、llm(LLM调用)、total(整个分析)
+- http 模式：请求运行中的后端 /api/v1/code/analyze(或 --stream 时的 /analyze/stream)，
+  阶段包括 total，流式时还有 first_event(静态分析结果)和 first_token
+
+未指定 --llm-url 时自动启动 mock_llm_server.py 作为LLM服务，不产生真实的API调用。
+结果可以保存为JSON，并与基线比较，任一阶段的延迟回退超过阈值时以非零状态退出。
+
+用法:
+    python bench/benchmark.py analyzer --requests 500 --concurrency 32 --json baseline.json
+    python bench/benchmark.py analyzer --requests 500 --concurrency 32 --baseline baseline.json
+    python bench/benchmark.py http --url http://localhost:8000 --token <JWT> --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+_BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(_BENCH_DIR, '../ai_engine'))
+
+PERCENTILES = (50, 95, 99)
+
+
+def make_workload(count: int, seed: int = 0, duplicate_ratio: float = 0.1,
+                  syntax_error_ratio: float = 0.05) -> List[Dict]:
+    """生成确定的提交负载：规模不一的Python代码，包含一定比例的重复提交和语法错误"""
+    rng = random.Random(seed)
+    submissions: List[Dict] = []
+    for index in range(count):
+        if submissions and rng.random() < duplicate_ratio:
+            submissions.append(dict(rng.choice(submissions)))
+            continue
+
+        lines = []
+        for f in range(rng.randint(1, 12)):
+            lines.append(f"def task_{index}_{f}(items, limit={rng.randint(1, 100)}):")
+            lines.append("    total = 0")
+            for _ in range(rng.randint(1, 6)):
+                lines.append("    for item in items:")
+                lines.append(f"        if item > {rng.randint(0, 50)}:")
+                lines.append(f"            total += item * {rng.randint(1, 9)}")
+            lines.append("    return total")
+            lines.append("")
+        if rng.random() < syntax_error_ratio:
+            lines.append("def broken(:")
+        submissions.append({"code": "\n".join(lines), "language": "python"})
+    return submissions
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """最近秩百分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(p / 100 * len(sorted_values)) - 1
+    return sorted_values[max(0, min(rank, len(sorted_values) - 1))]
+
+
+class Recorder:
+    """按阶段记录耗时(毫秒)"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def add(self, stage: str, started: float) -> None:
+        self.samples[stage].append((time.perf_counter() - started) * 1000)
+
+    def error(self, kind: str) -> None:
+        self.errors[kind] += 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for stage, values in self.samples.items():
+            values = sorted(values)
+            result[stage] = {
+                "count": len(values),
+                "mean": round(sum(values) / len(values), 2),
+                **{f"p{p}": round(percentile(values, p), 2) for p in PERCENTILES},
+                "max": round(values[-1], 2),
+            }
+        return result
+
+
+class _TimedLLM:
+    """记录每次LLM调用耗时的客户端代理(流式调用记录建立流的时间)"""
+
+    def __init__(self, client, recorder: Recorder):
+        self.client = client
+        self.recorder = recorder
+
+    async def achat(self, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await self.client.achat(**kwargs)
+        except Exception as e:
+            self.recorder.error(f"llm:{type(e).__name__}")
+            raise
+        finally:
+            self.recorder.add("llm", started)
+
+    def chat(self, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self.client.chat(**kwargs)
+        finally:
+            self.recorder.add("llm", started)
+
+    def stats(self):
+        return self.client.stats()
+
+
+async def run_requests(submissions: List[Dict], concurrency: int, handle) -> float:
+    """以固定并发执行全部请求，返回总耗时(秒)"""
+    queue = iter(submissions)
+
+    async def worker():
+        for submission in queue:
+            await handle(submission)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def bench_analyzer(args, submissions: List[Dict], recorder: Recorder) -> float:
+    from analysis_cache import AnalysisCache
+    from code_analyzer import AsyncCodeAnalyzer
+    from llm_client import LLMClientConfig, get_llm_client, close_llm_clients
+    from model_router import ModelRouter
+
+    llm = get_llm_client(LLMClientConfig(api_key="bench", base_url=args.llm_url, max_retries=args.max_retries))
+    if args.scheduler_rpm:
+        from llm_scheduler import LLMScheduler
+        llm = LLMScheduler(llm, requests_per_minute=args.scheduler_rpm, tokens_per_minute=args.scheduler_tpm)
+    analyzer = AsyncCodeAnalyzer(
+        "bench",
+        "mock",
+        cache=AnalysisCache(maxsize=len(submissions)) if args.cache else None,
+        max_workers=args.workers,
+        router=ModelRouter("mock", "mock-fast") if args.router else None,
+        llm_client=_TimedLLM(llm, recorder),
+        ai_deadline=args.deadline
+    )
+
+    run_static = analyzer.run_static_analysis
+
+    async def timed_static(code, language):
+        started = time.perf_counter()
+        try:
+            return await run_static(code, language)
+        finally:
+            recorder.add("static", started)
+
+    analyzer.run_static_analysis = timed_static
+
+    async def handle(submission: Dict) -> None:
+        started = time.perf_counter()
+        try:
+            if args.stream:
+                first_event = first_token = True
+                async for event, data in analyzer.analyze_code_stream(submission["code"], submission["language"], "beginner"):
+                    if first_event:
+                        recorder.add("first_event", started)
+                        first_event = False
+                    if first_token and event == "token":
+                        recorder.add("first_token", started)
+                        first_token = False
+                    if event == "result" and "error" in data["ai_analysis"]:
+                        recorder.error("ai_error")
+            else:
+                result = await analyzer.analyze_code(submission["code"], submission["language"], "beginner")
+                if "error" in result["ai_analysis"]:
+                    recorder.error("ai_error")
+        except Exception as e:
+            recorder.error(type(e).__name__)
+        finally:
+            recorder.add("total", started)
+
+    try:
+        return await run_requests(submissions, args.concurrency, handle)
+    finally:
+        await analyzer.aclose()
+        await close_llm_clients()
+
+
+async def bench_http(args, submissions: List[Dict], recorder: Recorder) -> float:
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    path = "/api/v1/code/analyze/stream" if args.stream else "/api/v1/code/analyze"
+
+    async with httpx.AsyncClient(base_url=args.url, headers=headers, limits=limits, timeout=args.timeout) as client:
+        async def handle(submission: Dict) -> None:
+            started = time.perf_counter()
+            params = {"code": submission["code"], "language": submission["language"], "topic": "benchmark"}
+            try:
+                if not args.stream:
+                    response = await client.post(path, params=params)
+                    if response.status_code != 200:
+                        recorder.error(f"http_{response.status_code}")
+                    return
+
+                first_event = first_token = True
+                async with client.stream("POST", path, params=params) as response:
+                    if response.status_code != 200:
+                        recorder.error(f"http_{response.status_code}")
+                        return
+                    async for line in response.aiter_lines():
+                        if first_event and line.startswith("event:"):
+                            recorder.add("first_event", started)
+                            first_event = False
+                        if first_token and line.strip() == "event: token":
+                            recorder.add("first_token", started)
+                            first_token = False
+                        if line.strip() == "event: error":
+                            recorder.error("stream_error")
+            except httpx.HTTPError as e:
+                recorder.error(type(e).__name__)
+            finally:
+                recorder.add("total", started)
+
+        return await run_requests(submissions, args.concurrency, handle)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock_server(args) -> subprocess.Popen:
+    """在子进程中启动模拟LLM服务，等待其可以接受请求"""
+    port = _free_port()
+    process = subprocess.Popen([
+        sys.executable, os.path.join(_BENCH_DIR, "mock_llm_server.py"),
+        "--port", str(port),
+        "--latency", args.mock_latency,
+        "--first-token", args.mock_first_token,
+        "--error-rate", str(args.mock_error_rate),
+        "--seed", str(args.seed),
+    ])
+    args.llm_url = f"http://127.0.0.1:{port}/v1"
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("模拟LLM服务启动失败")
+        try:
+            httpx.get(f"{args.llm_url}/models", timeout=0.5)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("等待模拟LLM服务启动超时")
+
+
+def compare(report: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """与基线比较，返回超过阈值的回退项"""
+    regressions = []
+    for stage, current in report["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if not base:
+            continue
+        for p in PERCENTILES:
+            key = f"p{p}"
+            if base[key] > 0 and current[key] > base[key] * (1 + max_regression):
+                regressions.append(f"{stage} {key}: {base[key]:.1f}ms -> {current[key]:.1f}ms")
+    base_throughput = baseline.get("throughput", 0)
+    if base_throughput and report["throughput"] < base_throughput / (1 + max_regression):
+        regressions.append(f"throughput: {base_throughput:.1f} -> {report['throughput']:.1f} req/s")
+    return regressions
+
+
+def print_report(report: Dict) -> None:
+    print(f"请求数 {report['requests']}，并发 {report['concurrency']}，"
+          f"用时 {report['elapsed']:.2f} 秒，吞吐量 {report['throughput']:.1f} req/s")
+    print(f"{'阶段':<12}{'次数':>8}{'平均':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'最大':>10}  (ms)")
+    for stage, values in report["stages"].items():
+        print(f"{stage:<12}{values['count']:>8}{values['mean']:>10.1f}{values['p50']:>10.1f}"
+              f"{values['p95']:>10.1f}{values['p99']:>10.1f}{values['max']:>10.1f}")
+    if report["errors"]:
+        print(f"错误: {report['errors']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="代码分析压测(使用本地模拟LLM服务)")
+    parser.add_argument("mode", choices=["analyzer", "http"])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.1, help="重复提交的比例(用于观察缓存效果)")
+    parser.add_argument("--stream", action="store_true", help="使用流式分析")
+    parser.add_argument("--json", help="将结果保存为JSON")
+    parser.add_argument("--baseline", help="与基线JSON比较")
+    parser.add_argument("--max-regression", type=float, default=0.1, help="允许的延迟回退比例")
+
+    analyzer_group = parser.add_argument_group("analyzer 模式")
+    analyzer_group.add_argument("--llm-url", help="LLM服务地址，默认自动启动模拟服务")
+    analyzer_group.add_argument("--cache", action="store_true", help="启用进程内分析缓存")
+    analyzer_group.add_argument("--router", action="store_true", help="启用模型路由")
+    analyzer_group.add_argument("--workers", type=int, default=4, help="静态分析线程数")
+    analyzer_group.add_argument("--max-retries", type=int, default=3)
+    analyzer_group.add_argument("--deadline", type=float, default=None, help="单次AI分析的截止时间(秒)")
+    analyzer_group.add_argument("--scheduler-rpm", type=int, default=0, help="经过LLM调度器，按该请求数限流")
+    analyzer_group.add_argument("--scheduler-tpm", type=int, default=10 ** 7)
+
+    mock_group = parser.add_argument_group("模拟LLM服务")
+    mock_group.add_argument("--mock-latency", default="lognormal:0.3,0.4")
+    mock_group.add_argument("--mock-first-token", default="lognormal:0.1,0.4")
+    mock_group.add_argument("--mock-error-rate", type=float, default=0.0)
+
+    http_group = parser.add_argument_group("http 模式")
+    http_group.add_argument("--url", default="http://localhost:8000", help="后端地址")
+    http_group.add_argument("--token", default=os.getenv("BENCH_TOKEN"), help="访问令牌(Bearer)")
+    http_group.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args(argv)
+
+    submissions = make_workload(args.requests, args.seed, args.duplicate_ratio)
+    recorder = Recorder()
+    mock = None
+    try:
+        if args.mode == "analyzer":
+            if args.llm_url is None:
+                mock = start_mock_server(args)
+            elapsed = asyncio.run(bench_analyzer(args, submissions, recorder))
+        else:
+            elapsed = asyncio.run(bench_http(args, submissions, recorder))
+    finally:
+        if mock is not None:
+            mock.terminate()
+            mock.wait()
+
+    report = {
+        "mode": args.mode,
+        "requests": len(submissions),
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "elapsed": round(elapsed, 3),
+        "throughput": round(len(submissions) / elapsed, 2) if elapsed else 0.0,
+        "stages": recorder.summary(),
+        "errors": dict(recorder.errors),
+    }
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        if regressions:
+            print("性能回退:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("与基线相比没有超过阈值的回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
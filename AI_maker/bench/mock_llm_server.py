@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+本地OpenAI兼容模拟服务(压测用)
+
+实现 /v1/chat/completions(包括stream=True)和 /v1/models，可以配置：
+- 响应延迟分布：fixed / uniform / normal / lognormal / exp
+- 流式响应的首个token延迟和逐块间隔
+- 按比例注入错误(429带Retry-After、500、503等)
+
+延迟和错误由 (种子, 请求内容, 该内容第几次出现) 决定，与请求到达的先后顺序无关，
+相同种子和相同负载的两次运行结果一致。
+
+用法:
+    python bench/mock_llm_server.py --port 9000 --latency lognormal:0.4,0.3 --error-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:9000/v1 ...
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LatencySampler = Callable[[random.Random], float]
+
+REPLY = (
+    "代码整体结构清晰。建议：1. 为函数补充类型注解和文档字符串；"
+    "2. 循环中重复计算的表达式可以提到循环外；3. 对外部输入做参数校验；"
+    "4. 变量命名可以更具描述性。"
+)
+
+
+def parse_latency(spec: str) -> LatencySampler:
+    """
+    解析延迟分布(单位秒)：
+    fixed:S | uniform:A,B | normal:MU,SIGMA | lognormal:MEDIAN,SIGMA | exp:MEAN
+    """
+    kind, _, args = spec.partition(":")
+    try:
+        values = [float(value) for value in args.split(",")] if args else []
+    except ValueError:
+        raise ValueError(f"无法解析延迟分布: {spec}")
+
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal" and len(values) == 2:
+        # 以中位数参数化，sigma越大长尾越明显
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    if kind == "exp" and len(values) == 1:
+        return lambda rng: rng.expovariate(1 / values[0])
+    raise ValueError(f"无法解析延迟分布: {spec}")
+
+
+@dataclass
+class MockConfig:
+    latency: str = "fixed:0.2"  # 非流式响应的总延迟
+    first_token: str = "fixed:0.1"  # 流式响应的首个token延迟
+    chunk_interval: float = 0.01  # 流式响应的逐块间隔
+    chunk_chars: int = 8
+    reply_chars: int = len(REPLY)
+    error_rate: float = 0.0
+    error_statuses: List[int] = field(default_factory=lambda: [429, 500, 503])
+    retry_after: float = 1.0
+    seed: int = 0
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI(title="Mock LLM")
+    latency = parse_latency(config.latency)
+    first_token = parse_latency(config.first_token)
+    occurrences: Counter = Counter()
+    stats: Dict[str, int] = Counter()
+    reply = (REPLY * (config.reply_chars // len(REPLY) + 1))[:config.reply_chars]
+
+    def request_rng(body: bytes) -> random.Random:
+        digest = hashlib.sha256(body).hexdigest()
+        occurrences[digest] += 1
+        return random.Random(f"{config.seed}:{digest}:{occurrences[digest]}")
+
+    def error_response(rng: random.Random) -> Optional[JSONResponse]:
+        if config.error_rate <= 0 or rng.random() >= config.error_rate:
+            return None
+        status = rng.choice(config.error_statuses)
+        stats[f"error_{status}"] += 1
+        headers = {"retry-after": str(config.retry_after)} if status == 429 else None
+        return JSONResponse(
+            {"error": {"message": f"mock error {status}", "type": "mock_error", "code": status}},
+            status_code=status, headers=headers
+        )
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return dict(stats)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.body()
+        payload = json.loads(body)
+        rng = request_rng(body)
+        stats["requests"] += 1
+
+        error = error_response(rng)
+        if error is not None:
+            # 错误响应也有延迟，通常比正常响应快
+            await asyncio.sleep(latency(rng) / 4)
+            return error
+
+        prompt_chars = sum(len(str(message.get("content") or "")) for message in payload.get("messages", []))
+        usage = {
+            "prompt_tokens": prompt_chars // 3 + 1,
+            "completion_tokens": len(reply) // 2 + 1,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-mock-{stats['requests']}"
+        model = payload.get("model", "mock")
+
+        if not payload.get("stream"):
+            stats["completions"] += 1
+            await asyncio.sleep(latency(rng))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            }
+
+        stats["streams"] += 1
+        delay = first_token(rng)
+
+        def chunk(delta: Dict, finish_reason: Optional[str] = None) -> str:
+            data = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        async def events():
+            await asyncio.sleep(delay)
+            yield chunk({"role": "assistant", "content": ""})
+            for start in range(0, len(reply), config.chunk_chars):
+                yield chunk({"content": reply[start:start + config.chunk_chars]})
+                await asyncio.sleep(config.chunk_interval)
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="本地OpenAI兼容模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", default=MockConfig.latency, help="响应延迟分布，例如 lognormal:0.4,0.3")
+    parser.add_argument("--first-token", default=MockConfig.first_token, help="流式响应首个token的延迟分布")
+    parser.add_argument("--chunk-interval", type=float, default=MockConfig.chunk_interval)
+    parser.add_argument("--reply-chars", type=int, default=MockConfig.reply_chars, help="回复内容的长度")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入错误的比例")
+    parser.add_argument("--error-statuses", default="429,500,503", help="注入的错误状态码")
+    parser.add_argument("--retry-after", type=float, default=MockConfig.retry_after)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    config = MockConfig(
+        latency=args.latency,
+        first_token=args.first_token,
+        chunk_interval=args.chunk_interval,
+        reply_chars=args.reply_chars,
+        error_rate=args.error_rate,
+        error_statuses=[int(status) for status in args.error_statuses.split(",")],
+        retry_after=args.retry_after,
+        seed=args.seed
+    )
+    # 提前校验分布参数，避免服务启动后才在请求中报错
+    parse_latency(config.latency)
+    parse_latency(config.first_token)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+# 与后端相同，AI引擎模块按顶层模块导入；后端模块按 app.* 导入
+sys.path.append(os.path.join(os.path.dirname(__file__), '../ai_engine'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '../backend'))
+# 后端测试使用SQLite，不连接PostgreSQL
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+
+class FakeLLM:
+    """记录请求的LLM客户端，返回 "ANALYSIS OF: <FULL|PARTIAL>"，部分分析按提示词区分；支持stream=True"""
+
+    def __init__(self, delay: float = 0.0):
+        self.prompts = []
+        # 异步请求的耗时，用于构造并发的在途请求
+        self.delay = delay
+
+    def _response(self, kwargs):
+        prompt = kwargs["messages"][0]["content"]
+        self.prompts.append(prompt)
+        kind = "PARTIAL" if "未修改的部分" in prompt else "FULL"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"ANALYSIS OF: {kind}"))])
+
+    def chat(self, deadline=None, **kwargs):
+        return self._response(kwargs)
+
+    async def achat(self, deadline=None, **kwargs):
+        response = self._response(kwargs)
+        await asyncio.sleep(self.delay)
+        if kwargs.get("stream"):
+            return self._stream(response.choices[0].message.content)
+        return response
+
+    @staticmethod
+    async def _stream(content: str):
+        # 流式响应每次返回几个字符
+        for i in range(0, len(content), 8):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[i:i + 8]))])
+
+
+@pytest.fixture
+def fake_llm():
+    return FakeLLM()
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """SQLite文件库上的异步会话工厂，已建好会话相关的表和用户1、2"""
+    import sqlalchemy as sa
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from app.models.learning_session import CodeBlob, LearningSession
+    from app.models.user import User
+    from app.models.user_stats import UserStats
+
+    path = tmp_path / "sessions.db"
+    engine = sa.create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        for table in (User.__table__, CodeBlob.__table__, LearningSession.__table__, UserStats.__table__):
+            table.create(connection)
+        connection.execute(sa.insert(User.__table__), [{"id": 1, "username": "alice"}, {"id": 2, "username": "bob"}])
+    engine.dispose()
+
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    yield async_sessionmaker(async_engine, expire_on_commit=False)
+    asyncio.run(async_engine.dispose())
@@ -0,0 +1,109 @@
+import asyncio
+
+from analysis_cache import AnalysisCache
+from code_analyzer import AnalysisType, CodeAnalyzer, CodeIssue, make_cache_key
+from scoring import DEFAULT_WEIGHTS
+
+CODE = "def add(a, b):\n    return a + b\n"
+
+
+class FakeRedis:
+    """同步或异步(async_api=True)的Redis客户端，值保存在字典中"""
+
+    def __init__(self, async_api: bool = False, fail: bool = False):
+        self.data = {}
+        self.fail = fail
+        if async_api:
+            self.get, self.set = self._aget, self._aset
+
+    def get(self, key):
+        if self.fail:
+            raise ConnectionError("redis down")
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.data[key] = value.encode("utf-8")
+
+    async def _aget(self, key):
+        return FakeRedis.get(self, key)
+
+    async def _aset(self, key, value, ex=None):
+        FakeRedis.set(self, key, value, ex)
+
+
+def _result():
+    issue = CodeIssue(3, AnalysisType.SECURITY, "eval", "不要使用eval", "high", 0.9)
+    return {"syntax_issues": [], "performance_issues": [], "security_issues": [issue],
+            "ai_analysis": {"analysis": "ok", "score": 90}, "overall_score": 85.0}
+
+
+def test_cache_key_ignores_formatting_noise():
+    key = make_cache_key(CODE, "python", "beginner", "gpt-4", 2)
+    # 键是内容哈希，跨进程和重启保持不变
+    assert key == "75a27b30417ee0278c999af86a4194b441d516ad77d0e65c24cd8012b2a8a820"
+    assert make_cache_key(CODE, "python", "beginner", "gpt-4", 2) == key
+    assert make_cache_key("\n\n" + CODE.replace("\n", "  \r\n") + "\n", "Python", "beginner", "gpt-4", "2") == key
+
+    for changed in [
+        make_cache_key(CODE.replace("a + b", "b + a"), "python", "beginner", "gpt-4", 2),
+        make_cache_key(CODE, "javascript", "beginner", "gpt-4", 2),
+        make_cache_key(CODE, "python", "advanced", "gpt-4", 2),
+        make_cache_key(CODE, "python", "beginner", "gpt-4o", 2),
+        make_cache_key(CODE, "python", "beginner", "gpt-4", 3),
+        # 缩进有意义，不做规范化
+        make_cache_key(CODE.replace("    ", "  "), "python", "beginner", "gpt-4", 2),
+    ]:
+        assert changed != key
+
+
+def test_analysis_key_follows_score_weights(fake_llm):
+    default = CodeAnalyzer(api_key="test", llm_client=fake_llm)
+    reweighted = CodeAnalyzer(api_key="test", llm_client=fake_llm,
+                              score_weights=DEFAULT_WEIGHTS.from_dict({"ai_weight": 0.3}))
+    assert default.cache_key(CODE, "python", "beginner") is None
+    assert default.analysis_key(CODE, "python", "beginner") != reweighted.analysis_key(CODE, "python", "beginner")
+
+
+def test_remote_hit_is_promoted_to_local():
+    redis = FakeRedis()
+    AnalysisCache(redis=redis).set("k", _result())
+    # 另一个worker：本地为空，从Redis读取后写入本地LRU
+    cache = AnalysisCache(redis=redis)
+
+    result = cache.get("k")
+    redis.data.clear()
+    assert cache.get("k") is result
+    assert result["security_issues"][0].issue_type is AnalysisType.SECURITY
+    assert result["security_issues"][0].line_number == 3
+    assert (cache.remote_hits, cache.local_hits, cache.misses) == (1, 1, 0)
+
+
+def test_async_redis_is_only_used_from_async_api():
+    redis = FakeRedis(async_api=True)
+    cache = AnalysisCache(redis=redis)
+    asyncio.run(cache.aset("k", _result()))
+    other = AnalysisCache(redis=redis)
+
+    # 同步接口不能调用异步客户端，只查本地
+    assert other.get("k") is None
+    result = asyncio.run(other.aget("k"))
+    assert result["ai_analysis"] == {"analysis": "ok", "score": 90}
+    assert asyncio.run(other.aget("k")) is result
+    assert (other.misses, other.remote_hits, other.local_hits) == (1, 1, 1)
+
+
+def test_remote_errors_degrade_to_miss():
+    redis = FakeRedis()
+    redis.data["codementor:analysis:bad"] = b"not json"
+    cache = AnalysisCache(redis=redis)
+    assert cache.get("bad") is None
+
+    redis.fail = True
+    cache.set("k", _result())
+    # 本地仍然可用
+    assert cache.get("k") is not None
+    assert cache.get("missing") is None
+    stats = cache.stats()
+    assert (stats["remote_errors"], stats["misses"], stats["local_hits"]) == (3, 2, 1)
@@ -0,0 +1,34 @@
+import asyncio
+
+from sqlalchemy import text
+
+from app.core.async_database import async_session, get_async_db, pool_metrics
+
+
+def test_request_session_does_not_hold_connection_until_used():
+    async def scenario():
+        dependency = get_async_db()
+        db = await dependency.__anext__()
+        before = dict(pool_metrics.counters)
+        idle = pool_metrics.counters["checkouts"] - before["checkouts"]
+
+        await db.execute(text("SELECT 1"))
+        used = pool_metrics.counters["checkouts"] - before["checkouts"]
+
+        # 等待LLM之前归还连接
+        await db.close()
+        returned = pool_metrics.counters["checkins"] - before["checkins"]
+        await dependency.aclose()
+        return idle, used, returned
+
+    assert asyncio.run(scenario()) == (0, 1, 1)
+
+
+def test_short_session_records_acquire_time():
+    async def scenario():
+        count = pool_metrics.acquire_count
+        async with async_session() as db:
+            await db.execute(text("SELECT 1"))
+        return pool_metrics.acquire_count - count
+
+    assert asyncio.run(scenario()) == 1
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import os
+import random
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../bench'))
+
+from benchmark import Recorder, make_workload, percentile, run_requests
+from mock_llm_server import REPLY, MockConfig, create_app, parse_latency
+
+CHAT = {"model": "mock", "messages": [{"role": "user", "content": "x = 1"}]}
+
+
+def make_client(**kwargs) -> TestClient:
+    config = MockConfig(latency="fixed:0", first_token="fixed:0", chunk_interval=0, **kwargs)
+    return TestClient(create_app(config))
+
+
+@pytest.mark.parametrize("spec", [
+    "fixed:0.2", "uniform:0.1,0.3", "normal:0.2,0.05", "lognormal:0.2,0.4", "exp:0.2"
+])
+def test_parse_latency_samples_non_negative_values(spec):
+    sampler = parse_latency(spec)
+    rng = random.Random(0)
+    samples = [sampler(rng) for _ in range(100)]
+    assert all(value >= 0 for value in samples)
+    # 同一种子得到相同的样本
+    rng = random.Random(0)
+    assert [sampler(rng) for _ in range(100)] == samples
+
+
+@pytest.mark.parametrize("spec", ["fixed", "fixed:a", "uniform:0.1", "gamma:1,2", ""])
+def test_parse_latency_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        parse_latency(spec)
+
+
+def test_mock_completion_returns_reply_and_usage():
+    client = make_client()
+    response = client.post("/v1/chat/completions", json=CHAT)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["choices"][0]["message"]["content"] == REPLY
+    usage = data["usage"]
+    assert usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"]
+    assert client.get("/stats").json() == {"requests": 1, "completions": 1}
+
+
+def test_mock_stream_yields_chunks_until_done():
+    client = make_client(reply_chars=20)
+    response = client.post("/v1/chat/completions", json={**CHAT, "stream": True})
+    assert response.status_code == 200
+    lines = [line[len("data: "):] for line in response.text.split("\n\n") if line]
+    assert lines[-1] == "[DONE]"
+    chunks = [json.loads(line)["choices"][0] for line in lines[:-1]]
+    assert chunks[0]["delta"]["role"] == "assistant"
+    assert chunks[-1]["finish_reason"] == "stop"
+    assert "".join(chunk["delta"].get("content", "") for chunk in chunks) == REPLY[:20]
+    # 20个字符按每块8个字符切分
+    assert len(chunks) == 1 + 3 + 1
+
+
+def test_mock_errors_are_deterministic_by_seed_and_content():
+    def statuses(seed):
+        client = make_client(error_rate=0.5, seed=seed)
+        return [
+            client.post("/v1/chat/completions", json={**CHAT, "messages": [{"role": "user", "content": str(i % 5)}]}).status_code
+            for i in range(20)
+        ]
+
+    first = statuses(1)
+    assert statuses(1) == first
+    assert {200} < set(first) <= {200, 429, 500, 503}
+
+
+def test_mock_rate_limit_error_has_retry_after():
+    client = make_client(error_rate=1.0, error_statuses=[429], retry_after=2.5)
+    response = client.post("/v1/chat/completions", json=CHAT)
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "2.5"
+    assert response.json()["error"]["code"] == 429
+    assert client.get("/stats").json() == {"requests": 1, "error_429": 1}
+
+
+def test_make_workload_is_deterministic_with_duplicates():
+    workload = make_workload(200, seed=3, duplicate_ratio=0.3)
+    assert workload == make_workload(200, seed=3, duplicate_ratio=0.3)
+    assert workload != make_workload(200, seed=4, duplicate_ratio=0.3)
+
+    distinct = len({item["code"] for item in workload})
+    assert 100 < distinct < 170
+    assert len({item["code"] for item in make_workload(200, seed=3, duplicate_ratio=0)}) == 200
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 100) == 100
+    assert percentile([7.0], 99) == 7.0
+    assert percentile([], 50) == 0.0
+
+
+def test_recorder_summary_and_run_requests():
+    recorder = Recorder()
+    recorder.samples["total"] = [4.0, 1.0, 3.0, 2.0]
+    recorder.error("timeout")
+    recorder.error("timeout")
+    assert recorder.summary()["total"] == {"count": 4, "mean": 2.5, "p50": 2.0, "p95": 4.0, "p99": 4.0, "max": 4.0}
+    assert recorder.errors == {"timeout": 2}
+
+    seen = []
+
+    async def handle(submission):
+        await asyncio.sleep(0)
+        seen.append(submission["id"])
+
+    elapsed = asyncio.run(run_requests([{"id": i} for i in range(10)], 3, handle))
+    assert sorted(seen) == list(range(10))
+    assert elapsed >= 0
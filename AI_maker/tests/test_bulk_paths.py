@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from bulk_paths import completed_users, run_bulk
+from learning_path_generator import LearningPathGenerator
+from topic_catalogue import DEFAULT_SOURCE_PATH, compile_catalogue
+
+PROFILES = [
+    {"user_id": i, "skill_level": level, "programming_languages": ["python"]}
+    for i, level in enumerate(["beginner", "intermediate", "advanced", "beginner", "intermediate"])
+]
+
+
+@pytest.fixture
+def generator(tmp_path, fake_llm):
+    path = tmp_path / "topics.cat"
+    compile_catalogue(DEFAULT_SOURCE_PATH, str(path))
+    return LearningPathGenerator(api_key="test", catalogue_path=str(path), llm_client=fake_llm)
+
+
+def _write_profiles(path, profiles):
+    path.write_text("".join(json.dumps(profile) + "\n" for profile in profiles), encoding="utf-8")
+
+
+def _output(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_resume_after_partial_output(tmp_path, generator):
+    profiles, complete, partial = tmp_path / "profiles.jsonl", tmp_path / "complete.jsonl", tmp_path / "partial.jsonl"
+    _write_profiles(profiles, PROFILES)
+    run_bulk(generator, str(profiles), str(complete), concurrency=2)
+    expected = {row["user_id"]: row for row in _output(complete)}
+
+    # 写了两行后中断，第三行只写了一半
+    lines = complete.read_bytes().splitlines(keepends=True)
+    partial.write_bytes(lines[0] + lines[1] + lines[2][:10])
+    stats = run_bulk(generator, str(profiles), str(partial), concurrency=2)
+
+    rows = _output(partial)
+    assert (stats["skipped"], stats["written"]) == (2, 3)
+    assert [row["user_id"] for row in rows[:2]] == [json.loads(line)["user_id"] for line in lines[:2]]
+    assert sorted(row["user_id"] for row in rows) == sorted(expected)
+    assert {row["user_id"]: row for row in rows} == expected
+
+    # 已全部完成时不再生成
+    assert run_bulk(generator, str(profiles), str(partial))["written"] == 0
+    assert _output(partial) == rows
+
+
+def test_completed_users_truncates_invalid_tail(tmp_path):
+    output = tmp_path / "paths.jsonl"
+    assert completed_users(str(output)) == set()
+
+    # 最后一行是完整的JSON但没有换行，视为没有写完
+    output.write_text('{"user_id": "1"}\n{"user_id": "2"}\n{"user_id": "3"}', encoding="utf-8")
+    assert completed_users(str(output)) == {"1", "2"}
+    assert output.read_text(encoding="utf-8") == '{"user_id": "1"}\n{"user_id": "2"}\n'
+
+    # 损坏的行及其之后的内容都被截掉
+    output.write_text('{"user_id": "1"}\n{"user_\n{"user_id": "3"}\n', encoding="utf-8")
+    assert completed_users(str(output)) == {"1"}
+    assert output.read_text(encoding="utf-8") == '{"user_id": "1"}\n'
+
+
+def test_duplicate_and_invalid_profiles(tmp_path, generator):
+    profiles, output = tmp_path / "profiles.jsonl", tmp_path / "paths.jsonl"
+    _write_profiles(profiles, PROFILES[:2] + [PROFILES[0]])
+    assert run_bulk(generator, str(profiles), str(output))["written"] == 2
+    assert [row["user_id"] for row in _output(output)].count("0") == 1
+
+    _write_profiles(profiles, [{"skill_level": "beginner"}])
+    with pytest.raises(ValueError, match="user_id"):
+        run_bulk(generator, str(profiles), str(output))
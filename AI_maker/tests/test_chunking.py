@@ -0,0 +1,96 @@
+import asyncio
+import re
+from types import SimpleNamespace
+
+from chunking import estimate_tokens, split_into_chunks
+from code_analyzer import AsyncCodeAnalyzer
+
+FUNCTIONS = "\n\n".join(f"def f{i}(x):\n    # 第{i}个函数\n    return x * {i} + {i}\n" for i in range(10))
+
+
+def _covers(chunks, code):
+    """各块首尾相接，拼起来就是原文件"""
+    lines = code.splitlines()
+    assert chunks[0].start_line == 1 and chunks[-1].end_line == len(lines)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.start_line == previous.end_line + 1
+    assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+    assert "\n".join(chunk.source for chunk in chunks) == "\n".join(lines)
+
+
+def test_chunks_follow_function_boundaries():
+    chunks = split_into_chunks(FUNCTIONS, max_tokens=60)
+
+    _covers(chunks, FUNCTIONS)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.tokens <= 60
+        assert chunk.tokens == sum(estimate_tokens(line + "\n") for line in chunk.source.splitlines())
+        # 每块从函数定义(或函数之间的空行)开始，函数不会被切开
+        assert chunk.source.lstrip("\n").startswith("def ")
+        assert chunk.source.count("def ") == chunk.source.count("return ")
+    assert split_into_chunks(FUNCTIONS, max_tokens=100000)[0].source == FUNCTIONS.rstrip("\n")
+    assert split_into_chunks("", max_tokens=60) == []
+
+
+def test_oversized_statement_and_unparsable_code_split_by_lines():
+    big_class = "class Big:\n" + "".join(f"    value_{i} = {i} * 1000\n" for i in range(40))
+    long_line = "x = '" + "a" * 400 + "'\n"
+    for code in (big_class + "\n" + long_line + "y = 1\n", "def broken(:\n" + big_class):
+        chunks = split_into_chunks(code, max_tokens=50)
+        _covers(chunks, code)
+        for chunk in chunks:
+            # 只有单独成块的超长行可以超出预算
+            assert chunk.tokens <= 50 or chunk.start_line == chunk.end_line
+
+
+class ChunkLLM:
+    """第k块的评分为10*k；fail中的块请求失败"""
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+
+    async def achat(self, deadline=None, **kwargs):
+        part = int(re.search(r"第(\d+)/\d+部分", kwargs["messages"][0]["content"]).group(1)) - 1
+        if part in self.fail:
+            raise ConnectionError(f"chunk {part} failed")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"SCORE {10 * part + 10}"))])
+
+
+def _chunked(llm):
+    async def scenario():
+        analyzer = AsyncCodeAnalyzer(api_key="test", llm_client=llm, chunk_token_budget=60)
+        analyzer._parse_ai_response = lambda text: {"analysis": text, "score": int(text.split()[1])}
+        try:
+            return await analyzer.budgeted_ai_analysis(FUNCTIONS, "python", "beginner")
+        finally:
+            await analyzer.aclose()
+
+    return asyncio.run(scenario())
+
+
+def test_reduce_weights_chunk_scores_by_tokens():
+    chunks = split_into_chunks(FUNCTIONS, max_tokens=60)
+    result = _chunked(ChunkLLM(fail={1}))
+
+    assert result["mode"] == "chunked" and "error" not in result
+    assert result["total_tokens"] == sum(chunk.tokens for chunk in chunks)
+    reports = result["chunks"]
+    assert [(report["start_line"], report["end_line"]) for report in reports] == \
+        [(chunk.start_line, chunk.end_line) for chunk in chunks]
+    assert "error" in reports[1] and "score" not in reports[1]
+    # 失败的块不参与加权
+    scored = [(10 * chunk.index + 10, chunk.tokens) for chunk in chunks if chunk.index != 1]
+    assert result["score"] == round(sum(s * t for s, t in scored) / sum(t for _, t in scored), 1)
+    # 各块的分析按原文件顺序合并
+    sections = result["analysis"].split("\n\n")
+    assert sections[0] == f"## 第{chunks[0].start_line}-{chunks[0].end_line}行\nSCORE 10"
+    assert len(sections) == len(chunks) - 1
+
+
+def test_reduce_reports_error_when_every_chunk_fails():
+    result = _chunked(ChunkLLM(fail=range(100)))
+
+    assert result["error"] == "chunk 0 failed"
+    assert result["score"] == 0
+    assert all("error" in report for report in result["chunks"])
@@ -0,0 +1,120 @@
+import asyncio
+import re
+from types import SimpleNamespace
+
+from analysis_cache import AnalysisCache
+from code_analyzer import AsyncCodeAnalyzer, CodeAnalyzer
+from conftest import FakeLLM
+from model_router import ModelRouter
+from scoring import DEFAULT_WEIGHTS, severity_counts
+
+BROKEN = "def broken(:\n    return 1\n"
+
+
+class ItemLLM(FakeLLM):
+    """回复提示词中的提交序号；序号小的提交响应更慢，完成顺序与提交顺序相反"""
+
+    def _response(self, kwargs):
+        super()._response(kwargs)
+        item = re.search(r"# item (\d+)", kwargs["messages"][0]["content"]).group(1)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"ITEM {item}"))])
+
+    async def achat(self, deadline=None, **kwargs):
+        response = self._response(kwargs)
+        await asyncio.sleep(0.02 * (5 - int(response.choices[0].message.content.split()[1])))
+        return response
+
+
+# 第1、3条提交缺少字符串类型的code/language
+SUBMISSIONS = [
+    {"code": "# item 0\nx = 1\n", "language": "python"},
+    {"code": None, "language": "python"},
+    {"code": "# item 2\nwhile True:\n    pass\n", "language": "python"},
+    {"code": "# item 3\n"},
+    {"code": "# item 4\n" + BROKEN, "language": "python"},
+]
+
+
+def _check_batch(items):
+    assert [item["index"] for item in items] == [0, 1, 2, 3, 4]
+    assert [item["error"] is None for item in items] == [True, False, True, False, True]
+    for index in (0, 2, 4):
+        assert items[index]["result"]["ai_analysis"]["analysis"] == f"ITEM {index}"
+    # 各条结果对应各自的代码
+    assert items[2]["result"]["performance_issues"] and not items[0]["result"]["performance_issues"]
+    assert items[4]["result"]["syntax_issues"] and not items[2]["result"]["syntax_issues"]
+
+
+def test_static_only_result_is_scored_on_static_issues(fake_llm):
+    async def scenario():
+        analyzer = AsyncCodeAnalyzer(api_key="test", cache=AnalysisCache(), llm_client=fake_llm,
+                                     router=ModelRouter("gpt-4"))
+        try:
+            result = await analyzer.analyze_code(BROKEN, "python", "beginner")
+            events = [event async for event in analyzer.analyze_code_stream(BROKEN, "python", "beginner")]
+            return result, events[-1][1]
+        finally:
+            await analyzer.aclose()
+
+    result, streamed = asyncio.run(scenario())
+    assert fake_llm.prompts == []
+    assert result["ai_analysis"]["skipped"]
+    # 没有AI评分(保存为空的ai_score)，总分只按静态问题计算，不与0分混合
+    assert result["ai_analysis"].get("score") is None
+    assert result["overall_score"] == DEFAULT_WEIGHTS.score(severity_counts(result)) == 80.0
+    assert streamed["overall_score"] == result["overall_score"]
+
+
+def test_async_analyzer_shares_base_configuration(fake_llm):
+    weights = DEFAULT_WEIGHTS.from_dict({"ai_weight": 0.3})
+    options = dict(api_key="test", model="gpt-4o", cache=AnalysisCache(), score_weights=weights,
+                   llm_client=fake_llm, ai_deadline=5.0)
+    base = vars(CodeAnalyzer(**options))
+    analyzer = AsyncCodeAnalyzer(**options)
+    try:
+        assert {name: getattr(analyzer, name) for name in base} == base
+    finally:
+        analyzer.executor.shutdown()
+
+
+def test_stream_splits_code_over_token_budget(fake_llm):
+    code = "\n\n".join(f"def f{i}(x):\n    return x * {i} + {i}\n" for i in range(12))
+
+    async def scenario():
+        analyzer = AsyncCodeAnalyzer(api_key="test", llm_client=fake_llm, chunk_token_budget=40)
+        try:
+            return [event async for event in analyzer.analyze_code_stream(code, "python", "beginner")]
+        finally:
+            await analyzer.aclose()
+
+    events = asyncio.run(scenario())
+    assert [event for event, _ in events] == ["static", "result"]
+    ai_analysis = events[-1][1]["ai_analysis"]
+    # 每块单独请求，没有整份代码的提示词
+    assert ai_analysis["mode"] == "chunked" and len(ai_analysis["chunks"]) == len(fake_llm.prompts) > 1
+    assert all("def f0" not in prompt or "def f11" not in prompt for prompt in fake_llm.prompts)
+
+
+def test_analyze_many_keeps_order_and_isolates_errors():
+    llm = ItemLLM()
+
+    async def scenario():
+        analyzer = AsyncCodeAnalyzer(api_key="test", cache=AnalysisCache(), llm_client=llm, process_workers=2)
+        try:
+            first = await analyzer.analyze_many(SUBMISSIONS, "beginner")
+            # 第二次全部命中缓存
+            second = await analyzer.analyze_many(SUBMISSIONS, "beginner")
+            return first, second
+        finally:
+            await analyzer.aclose()
+
+    first, second = asyncio.run(scenario())
+    _check_batch(first)
+    _check_batch(second)
+    assert len(llm.prompts) == 3
+
+
+def test_sync_analyze_many_keeps_order_and_isolates_errors():
+    llm = ItemLLM()
+    analyzer = CodeAnalyzer(api_key="test", llm_client=llm)
+    _check_batch(analyzer.analyze_many(SUBMISSIONS, "beginner", concurrency=4, process_workers=2))
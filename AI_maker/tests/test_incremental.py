@@ -0,0 +1,120 @@
+import asyncio
+
+from analysis_cache import AnalysisCache
+from code_analyzer import AsyncCodeAnalyzer
+from conftest import FakeLLM
+from incremental import IncrementalAnalyzer
+from single_flight import SingleFlight
+
+V1 = '''
+def add(a, b):
+    return a + b
+
+def mul(a, b):
+    return a * b
+'''
+
+# 只修改了mul
+V2 = '''
+def add(a, b):
+    return a + b
+
+def mul(a, b):
+    result = 0
+    for _ in range(b):
+        result += a
+    return result
+'''
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_partial_result_is_not_shared_with_other_users(fake_llm):
+    async def scenario():
+        analyzer = AsyncCodeAnalyzer(api_key="test", cache=AnalysisCache(), llm_client=fake_llm)
+        incremental = IncrementalAnalyzer(analyzer)
+        try:
+            _, snapshot_a = await incremental.analyze_code(V1, "python", "beginner")
+            partial_a, _ = await incremental.analyze_code(V2, "python", "beginner", previous_snapshot=snapshot_a)
+            user_b, _ = await incremental.analyze_code(V2, "python", "beginner")
+            plain = await analyzer.analyze_code(V2, "python", "beginner")
+            return partial_a, user_b, plain
+        finally:
+            await analyzer.aclose()
+
+    partial_a, user_b, plain = _run(scenario())
+    assert partial_a["ai_analysis"]["analysis"] == "ANALYSIS OF: PARTIAL"
+    assert partial_a["incremental"]["reused_units"] == ["add"]
+    assert user_b["ai_analysis"]["analysis"] == "ANALYSIS OF: FULL"
+    assert plain["ai_analysis"]["analysis"] == "ANALYSIS OF: FULL"
+
+
+def test_full_incremental_result_is_cached(fake_llm):
+    async def scenario():
+        analyzer = AsyncCodeAnalyzer(api_key="test", cache=AnalysisCache(), llm_client=fake_llm)
+        incremental = IncrementalAnalyzer(analyzer)
+        try:
+            await incremental.analyze_code(V1, "python", "beginner")
+            return await analyzer.analyze_code(V1, "python", "beginner")
+        finally:
+            await analyzer.aclose()
+
+    result = _run(scenario())
+    assert result["ai_analysis"]["analysis"] == "ANALYSIS OF: FULL"
+    assert len(fake_llm.prompts) == 1
+
+
+def test_partial_analysis_is_not_coalesced_with_full_analysis():
+    async def scenario():
+        llm = FakeLLM(delay=0.2)
+        analyzer = AsyncCodeAnalyzer(api_key="test", llm_client=llm, single_flight=SingleFlight())
+        incremental = IncrementalAnalyzer(analyzer)
+        try:
+            _, snapshot_a = await incremental.analyze_code(V1, "python", "beginner")
+            # A的部分分析在途时，B提交相同的代码
+            (partial_a, _), (user_b, _) = await asyncio.gather(
+                incremental.analyze_code(V2, "python", "beginner", previous_snapshot=snapshot_a),
+                incremental.analyze_code(V2, "python", "beginner")
+            )
+            return partial_a, user_b
+        finally:
+            await analyzer.aclose()
+
+    partial_a, user_b = _run(scenario())
+    assert partial_a["ai_analysis"]["analysis"] == "ANALYSIS OF: PARTIAL"
+    assert user_b["ai_analysis"]["analysis"] == "ANALYSIS OF: FULL"
+
+
+async def _collect(stream):
+    events = {}
+    async for event, data in stream:
+        events.setdefault(event, []).append(data)
+    return events
+
+
+def test_stream_reuses_snapshot_and_returns_new_one(fake_llm):
+    async def scenario():
+        analyzer = AsyncCodeAnalyzer(api_key="test", cache=AnalysisCache(), llm_client=fake_llm)
+        incremental = IncrementalAnalyzer(analyzer)
+        try:
+            first = await _collect(incremental.analyze_code_stream(V1, "python", "beginner"))
+            second = await _collect(incremental.analyze_code_stream(
+                V2, "python", "beginner", previous_snapshot=first["snapshot"][0]
+            ))
+            return first, second
+        finally:
+            await analyzer.aclose()
+
+    first, second = _run(scenario())
+    assert "".join(token["content"] for token in first["token"]) == "ANALYSIS OF: FULL"
+    assert first["snapshot"][0]["ai_analysis"]["analysis"] == "ANALYSIS OF: FULL"
+    # 第二次只把修改过的mul发送给LLM
+    result = second["result"][0]
+    assert result["ai_analysis"]["analysis"] == "ANALYSIS OF: PARTIAL"
+    assert result["incremental"] == {"changed_units": ["mul"], "reused_units": ["add"]}
+    assert "token" not in second and len(fake_llm.prompts) == 2
+    units = second["snapshot"][0]["units"]
+    assert len(units) == 2 and len(set(units) & set(first["snapshot"][0]["units"])) == 1
+    assert second["snapshot"][0]["ai_analysis"]["analysis"] == "ANALYSIS OF: PARTIAL"
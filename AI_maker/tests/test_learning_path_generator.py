@@ -0,0 +1,131 @@
+import pytest
+
+import topic_catalogue
+from learning_path_generator import (
+    LearningPathGenerator, normalize_profile, path_from_dict, path_to_dict, profile_fingerprint
+)
+from topic_catalogue import (
+    DEFAULT_SOURCE_PATH, LearningTopic, SkillLevel, compile_catalogue, load_topics_json, write_catalogue
+)
+
+
+def _generator(catalogue_path, llm):
+    return LearningPathGenerator(api_key="test", catalogue_path=str(catalogue_path), llm_client=llm)
+
+
+@pytest.fixture
+def beginner_path(tmp_path, fake_llm):
+    path = tmp_path / "topics.cat"
+    compile_catalogue(DEFAULT_SOURCE_PATH, str(path))
+    generator = _generator(path, fake_llm)
+    learning_path = generator.generate_personalized_path(
+        {"user_id": "u1", "skill_level": "beginner", "programming_languages": ["python"]}
+    )
+    assert [topic.id for topic in learning_path.topics] == \
+        ["python_basics", "python_functions", "python_data_structures"]
+    return generator, learning_path
+
+
+def test_update_progress_recomputes_from_given_set(beginner_path):
+    generator, learning_path = beginner_path
+
+    assert generator.update_progress(learning_path, ["python_basics", "python_functions"]) == pytest.approx(200 / 3)
+    # 撤销完成时按新的集合重新计算，而不是在上次的基础上累加
+    assert generator.update_progress(learning_path, ["python_basics"]) == pytest.approx(100 / 3)
+    assert generator.update_progress(learning_path, []) == 0
+    assert learning_path.progress == 0
+
+
+def test_tracker_state_survives_serialization(beginner_path):
+    generator, learning_path = beginner_path
+    generator.track_progress(learning_path).complete("python_basics")
+
+    restored = path_from_dict(path_to_dict(learning_path), generator.topics_database)
+    tracker = generator.track_progress(restored)
+
+    assert tracker.completed_count == 1
+    assert [topic.id for topic in tracker.next_topics()] == ["python_functions", "python_data_structures"]
+    tracker.complete("python_functions")
+    assert restored.progress == pytest.approx(200 / 3)
+
+
+def test_language_without_topics_falls_back_to_level(tmp_path, fake_llm):
+    path = tmp_path / "topics.cat"
+    compile_catalogue(DEFAULT_SOURCE_PATH, str(path))
+    generator = _generator(path, fake_llm)
+
+    learning_path = generator.generate_personalized_path(
+        {"user_id": "u1", "skill_level": "beginner", "programming_languages": ["javascript"]}
+    )
+
+    assert learning_path.topics
+    assert all(topic.difficulty == SkillLevel.BEGINNER for topic in learning_path.topics)
+    assert learning_path.estimated_completion_time > 0
+
+
+def test_empty_selection_skips_llm(tmp_path, fake_llm):
+    path = tmp_path / "topics.cat"
+    write_catalogue([
+        LearningTopic("basics", "基础", "", SkillLevel.BEGINNER, 5, [], ["python"]),
+    ], str(path))
+    generator = _generator(path, fake_llm)
+
+    learning_path = generator.generate_personalized_path({"skill_level": "advanced"})
+
+    assert learning_path.topics == []
+    assert fake_llm.prompts == []
+
+
+def test_equivalent_profiles_share_one_llm_call(tmp_path, fake_llm):
+    path = tmp_path / "topics.cat"
+    compile_catalogue(DEFAULT_SOURCE_PATH, str(path))
+    generator = _generator(path, fake_llm)
+
+    first = generator.generate_personalized_path({
+        "user_id": "u1", "skill_level": "beginner", "programming_languages": ["python", "go"],
+        "learning_goals": "找工作"
+    })
+    # 只有user_id、语言的顺序/大小写和目标首尾空白不同
+    second = generator.generate_personalized_path({
+        "user_id": "u2", "skill_level": "beginner", "programming_languages": ["Go ", "PYTHON"],
+        "learning_goals": " 找工作 "
+    })
+
+    assert len(fake_llm.prompts) == 1
+    assert second.user_id == "u2" and second.topics == first.topics
+    assert generator.cache_stats()["hits"] >= 1
+
+
+def test_fingerprint_changes_with_profile_model_and_catalogue():
+    profile = normalize_profile({"skill_level": "beginner", "programming_languages": ["python"]})
+    key = profile_fingerprint(profile, "gpt-4", "v1")
+    assert profile_fingerprint(dict(profile), "gpt-4", "v1") == key
+    for changed in [
+        profile_fingerprint({**profile, "skill_level": "advanced"}, "gpt-4", "v1"),
+        profile_fingerprint({**profile, "programming_languages": ["go"]}, "gpt-4", "v1"),
+        profile_fingerprint({**profile, "learning_goals": "找工作"}, "gpt-4", "v1"),
+        profile_fingerprint(profile, "gpt-4o", "v1"),
+        profile_fingerprint(profile, "gpt-4", "v2"),
+    ]:
+        assert changed != key
+
+
+def test_recompiled_catalogue_invalidates_cached_paths(tmp_path, fake_llm, monkeypatch):
+    monkeypatch.setattr(topic_catalogue, "CHECK_INTERVAL", 0)
+    path = tmp_path / "topics.cat"
+    topics = load_topics_json(DEFAULT_SOURCE_PATH)
+    write_catalogue(topics, str(path))
+    generator = _generator(path, fake_llm)
+    profile = {"skill_level": "beginner", "programming_languages": ["python"]}
+
+    generator.generate_personalized_path(profile)
+    generator.generate_personalized_path(profile)
+    assert len(fake_llm.prompts) == 1
+
+    extra = LearningTopic("python_testing", "Python测试", "", SkillLevel.BEGINNER, 4, ["python_basics"], ["python"])
+    write_catalogue(topics + [extra], str(path))
+    learning_path = generator.generate_personalized_path(profile)
+
+    assert len(fake_llm.prompts) == 2
+    assert "python_testing" in [topic.id for topic in learning_path.topics]
+    assert generator.refresh_catalogue() is False
@@ -0,0 +1,177 @@
+import asyncio
+from concurrent.futures import wait
+from types import SimpleNamespace
+
+import pytest
+
+import llm_scheduler
+from llm_scheduler import LLMScheduler, LoadShedError, Priority, TokenBucket, estimate_tokens, llm_context
+
+KWARGS = {"model": "gpt-4", "messages": [{"role": "user", "content": "x" * 30}], "max_tokens": 10}
+
+
+class _Clock:
+    """调度器使用的时钟；只有测试推进时令牌桶才补充，放行顺序不受线程调度影响"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _UsageLLM:
+    def __init__(self, total_tokens: int = 42):
+        self.calls = 0
+        self.total_tokens = total_tokens
+
+    async def achat(self, deadline=None, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(usage=SimpleNamespace(total_tokens=self.total_tokens))
+
+    def stats(self):
+        return {}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(llm_scheduler, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def _scheduler(clock, **kwargs) -> LLMScheduler:
+    """每秒补充一个请求配额，开始时请求桶为空"""
+    kwargs.setdefault("max_wait", {priority: 1000.0 for priority in Priority})
+    scheduler = LLMScheduler(_UsageLLM(), requests_per_minute=60, tokens_per_minute=60000, **kwargs)
+    with scheduler._cond:
+        scheduler._requests.level = 0
+    return scheduler
+
+
+def _advance(scheduler: LLMScheduler, clock: _Clock, seconds: float) -> None:
+    with scheduler._cond:
+        clock.now += seconds
+        scheduler._cond.notify()
+
+
+def _queue(scheduler: LLMScheduler, user, priority: Priority, admitted: list):
+    with llm_context(user_id=user, priority=priority):
+        waiter = scheduler._submit(None, dict(KWARGS))
+    waiter.future.add_done_callback(
+        lambda future: future.exception() is None and admitted.append((user, priority.name.lower()))
+    )
+    return waiter.future
+
+
+def test_higher_priority_is_admitted_first_and_batch_keeps_reserve(clock):
+    scheduler = _scheduler(clock)
+    admitted = []
+    batch = _queue(scheduler, "alice", Priority.BATCH, admitted)
+    background = _queue(scheduler, "alice", Priority.BACKGROUND, admitted)
+    interactive = [_queue(scheduler, user, Priority.INTERACTIVE, admitted) for user in ("alice", "bob")]
+
+    # 补充10个请求：交互式各用1个，后台任务需保留6个，批处理需保留18个
+    _advance(scheduler, clock, 10)
+    wait(interactive + [background], timeout=5)
+    with scheduler._cond:
+        assert admitted == [("alice", "interactive"), ("bob", "interactive"), ("alice", "background")]
+        assert not batch.done()
+
+    _advance(scheduler, clock, 15)
+    assert batch.result(timeout=5) == 25
+    assert admitted[-1] == ("alice", "batch")
+    scheduler.close()
+
+
+def test_users_take_turns_within_a_priority(clock):
+    scheduler = _scheduler(clock)
+    admitted = []
+    futures = [
+        _queue(scheduler, user, Priority.BACKGROUND, admitted)
+        for user in ("alice", "alice", "alice", "bob", "bob", "carol")
+    ]
+
+    _advance(scheduler, clock, 60)
+    wait(futures, timeout=5)
+    assert [user for user, _ in admitted] == ["alice", "bob", "carol", "alice", "bob", "alice"]
+    scheduler.close()
+
+
+def test_requests_are_shed_when_queue_is_full_or_wait_expires(clock):
+    scheduler = _scheduler(clock, max_queue={Priority.BATCH: 2}, max_wait={Priority.BATCH: 5.0})
+    admitted = []
+    queued = [_queue(scheduler, "alice", Priority.BATCH, admitted) for _ in range(2)]
+    with pytest.raises(LoadShedError) as shed:
+        _queue(scheduler, "bob", Priority.BATCH, admitted)
+    assert shed.value.reason == "queue_full" and shed.value.retry_after > 0
+    # 队列上限按优先级分别计算
+    interactive = _queue(scheduler, "bob", Priority.INTERACTIVE, admitted)
+
+    _advance(scheduler, clock, 6)
+    for future in queued:
+        with pytest.raises(LoadShedError) as expired:
+            future.result(timeout=5)
+        assert expired.value.reason == "timeout"
+    assert interactive.result(timeout=5) == 6
+    stats = scheduler.stats()["priorities"]["batch"]
+    assert (stats["queued"], stats["admitted"], stats["shed_queue_full"], stats["shed_timeout"]) == (0, 0, 1, 2)
+    scheduler.close()
+
+
+def test_token_bucket_refills_and_settles():
+    bucket = TokenBucket(rate=10.0, capacity=100.0)
+    start = bucket._updated
+    bucket.take(100, start)
+    assert bucket.wait_time(30, 0, start) == 3.0
+    assert bucket.wait_time(30, 0, start + 1) == 2.0
+    # 保留量也要等补充出来
+    assert bucket.wait_time(30, 20, start + 1) == 4.0
+    # 补充不超过容量
+    assert bucket.wait_time(100, 0, start + 1000) == 0.0
+    assert bucket.level == 100.0
+    bucket.take(80, start + 1000)
+    bucket.refund(-30)
+    assert bucket.level == -10.0
+    bucket.refund(500)
+    assert bucket.level == 100.0
+
+
+def test_actual_usage_replaces_estimate(clock):
+    scheduler = _scheduler(clock)
+
+    async def scenario():
+        task = asyncio.ensure_future(scheduler.achat(**KWARGS))
+        await asyncio.sleep(0)
+        _advance(scheduler, clock, 1)
+        return await task
+
+    asyncio.run(scenario())
+    assert estimate_tokens(KWARGS) == 21
+    assert scheduler.stats()["tokens_available"] == 60000 - 42
+    scheduler.close()
+
+
+def test_cancelled_waiter_does_not_consume_quota(clock):
+    scheduler = _scheduler(clock)
+
+    async def scenario():
+        waiting = asyncio.ensure_future(scheduler.achat(**KWARGS))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["priorities"]["interactive"]["queued"] == 1
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert scheduler.stats()["priorities"]["interactive"]["queued"] == 0
+
+        _advance(scheduler, clock, 60)
+        await scheduler.achat(**KWARGS)
+
+    asyncio.run(scenario())
+    stats = scheduler.stats()
+    # 只有第二个请求被放行和计费
+    assert scheduler.client.calls == 1
+    assert stats["priorities"]["interactive"]["admitted"] == 1
+    assert stats["requests_available"] == 59
+    assert stats["tokens_available"] == 60000 - 42
+    scheduler.close()
@@ -0,0 +1,94 @@
+import argparse
+import os
+
+import sqlalchemy as sa
+from alembic import command
+from alembic.config import Config
+from app.models.learning_session import CodeBlob, LearningSession
+from app.models.user_stats import UserStats
+
+BACKEND = os.path.join(os.path.dirname(__file__), "../backend")
+
+# 最初由 Base.metadata.create_all 创建的表结构
+BASELINE_SCHEMA = [
+    """CREATE TABLE users (
+        id INTEGER PRIMARY KEY, username VARCHAR(50), email VARCHAR(100), hashed_password VARCHAR(255),
+        full_name VARCHAR(100), skill_level VARCHAR(20), programming_languages TEXT,
+        created_at DATETIME, updated_at DATETIME, is_active BOOLEAN
+    )""",
+    """CREATE TABLE learning_sessions (
+        id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users(id), session_type VARCHAR(50),
+        language VARCHAR(50), topic VARCHAR(100), code_content TEXT, ai_feedback TEXT,
+        score FLOAT, duration_minutes INTEGER, created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )""",
+    "INSERT INTO users (id, username) VALUES (1, 'alice')",
+    """INSERT INTO learning_sessions (user_id, topic, code_content, score, duration_minutes)
+       VALUES (1, 'loops', 'x = 1', 80.0, 10), (1, 'loops', 'x = 2', 0.0, 5)""",
+]
+
+
+def _config(url: str) -> Config:
+    config = Config(os.path.join(BACKEND, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND, "alembic"))
+    config.cmd_opts = argparse.Namespace(x=[f"url={url}"])
+    return config
+
+
+def _baseline_engine(url: str):
+    engine = sa.create_engine(url)
+    with engine.begin() as connection:
+        for statement in BASELINE_SCHEMA:
+            connection.execute(sa.text(statement))
+    return engine
+
+
+def test_baseline_database_upgrades_to_head(tmp_path):
+    url = f"sqlite:///{tmp_path / 'baseline.db'}"
+    engine = _baseline_engine(url)
+
+    command.upgrade(_config(url), "head")
+
+    # 按模型的全部列查询(Core查询，不依赖User关系的映射)
+    sessions = LearningSession.__table__
+    user_stats = UserStats.__table__
+    with engine.connect() as connection:
+        rows = connection.execute(sa.select(sessions).order_by(sessions.c.id)).all()
+        assert [row.analysis_snapshot for row in rows] == [None, None]
+        stats = connection.execute(sa.select(user_stats).where(user_stats.c.user_id == 1)).one()
+        assert (stats.session_count, stats.scored_count, stats.best_score, stats.duration_minutes) == (2, 1, 80.0, 15)
+
+    command.downgrade(_config(url), "base")
+    columns = {column["name"] for column in sa.inspect(engine).get_columns("learning_sessions")}
+    assert "analysis_snapshot" not in columns and "code_hash" not in columns
+    engine.dispose()
+
+
+def test_upgrade_skips_tables_created_at_startup(tmp_path):
+    url = f"sqlite:///{tmp_path / 'started.db'}"
+    engine = _baseline_engine(url)
+    # 应用启动时 create_all 会先建好新增的表(users已存在，这里只用于解析外键)
+    metadata = sa.MetaData()
+    sa.Table("users", metadata, sa.Column("id", sa.Integer, primary_key=True))
+    for table in (UserStats.__table__, CodeBlob.__table__):
+        table.to_metadata(metadata).create(engine)
+    # 迁移前启动的应用只累加了之后插入的会话
+    with engine.begin() as connection:
+        connection.execute(sa.text(
+            "INSERT INTO learning_sessions (user_id, topic, score, duration_minutes) VALUES (1, 'loops', 60.0, 20)"
+        ))
+        connection.execute(sa.insert(UserStats.__table__).values(
+            user_id=1, session_count=1, score_sum=60.0, scored_count=1, best_score=60.0, duration_minutes=20
+        ))
+
+    command.upgrade(_config(url), "head")
+
+    columns = {column["name"] for column in sa.inspect(engine).get_columns("learning_sessions")}
+    assert {"analysis_snapshot", "severity_counts", "ai_score", "code_hash"} <= columns
+    # 已存在的 user_stats 也按全部会话重建
+    user_stats = UserStats.__table__
+    with engine.connect() as connection:
+        stats = connection.execute(sa.select(user_stats)).one()
+    assert (stats.user_id, stats.session_count, stats.score_sum, stats.scored_count) == (1, 3, 140.0, 2)
+    assert (stats.best_score, stats.duration_minutes) == (80.0, 35)
+    engine.dispose()
+
@@ -0,0 +1,42 @@
+from parse_service import ParseService
+
+
+def _exhaust_memory(code: str) -> int:
+    # 在内存上限内分配1GB，工作进程中抛出MemoryError
+    return len(code * (1 << 30))
+
+
+def test_worker_is_replaced_after_memory_error():
+    service = ParseService(max_workers=1, timeout=10.0, memory_limit_mb=256)
+    try:
+        hostile = service.run(_exhaust_memory, "x")
+        assert hostile.status == "rejected"
+        assert "内存" in hostile.reason
+
+        for _ in range(3):
+            result = service.parse("x = 1\n", "python")
+            assert result.ok, result.reason
+        assert service.stats["recycled"] == 1
+    finally:
+        service.close()
+
+
+def test_cold_worker_startup_is_not_counted_in_timeout():
+    # 新建工作进程导入分析模块约需1秒，超过任务超时
+    service = ParseService(max_workers=1, timeout=0.3)
+    try:
+        result = service.parse("x = 1\n", "python")
+        assert result.ok, result.reason
+        assert service.stats["timeout"] == 0
+    finally:
+        service.close()
+
+
+def test_oversized_submission_is_rejected_without_worker():
+    service = ParseService(max_workers=1, max_lines=10)
+    try:
+        result = service.parse("x = 1\n" * 20, "python")
+        assert result.status == "too_large"
+        assert service.stats["recycled"] == 0
+    finally:
+        service.close()
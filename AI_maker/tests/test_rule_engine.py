@@ -0,0 +1,99 @@
+import ast
+
+import pytest
+
+from code_analyzer import AnalysisType, CodeIssue, run_static_analysis
+from scoring import severity_counts
+
+
+def baseline_static_analysis(code, language):
+    """规则引擎之前 CodeAnalyzer 的静态检查(_check_syntax/_analyze_performance/_analyze_security)"""
+    syntax_issues = []
+    performance_issues = []
+    security_issues = []
+
+    if language.lower() == "python":
+        try:
+            ast.parse(code)
+        except SyntaxError as e:
+            syntax_issues.append(CodeIssue(
+                line_number=e.lineno or 0, issue_type=AnalysisType.SYNTAX, description=f"语法错误: {e.msg}",
+                suggestion="请检查语法错误并修正", severity="high", confidence=1.0
+            ))
+        if "while True:" in code and "break" not in code:
+            performance_issues.append(CodeIssue(
+                line_number=0, issue_type=AnalysisType.PERFORMANCE, description="检测到可能的无限循环",
+                suggestion="请确保循环有正确的退出条件", severity="high", confidence=0.8
+            ))
+
+    if "sql" in code.lower() and "input(" in code.lower():
+        security_issues.append(CodeIssue(
+            line_number=0, issue_type=AnalysisType.SECURITY, description="可能存在SQL注入风险",
+            suggestion="请使用参数化查询", severity="high", confidence=0.7
+        ))
+    if "eval(" in code:
+        security_issues.append(CodeIssue(
+            line_number=0, issue_type=AnalysisType.SECURITY, description="使用eval()函数存在安全风险",
+            suggestion="请避免使用eval()，考虑使用ast.literal_eval()", severity="high", confidence=0.9
+        ))
+
+    return {
+        "syntax_issues": syntax_issues,
+        "performance_issues": performance_issues,
+        "security_issues": security_issues,
+    }
+
+
+# 旧实现判断正确的样例：规则引擎的结论(问题类别、描述、严重程度)必须与其一致
+CORPUS = [
+    ("python", "def add(a, b):\n    return a + b\n"),
+    ("python", "def broken(:\n    pass\n"),
+    ("python", "x = 1\n  y = 2\n"),
+    ("python", "while True:\n    tick()\n"),
+    ("python", "while True:\n    if done():\n        break\n"),
+    ("python", "value = eval(input('expr: '))\n"),
+    ("python", "sql = 'SELECT * FROM users WHERE name = ' + input('name: ')\ncursor.execute(sql)\n"),
+    ("python", "name = input()\nsql = f\"DELETE FROM users WHERE name = '{name}'\"\n"),
+    ("python", "while True:\n    sql = 'SELECT * FROM t WHERE id = %s' % input()\n    eval(sql)\n"),
+    ("python", "async def main():\n    for item in items:\n        await handle(item)\n"),
+    ("python", ""),
+    ("javascript", "const result = eval(userInput);\n"),
+    ("javascript", "const sql = 'SELECT * FROM users WHERE id = ' + input('id');\n"),
+    ("javascript", "function add(a, b) { return a + b; }\n"),
+]
+
+
+def _summary(result):
+    return {
+        key: sorted((issue.issue_type, issue.description, issue.severity) for issue in result[key])
+        for key in ("syntax_issues", "performance_issues", "security_issues")
+    }
+
+
+@pytest.mark.parametrize("language,code", CORPUS)
+def test_rule_engine_matches_baseline(language, code):
+    expected = baseline_static_analysis(code, language)
+    actual = run_static_analysis(code, language)
+
+    assert _summary(actual) == _summary(expected)
+    assert severity_counts(actual) == severity_counts(expected)
+    # 语法错误的位置与旧实现相同
+    assert [issue.line_number for issue in actual["syntax_issues"]] == \
+        [issue.line_number for issue in expected["syntax_issues"]]
+
+
+# 旧实现按子串匹配产生的误报，规则引擎按AST判断，有意不再报告
+FALSE_POSITIVES = [
+    "# 不要使用 eval(\nx = 1\n",
+    "print('while True: is a loop')\n",
+    "mysql_host = input('host: ')\n",
+]
+
+
+@pytest.mark.parametrize("code", FALSE_POSITIVES)
+def test_rule_engine_drops_substring_false_positives(code):
+    expected = baseline_static_analysis(code, "python")
+    actual = run_static_analysis(code, "python")
+
+    assert expected["performance_issues"] or expected["security_issues"]
+    assert not actual["performance_issues"] and not actual["security_issues"]
@@ -0,0 +1,56 @@
+import json
+import math
+import random
+
+import numpy as np
+import pytest
+
+from scoring import COUNTS_SIZE, DEFAULT_WEIGHTS, ScoreWeights, severity_counts
+
+WEIGHTS = [
+    DEFAULT_WEIGHTS,
+    ScoreWeights.from_dict({"ai_weight": 0.3, "base_score": 90, "penalties": {"syntax_issues": {"low": 2.5}}}),
+    ScoreWeights.from_dict({"ai_weight": 0.0}),
+]
+
+
+def _samples(count=5000, seed=3):
+    rng = random.Random(seed)
+    counts = [[rng.randint(0, 3) for _ in range(COUNTS_SIZE)] for _ in range(count)]
+    ai_scores = [rng.choice([None, rng.randint(0, 100), round(rng.uniform(0, 100), 2)]) for _ in range(count)]
+    return counts, ai_scores
+
+
+@pytest.mark.parametrize("weights", WEIGHTS)
+def test_score_batch_matches_scalar_score(weights):
+    counts, ai_scores = _samples()
+    # 缺少AI评分用NaN表示，只按静态问题计算
+    batch = weights.score_batch(counts, [math.nan if score is None else score for score in ai_scores])
+
+    assert batch.shape == (len(counts),)
+    assert batch.tolist() == [weights.score(c, score) for c, score in zip(counts, ai_scores)]
+    assert weights.score_batch(counts).tolist() == [weights.score(c) for c in counts]
+
+
+def test_score_batch_accepts_count_matrices():
+    counts, _ = _samples(10)
+    flat = DEFAULT_WEIGHTS.score_batch(counts, np.full(10, np.nan))
+    assert DEFAULT_WEIGHTS.score_batch(np.reshape(counts, (10, 3, 3))).tolist() == flat.tolist()
+    # 扣分超过基础分时为0
+    assert DEFAULT_WEIGHTS.score_batch([[9] * COUNTS_SIZE], [np.nan]).tolist() == [0.0]
+    assert DEFAULT_WEIGHTS.score([9] * COUNTS_SIZE, 60) == 30.0
+
+
+def test_severity_counts_and_weights_round_trip(tmp_path):
+    static_result = {
+        "syntax_issues": [{"severity": "high"}],
+        "security_issues": [{"severity": "low"}, {"severity": "low"}, {"severity": "unknown"}],
+    }
+    assert severity_counts(static_result) == [1, 0, 0, 0, 0, 0, 0, 0, 2]
+
+    path = tmp_path / "weights.json"
+    path.write_text(json.dumps(WEIGHTS[1].to_dict()))
+    loaded = ScoreWeights.load(str(path))
+    assert loaded == WEIGHTS[1] and loaded.fingerprint == WEIGHTS[1].fingerprint != DEFAULT_WEIGHTS.fingerprint
+    with pytest.raises(ValueError):
+        ScoreWeights.from_dict({"penalties": {"style_issues": {"low": 1}}})
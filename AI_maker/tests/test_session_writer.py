@@ -0,0 +1,125 @@
+import asyncio
+import itertools
+import json
+from datetime import datetime, timezone
+
+import sqlalchemy as sa
+
+from app.core.session_writer import SessionWriter, _to_json, add_sessions
+from app.models.learning_session import LearningSession
+from app.models.user_stats import UserStats
+
+
+def _fields(user_id=1, score=80.0, code="x = 1"):
+    return {"user_id": user_id, "session_type": "code_review", "language": "python", "topic": "general",
+            "code_content": code, "ai_feedback": "ok", "score": score}
+
+
+def _writer(session_factory, **options):
+    writer = SessionWriter(session_factory, enabled=True, **options)
+    ids = itertools.count(1000)
+
+    async def fetch_id_block():
+        # 代替PostgreSQL序列；让出事件循环，模拟取号期间其他请求继续执行
+        await asyncio.sleep(0)
+        return [next(ids) for _ in range(writer.id_block_size)]
+
+    writer._fetch_id_block = fetch_id_block
+    return writer
+
+
+def _start(writer, consume=True):
+    # start() 只在PostgreSQL上启用延迟写入，这里直接启动后台任务
+    writer._queue = asyncio.Queue(maxsize=writer.max_queue)
+    writer._task = asyncio.create_task(writer._run() if consume else asyncio.sleep(3600))
+
+
+async def _rows(session_factory, table):
+    async with session_factory() as db:
+        return (await db.execute(sa.select(table))).all()
+
+
+def test_enqueued_session_is_written_in_background(session_factory):
+    async def scenario():
+        writer = _writer(session_factory, interval=0.05)
+        _start(writer)
+        session_id = await writer.save(None, _fields())
+        pending = writer.pending(session_id, 1)
+        await writer.stop()
+        return writer, session_id, pending
+
+    writer, session_id, pending = asyncio.run(scenario())
+    assert pending["score"] == 80.0
+    assert writer.pending(session_id, 1) is None
+    sessions = asyncio.run(_rows(session_factory, LearningSession.__table__))
+    assert [row.id for row in sessions] == [session_id]
+    stats, = asyncio.run(_rows(session_factory, UserStats.__table__))
+    assert (stats.user_id, stats.session_count) == (1, 1)
+    assert (writer.counters["enqueued"], writer.counters["written"], writer.counters["direct_writes"]) == (1, 1, 0)
+
+
+def test_full_queue_falls_back_to_direct_write(session_factory):
+    async def scenario():
+        writer = _writer(session_factory, max_queue=1)
+        _start(writer, consume=False)
+        # 三个请求都在队列未满时通过检查，之后在分配ID时让出
+        async def save(score):
+            async with session_factory() as db:
+                return await writer.save(db, _fields(score=score))
+        ids = await asyncio.gather(save(70.0), save(80.0), save(90.0))
+        pending = dict(writer._pending)
+        writer._task.cancel()
+        return writer, ids, pending
+
+    writer, ids, pending = asyncio.run(scenario())
+    assert len(set(ids)) == 3
+    assert (writer.counters["enqueued"], writer.counters["direct_writes"]) == (1, 2)
+    # 直接写入的会话不会留在待写入记录中
+    assert list(pending) == [ids[0]]
+    written = asyncio.run(_rows(session_factory, LearningSession.__table__))
+    assert sorted(row.id for row in written) == sorted(ids[1:])
+
+
+def test_failed_batch_is_spooled(session_factory, tmp_path):
+    spool = tmp_path / "spool.jsonl"
+
+    async def scenario():
+        writer = _writer(session_factory, interval=0.05, max_retries=1, spool_path=str(spool))
+
+        async def broken_write(rows):
+            raise RuntimeError("database unavailable")
+
+        writer._write = broken_write
+        _start(writer)
+        session_id = await writer.save(None, _fields())
+        await writer.stop()
+        return writer, session_id
+
+    writer, session_id = asyncio.run(scenario())
+    rows = [json.loads(line) for line in spool.read_text(encoding="utf-8").splitlines()]
+    assert [row["id"] for row in rows] == [session_id]
+    assert (writer.counters["retries"], writer.counters["spooled"]) == (1, 1)
+    assert writer.stats()["pending"] == 0
+
+
+def test_spool_is_replayed_on_startup(session_factory, tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    now = datetime.now(timezone.utc)
+    written = {**_fields(), "id": 1, "duration_minutes": 0, "created_at": now}
+    lost = {**_fields(user_id=2, code="y = 2"), "id": 2, "duration_minutes": 0, "created_at": now}
+
+    async def scenario():
+        # 上次在写入成功后、清理spool前退出：第1条已写入
+        async with session_factory() as db:
+            await add_sessions(db, [dict(written)])
+            await db.commit()
+        spool.write_text("".join(_to_json(row) + "\n" for row in (written, lost)), encoding="utf-8")
+        writer = SessionWriter(session_factory, enabled=True, spool_path=str(spool))
+        await writer._replay_spool()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert not spool.exists()
+    assert writer.counters["replayed"] == 1
+    sessions = asyncio.run(_rows(session_factory, LearningSession.__table__))
+    assert sorted(row.id for row in sessions) == [1, 2]
@@ -0,0 +1,142 @@
+import math
+import os
+import random
+import threading
+
+import topic_catalogue
+from topic_catalogue import LearningTopic, SkillLevel, TopicCatalogue, load_catalogue, write_catalogue
+from topic_graph import TopicGraph
+from topic_index import TopicIndex, index_for, tokenize
+
+LANGUAGES = ["python", "javascript", "go", "rust"]
+WORDS = ["函数", "闭包", "并发", "异步编程", "数据结构", "算法", "web", "测试", "类型", "模块"]
+
+
+def _topics(count=300, seed=7):
+    rng = random.Random(seed)
+    topics = []
+    for i in range(count):
+        prereqs = rng.sample([topic.id for topic in topics], min(len(topics), rng.randint(0, 3)))
+        words = rng.sample(WORDS, 3)
+        topics.append(LearningTopic(
+            id=f"t{i:04d}", title=f"{words[0]} {words[1]}", description=f"学习{words[2]}和{words[0]}",
+            difficulty=rng.choice(list(SkillLevel)), estimated_hours=rng.randint(1, 20),
+            prerequisites=prereqs, tags=[rng.choice(LANGUAGES), words[1].upper()]
+        ))
+    # 输入顺序与拓扑序不同
+    rng.shuffle(topics)
+    return {topic.id: topic for topic in topics}
+
+
+def _catalogue(tmp_path, topics):
+    path = tmp_path / "topics.cat"
+    write_catalogue(topics.values(), str(path))
+    return TopicCatalogue(str(path))
+
+
+def test_compiled_graph_matches_in_memory_graph(tmp_path):
+    topics = _topics()
+    expected = TopicGraph.from_topics(topics)
+    catalogue = _catalogue(tmp_path, topics)
+    graph = catalogue.graph
+
+    assert list(graph.order) == expected.order
+    for topic_id in topics:
+        assert graph.index[topic_id] == expected.index[topic_id]
+        assert graph.closure_mask(topic_id) == expected.closure_mask(topic_id)
+        assert graph.prerequisites_of(topic_id, transitive=False) == expected.prerequisites_of(topic_id, False)
+        assert graph.dependents_of(topic_id) == expected.dependents_of(topic_id)
+    assert "missing" not in graph
+
+    completed = random.Random(1).sample(sorted(topics), 60)
+    mask = graph.mask(completed)
+    assert mask == expected.mask(completed)
+    assert graph.next_available(mask) == expected.next_available(mask)
+    assert graph.sort_topics(completed) == expected.sort_topics(completed)
+    # 依赖图直接读取目录文件，不需要解码主题
+    assert len(catalogue._topics) == 0
+
+
+def test_compiled_index_matches_in_memory_index(tmp_path):
+    topics = _topics()
+    catalogue = _catalogue(tmp_path, topics)
+    expected = TopicIndex({topic_id: topics[topic_id] for topic_id in catalogue})
+    index = index_for(catalogue)
+
+    assert index is index_for(catalogue)
+    assert len(index) == len(expected)
+    for query in ["闭包", "异步 并发", "python 算法", "web测试", "nothing"]:
+        assert index.search(query, limit=5) == expected.search(query, limit=5)
+        candidates = expected.match_tags(["go"])
+        assert index.search(query, limit=5, candidates=candidates) == \
+            expected.search(query, limit=5, candidates=candidates)
+    for level in [None, *SkillLevel]:
+        assert index.match_tags([], difficulty=level) == expected.match_tags([], difficulty=level)
+        assert index.match_tags(["Python", "go"], difficulty=level) == \
+            expected.match_tags(["python", "go"], difficulty=level)
+        assert index.match_tags(["rust", "类型"], match_all=True, difficulty=level) == \
+            expected.match_tags(["rust", "类型"], match_all=True, difficulty=level)
+    assert len(catalogue._topics) == 0
+
+
+def test_vectorized_scores_match_dict_scores():
+    topics = _topics()
+    index = TopicIndex(topics)
+    # 删除后位置不复用，索引中留下空位
+    for topic_id in sorted(topics)[::7]:
+        index.remove(topic_id)
+
+    for query in ["闭包", "异步 并发 python", "web测试 模块", "go"]:
+        total = len(index)
+        weighted = [(token, math.log(1 + total / index._posting_count(token)))
+                    for token in set(tokenize(query)) if index._posting_count(token)]
+        candidates = index.match_tags(["rust", "python"])
+        for limit in (1, 5, 50):
+            assert index._score_arrays(weighted, limit, None) == index._score_dicts(weighted, limit, None)
+            assert index._score_arrays(weighted, limit, candidates) == \
+                index._score_dicts(weighted, limit, candidates)
+
+
+def test_replaced_catalogue_is_checked_at_interval_and_closed(tmp_path, monkeypatch):
+    monkeypatch.setattr(topic_catalogue, "_catalogues", {})
+    monkeypatch.setattr(topic_catalogue, "_checked", {})
+    path = str(tmp_path / "topics.cat")
+    write_catalogue(_topics(20).values(), path)
+    first = load_catalogue(path)
+
+    write_catalogue(_topics(30).values(), path)
+    # 检查间隔内不访问文件系统
+    assert load_catalogue(path) is first
+    second = load_catalogue(path, check_interval=0)
+
+    assert len(second) == 30 and second.version != first.version
+    assert first._mm.closed
+    assert load_catalogue(path, check_interval=0) is second
+
+
+def test_concurrent_writes_leave_a_complete_catalogue(tmp_path):
+    path = str(tmp_path / "topics.cat")
+    topics = _topics(50)
+    threads = [threading.Thread(target=write_catalogue, args=(topics.values(), path)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert os.listdir(tmp_path) == ["topics.cat"]
+    assert sorted(TopicCatalogue(path)) == sorted(topics)
+
+
+def test_builtin_catalogue_falls_back_when_install_dir_is_read_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(topic_catalogue, "_catalogues", {})
+    monkeypatch.setattr(topic_catalogue, "_checked", {})
+    # 安装目录不可写：父路径是普通文件
+    (tmp_path / "package").write_text("")
+    monkeypatch.setattr(topic_catalogue, "DEFAULT_CATALOGUE_PATH", str(tmp_path / "package" / "topics.cat"))
+    fallback = tmp_path / "cache" / "topics.cat"
+    monkeypatch.setattr(topic_catalogue, "FALLBACK_CATALOGUE_PATH", str(fallback))
+
+    catalogue = load_catalogue()
+
+    assert catalogue.path == os.path.realpath(fallback)
+    assert "python_basics" in catalogue
@@ -0,0 +1,49 @@
+import asyncio
+from typing import Dict, Tuple
+
+import sqlalchemy as sa
+from app.models.learning_session import LearningSession
+from app.models.user_stats import UserStats
+
+
+def _stats(session_factory) -> Dict[int, Tuple]:
+    async def read():
+        async with session_factory() as db:
+            rows = (await db.execute(sa.select(UserStats))).scalars().all()
+        return {row.user_id: (row.session_count, row.score_sum, row.scored_count, row.best_score, row.duration_minutes)
+                for row in rows}
+    return asyncio.run(read())
+
+
+def _add_sessions(session_factory, *sessions) -> None:
+    async def write():
+        async with session_factory() as db:
+            db.add_all([LearningSession(**fields) for fields in sessions])
+            await db.commit()
+    asyncio.run(write())
+
+
+def test_inserted_session_creates_stats_row(session_factory):
+    assert _stats(session_factory) == {}
+
+    _add_sessions(session_factory, {"user_id": 1, "topic": "loops", "score": 70.0, "duration_minutes": 12})
+
+    assert _stats(session_factory) == {1: (1, 70.0, 1, 70.0, 12)}
+
+
+def test_bulk_insert_upserts_each_user_once(session_factory):
+    _add_sessions(session_factory, {"user_id": 1, "topic": "loops", "score": 70.0, "duration_minutes": 12})
+
+    # 同一次flush中多个用户、多条会话；用户2还没有统计行
+    _add_sessions(
+        session_factory,
+        {"user_id": 1, "topic": "loops", "score": 90.0, "duration_minutes": 8},
+        {"user_id": 1, "topic": "loops", "score": 0.0, "duration_minutes": 5},
+        {"user_id": 2, "topic": "recursion", "score": 40.0, "duration_minutes": 30},
+        {"user_id": 2, "topic": "recursion", "score": 50.0}
+    )
+
+    assert _stats(session_factory) == {
+        1: (3, 160.0, 2, 90.0, 25),
+        2: (2, 90.0, 2, 50.0, 30)
+    }